@@ -2,7 +2,7 @@
 byu asset management tools
 """
 
-__all__ = ["body", "element", "environment", "pipeline_io", "project", "registry"]
+__all__ = ["body", "cache_install", "cache_sync", "catalog", "change_feed", "disk_usage", "element", "environment", "pipeline_io", "project", "publish_archive", "registry", "resolution", "retention", "sequence_cache", "set_diff", "set_layout", "shot_manifest"]
 
 # from body import *
 # from element import *
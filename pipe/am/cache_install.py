@@ -0,0 +1,280 @@
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# One lock per cache dir, shared by every CacheInstaller in this process
+_locks = {}
+_locks_lock = threading.Lock()
+
+def _lock_for(cache_dir):
+	with _locks_lock:
+		lock = _locks.get(cache_dir)
+		if lock is None:
+			lock = threading.Lock()
+			_locks[cache_dir] = lock
+		return lock
+
+class CacheInstaller:
+	"""
+	Class that installs a new cache for an element without readers ever seeing an
+	empty or half written cache dir. Each install is a generation directory in
+	.cache_generations next to the cache dir, and the cache dir itself is a symlink
+	to the live generation:
+
+	cache -> .cache_generations/g000003
+
+	A new generation is staged beside the live one and swapped in by renaming a new
+	symlink over the old one, which is atomic. The previous generation is kept so an
+	install can be rolled back instantly, and older ones are deleted in the background.
+	Commits, rollbacks and reclaims of a cache dir are serialized across threads and
+	(through a lock file in .cache_generations) across processes.
+
+	installer = CacheInstaller(element.get_cache_dir())
+	staging = installer.stage()
+	... write files into staging ...
+	installer.commit(staging)
+	"""
+
+	GENERATIONS_DIR = ".cache_generations"
+	GENERATION_PREFIX = "g"
+	STAGING_PREFIX = "staging_"
+	LOCK_FILENAME = ".lock"
+	FILE_MODE = 0774
+	DIR_MODE = 0775
+
+	def __init__(self, cache_dir, keep=2):
+		"""
+		cache_dir -- the path readers use, e.g. Element.get_cache_dir()
+		keep -- how many generations to keep, counting the live one
+		"""
+		self.cache_dir = os.path.normpath(cache_dir)
+		self.generations_dir = os.path.join(os.path.dirname(self.cache_dir), self.GENERATIONS_DIR)
+		self.keep = max(2, keep)
+		self._lock = _lock_for(os.path.abspath(self.cache_dir))
+
+	def generations(self):
+		"""
+		return the names of the committed generations, oldest first
+		"""
+		if not os.path.isdir(self.generations_dir):
+			return []
+		names = [name for name in os.listdir(self.generations_dir) if self._generation_number(name) is not None]
+		return sorted(names, key=self._generation_number)
+
+	def live_generation(self):
+		"""
+		return the name of the generation the cache dir points to, or None if the
+		cache dir isn't managed by an installer (yet)
+		"""
+		if not os.path.islink(self.cache_dir):
+			return None
+		return os.path.basename(os.path.normpath(os.readlink(self.cache_dir)))
+
+	def get_generation_dir(self, generation):
+		return os.path.join(self.generations_dir, generation)
+
+	def migrate(self):
+		"""
+		turn a plain cache dir into the first generation. Readers only miss the cache
+		between the two renames this takes, and only the first time.
+		"""
+		with self._locked():
+			self._migrate()
+
+	@contextmanager
+	def _locked(self):
+		# The thread lock keeps this process's installers in order, the lock file
+		# other processes (farm jobs, other artists)
+		with self._lock:
+			if not os.path.isdir(self.generations_dir):
+				try:
+					os.makedirs(self.generations_dir)
+					os.chmod(self.generations_dir, self.DIR_MODE)
+				except OSError:
+					# Another process made it first
+					if not os.path.isdir(self.generations_dir):
+						raise
+			lock_file = open(os.path.join(self.generations_dir, self.LOCK_FILENAME), "a")
+			try:
+				fcntl.flock(lock_file, fcntl.LOCK_EX)
+				yield
+			finally:
+				fcntl.flock(lock_file, fcntl.LOCK_UN)
+				lock_file.close()
+
+	def _migrate(self):
+		if os.path.islink(self.cache_dir):
+			return
+		if not os.path.exists(self.cache_dir):
+			return
+
+		generation = self._next_generation()
+		os.rename(self.cache_dir, self.get_generation_dir(generation))
+		self._point_to(generation)
+
+	def stage(self, clone=True):
+		"""
+		return a new staging dir for the next generation. If clone is True it starts
+		out as a copy of the live cache, made with hard links, so callers only need
+		to write the files that changed. Files must be replaced (written to a new
+		file and renamed, like pipeline_io.writefile does), not changed in place, or
+		the change shows up in the previous generation too.
+		"""
+		self.migrate()
+		staging = tempfile.mkdtemp(prefix=self.STAGING_PREFIX, dir=self.generations_dir)
+		os.chmod(staging, self.DIR_MODE)
+
+		if clone and os.path.isdir(self.cache_dir):
+			live = os.path.realpath(self.cache_dir)
+			for name in os.listdir(live):
+				self._clone(os.path.join(live, name), os.path.join(staging, name))
+		return staging
+
+	def commit(self, staging, reclaim=True):
+		"""
+		make the staged dir the live cache. returns the new generation's name.
+		Old generations are deleted on a background thread if reclaim is True.
+		"""
+		with self._locked():
+			self._set_permissions(staging)
+			generation = self._next_generation()
+			os.rename(staging, self.get_generation_dir(generation))
+			self._point_to(generation)
+
+		if reclaim:
+			self.reclaim(background=True)
+		return generation
+
+	def abort(self, staging):
+		shutil.rmtree(staging, ignore_errors=True)
+
+	def install(self, files, clone=False, move=False):
+		"""
+		stage the given files, swap them in and return the new generation's name.
+		files -- paths of files or directories to put in the cache
+		clone -- keep the files of the live cache that aren't replaced. If False
+			the new cache holds only the given files.
+		move -- move the files instead of copying them
+		"""
+		staging = self.stage(clone=clone)
+		try:
+			for src in files:
+				dst = os.path.join(staging, os.path.basename(os.path.normpath(src)))
+				if os.path.isdir(dst) and not os.path.islink(dst):
+					shutil.rmtree(dst)
+				elif os.path.lexists(dst):
+					os.remove(dst)
+
+				if move:
+					shutil.move(src, dst)
+				elif os.path.isdir(src):
+					shutil.copytree(src, dst, symlinks=True)
+				else:
+					shutil.copy2(src, dst)
+		except:
+			self.abort(staging)
+			raise
+		return self.commit(staging)
+
+	def rollback(self):
+		"""
+		point the cache back at the generation before the live one. returns the name
+		of that generation. Raises EnvironmentError if there isn't one.
+		"""
+		with self._locked():
+			generations = self.generations()
+			live = self.live_generation()
+			if live not in generations or generations.index(live) == 0:
+				raise EnvironmentError("no previous cache generation for " + self.cache_dir)
+			previous = generations[generations.index(live) - 1]
+			self._point_to(previous)
+			return previous
+
+	def reclaim(self, background=False):
+		"""
+		delete all but the newest generations (always keeping the live one and the
+		one before it). Runs on a daemon thread if background is True.
+		"""
+		if background:
+			thread = threading.Thread(target=self.reclaim, name="cache_reclaim")
+			thread.daemon = True
+			thread.start()
+			return thread
+
+		with self._locked():
+			generations = self.generations()
+			live = self.live_generation()
+			keep = set(generations[-self.keep:])
+			if live in generations:
+				keep.add(live)
+				index = generations.index(live)
+				if index > 0:
+					keep.add(generations[index - 1])
+			stale = [generation for generation in generations if generation not in keep]
+
+			for generation in stale:
+				shutil.rmtree(self.get_generation_dir(generation), ignore_errors=True)
+		return stale
+
+	def _point_to(self, generation):
+		# Swap the symlink: build the new link beside it and rename it over the old one
+		target = os.path.join(self.GENERATIONS_DIR, generation)
+		link = os.path.join(os.path.dirname(self.cache_dir), ".cache_link_" + str(os.getpid()) + "_" + str(threading.current_thread().ident))
+		if os.path.lexists(link):
+			os.remove(link)
+		os.symlink(target, link)
+		os.rename(link, self.cache_dir)
+
+	def _next_generation(self):
+		generations = self.generations()
+		number = self._generation_number(generations[-1]) + 1 if generations else 0
+		while True:
+			generation = self.GENERATION_PREFIX + "%06d" % number
+			if not os.path.exists(self.get_generation_dir(generation)):
+				return generation
+			number += 1
+
+	def _generation_number(self, name):
+		if not name.startswith(self.GENERATION_PREFIX):
+			return None
+		try:
+			return int(name[len(self.GENERATION_PREFIX):])
+		except ValueError:
+			return None
+
+	def _clone(self, src, dst):
+		if os.path.islink(src):
+			os.symlink(os.readlink(src), dst)
+		elif os.path.isdir(src):
+			os.mkdir(dst)
+			for name in os.listdir(src):
+				self._clone(os.path.join(src, name), os.path.join(dst, name))
+		else:
+			try:
+				os.link(src, dst)
+			except OSError:
+				shutil.copy2(src, dst)
+
+	def _set_permissions(self, staging):
+		for dirpath, dirnames, filenames in os.walk(staging):
+			for name in dirnames:
+				self._chmod(os.path.join(dirpath, name), self.DIR_MODE)
+			for name in filenames:
+				path = os.path.join(dirpath, name)
+				# Files cloned from the live cache are hard links to the previous
+				# generation's files. Only the newly written ones get the mode.
+				if not os.path.islink(path) and os.stat(path).st_nlink > 1:
+					continue
+				self._chmod(path, self.FILE_MODE)
+
+	def _chmod(self, path, mode):
+		if os.path.islink(path):
+			return
+		try:
+			os.chmod(path, mode)
+		except OSError:
+			# Hard linked files owned by someone else keep their mode
+			pass
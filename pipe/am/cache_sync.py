@@ -0,0 +1,204 @@
+import hashlib
+import os
+import shutil
+import time
+from multiprocessing.pool import ThreadPool
+
+BLOCK_SIZE = 4 * 1024 * 1024
+
+class SyncReport:
+	"""
+	Class describing the result of a sync:
+	copied -- relative paths of the files that were new or changed
+	skipped -- relative paths of the files that were already up to date
+	deleted -- relative paths of the files that were removed from the destination
+	errors -- (relative path, error message) pairs
+	"""
+
+	def __init__(self):
+		self.copied = []
+		self.skipped = []
+		self.deleted = []
+		self.errors = []
+		self.bytes_copied = 0
+		self.bytes_skipped = 0
+		self.elapsed = 0.0
+
+	def succeeded(self):
+		return not self.errors
+
+	def __str__(self):
+		return "copied {0} files ({1}), skipped {2} files ({3}), deleted {4} files in {5:.1f}s{6}".format(
+			len(self.copied), format_size(self.bytes_copied),
+			len(self.skipped), format_size(self.bytes_skipped),
+			len(self.deleted), self.elapsed,
+			", {0} errors".format(len(self.errors)) if self.errors else "")
+
+def format_size(size):
+	for unit in ["B", "KB", "MB", "GB"]:
+		if size < 1024:
+			return "{0:.1f}{1}".format(size, unit)
+		size /= 1024.0
+	return "{0:.1f}TB".format(size)
+
+def checksum(filepath, block_size=BLOCK_SIZE):
+	"""
+	return the sha1 of the file, read one block at a time
+	"""
+	digest = hashlib.sha1()
+	with open(filepath, "rb") as f:
+		block = f.read(block_size)
+		while block:
+			digest.update(block)
+			block = f.read(block_size)
+	return digest.hexdigest()
+
+def list_files(root):
+	"""
+	return a dict of path relative to root -> os.stat result for every file under root.
+	Symlinks are listed as files and not followed.
+	"""
+	files = {}
+	if not os.path.isdir(root):
+		return files
+	for dirpath, dirnames, filenames in os.walk(root):
+		for name in filenames + [name for name in dirnames if os.path.islink(os.path.join(dirpath, name))]:
+			filepath = os.path.join(dirpath, name)
+			files[os.path.relpath(filepath, root)] = os.lstat(filepath)
+	return files
+
+def is_unchanged(src, dst, src_stat, dst_stat, use_checksum=False):
+	"""
+	return whether dst already holds what src does. Files of different sizes have
+	changed. Files with the same size and mtime haven't, since copies keep the
+	mtime. With use_checksum, same sized files with another mtime are compared by
+	content instead of being copied again.
+	"""
+	if os.path.islink(src) or os.path.islink(dst):
+		return os.path.islink(src) and os.path.islink(dst) and os.readlink(src) == os.readlink(dst)
+	if src_stat.st_size != dst_stat.st_size:
+		return False
+	if int(src_stat.st_mtime) == int(dst_stat.st_mtime):
+		return True
+	return use_checksum and checksum(src) == checksum(dst)
+
+def copy_file(src, dst):
+	"""
+	copy src to dst through a temp file that is renamed over dst, so dst is always
+	whole and a hard link at dst (e.g. in a CacheInstaller staging dir) is replaced
+	instead of written through
+	"""
+	dst_dir = os.path.dirname(dst)
+	if not os.path.isdir(dst_dir):
+		os.makedirs(dst_dir)
+	tmp_dst = os.path.join(dst_dir, "." + os.path.basename(dst) + ".sync_tmp")
+	if os.path.islink(src):
+		if os.path.lexists(tmp_dst):
+			os.remove(tmp_dst)
+		os.symlink(os.readlink(src), tmp_dst)
+	else:
+		shutil.copy2(src, tmp_dst)
+	os.rename(tmp_dst, dst)
+
+def remove_path(path):
+	"""
+	remove the file, symlink or directory at path, if there is one
+	"""
+	if os.path.isdir(path) and not os.path.islink(path):
+		shutil.rmtree(path)
+	elif os.path.lexists(path):
+		os.remove(path)
+
+def sync(src, dst, workers=4, use_checksum=False, delete=True):
+	"""
+	make the directory dst match the directory src, copying only new and changed
+	files, in parallel. Returns a SyncReport. Errors on single files are collected
+	in the report instead of stopping the sync.
+	use_checksum -- compare same sized files by content when their mtimes differ
+	delete -- remove files from dst that aren't in src
+	"""
+	report = SyncReport()
+	start = time.time()
+
+	src_files = list_files(src)
+	dst_files = list_files(dst)
+
+	to_copy = []
+	for relpath, src_stat in sorted(src_files.items()):
+		dst_stat = dst_files.get(relpath)
+		if dst_stat is not None:
+			try:
+				unchanged = is_unchanged(os.path.join(src, relpath), os.path.join(dst, relpath), src_stat, dst_stat, use_checksum)
+			except (IOError, OSError) as e:
+				report.errors.append((relpath, str(e)))
+				continue
+			if unchanged:
+				report.skipped.append(relpath)
+				report.bytes_skipped += src_stat.st_size
+				continue
+		to_copy.append(relpath)
+
+	def copy(relpath):
+		try:
+			copy_file(os.path.join(src, relpath), os.path.join(dst, relpath))
+		except (IOError, OSError) as e:
+			return relpath, str(e)
+		return relpath, None
+
+	if to_copy:
+		pool = ThreadPool(max(1, min(workers, len(to_copy))))
+		try:
+			results = pool.map(copy, to_copy)
+		finally:
+			pool.close()
+			pool.join()
+
+		for relpath, error in results:
+			if error is not None:
+				report.errors.append((relpath, error))
+				continue
+			report.copied.append(relpath)
+			report.bytes_copied += src_files[relpath].st_size
+
+	if delete:
+		for relpath in sorted(set(dst_files) - set(src_files)):
+			try:
+				os.remove(os.path.join(dst, relpath))
+			except OSError as e:
+				report.errors.append((relpath, str(e)))
+				continue
+			report.deleted.append(relpath)
+		_remove_empty_dirs(dst, src)
+
+	report.elapsed = time.time() - start
+	return report
+
+def sync_file(src, dst, use_checksum=False):
+	"""
+	copy the file src to dst unless dst already holds it. Returns a SyncReport.
+	"""
+	report = SyncReport()
+	start = time.time()
+	relpath = os.path.basename(dst)
+	src_stat = os.lstat(src)
+
+	try:
+		if os.path.lexists(dst) and is_unchanged(src, dst, src_stat, os.lstat(dst), use_checksum):
+			report.skipped.append(relpath)
+			report.bytes_skipped += src_stat.st_size
+		else:
+			copy_file(src, dst)
+			report.copied.append(relpath)
+			report.bytes_copied += src_stat.st_size
+	except (IOError, OSError) as e:
+		report.errors.append((relpath, str(e)))
+
+	report.elapsed = time.time() - start
+	return report
+
+def _remove_empty_dirs(root, src):
+	for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+		if dirpath == root or os.listdir(dirpath):
+			continue
+		if not os.path.isdir(os.path.join(src, os.path.relpath(dirpath, root))):
+			os.rmdir(dirpath)
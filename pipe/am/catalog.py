@@ -0,0 +1,245 @@
+import os
+import threading
+
+from . import pipeline_io
+from . import publish_archive
+from .body import Body
+from .element import Element
+from .environment import Department
+from .project import Project
+
+class BodySummary:
+	"""
+	Class describing the fields of a body that browsers show, read straight from its
+	.body file without building a Body
+	"""
+
+	def __init__(self, name, filepath, datadict):
+		self.name = name
+		self.filepath = filepath
+		self.type = datadict.get(Body.TYPE, "")
+		self.description = datadict.get(Body.DESCRIPTION, "")
+
+	def __repr__(self):
+		return "BodySummary(" + self.name + ", " + str(self.type) + ")"
+
+class ElementSummary:
+	"""
+	Class describing the fields of an element that browsers show, read straight from
+	its .element file without building an Element (which also creates its cache dir)
+	"""
+
+	def __init__(self, body_name, department, filepath, datadict):
+		self.body_name = body_name
+		self.department = department
+		self.filepath = filepath
+		self.name = datadict.get(Element.NAME, os.path.basename(filepath))
+		self.assigned_user = datadict.get(Element.ASSIGNED_USER, "")
+		self.status = datadict.get(Element.STATUS, "")
+		self.start_date = datadict.get(Element.START_DATE, "")
+		self.end_date = datadict.get(Element.END_DATE, "")
+		self.latest_version = datadict.get(Element.LATEST_VERSION, -1)
+		# The latest publish is always kept in the .element file, not the publish archive
+		publishes = datadict.get(Element.PUBLISHES, [])
+		index = self.latest_version - publish_archive.offset(datadict.get(Element.PUBLISH_SEGMENTS, []))
+		if self.latest_version >= 0 and 0 <= index < len(publishes):
+			self.last_publish = publishes[index]
+		else:
+			self.last_publish = None
+		notes = datadict.get(Element.NOTES, [])
+		self.last_note = notes[-1] if notes else ""
+
+	def __repr__(self):
+		return "ElementSummary(" + self.body_name + ", " + self.department + ", " + self.name + ")"
+
+class Catalog:
+	"""
+	Class that caches body and element summaries for browsing a project. Directory
+	listings are cached by the directory's mtime and summaries by their pipeline
+	file's mtime, so after the first read a refresh costs one stat per entry instead
+	of parsing every .body and .element again. Safe to use from several threads.
+
+	catalog = get_catalog()
+	for name in catalog.list_assets(AssetType.PROP):
+		print catalog.body(name).description
+	"""
+
+	def __init__(self, project=None):
+		self._project = project if project is not None else Project()
+		self._lock = threading.Lock()
+		self._listings = {}
+		self._summaries = {}
+
+	def get_project(self):
+		return self._project
+
+	def list_assets(self, asset_type=None, name_filter=None):
+		"""
+		return the names of the assets in the project, sorted
+		asset_type -- only return assets of this type
+		name_filter -- only return assets with this string in their name
+		"""
+		names = self._list_dir(self._project.get_assets_dir(), Body.PIPELINE_FILENAME)
+		if name_filter:
+			names = [name for name in names if name_filter in name]
+		if asset_type:
+			names = [name for name in names if self._type_of(name) == asset_type]
+		return names
+
+	def body(self, name):
+		"""
+		return the BodySummary of the named asset, or None if there is no such asset
+		"""
+		filepath = os.path.join(self._project.get_assets_dir(), name)
+		datadict = self._read(os.path.join(filepath, Body.PIPELINE_FILENAME))
+		if datadict is None:
+			return None
+		return BodySummary(name, filepath, datadict)
+
+	def elements(self, body_name, departments=None):
+		"""
+		return the ElementSummaries of the named asset, ordered by department (in the
+		given order) and then by name
+		departments -- the departments to list, defaults to Department.ALL
+		"""
+		if departments is None:
+			departments = Department.ALL
+		summaries = []
+		for department in departments:
+			for name in self.list_elements(body_name, department):
+				summary = self.element(body_name, department, name)
+				if summary is not None:
+					summaries.append(summary)
+		return summaries
+
+	def list_crowd_cycles(self):
+		"""
+		return the names of the crowd cycles in the project, sorted
+		"""
+		return self._list_dir(self._project.get_crowds_dir(), Body.PIPELINE_FILENAME)
+
+	def list_elements(self, body_name, department, parent_dir=None):
+		"""
+		return the names of the body's elements in the given department, sorted
+		parent_dir -- the directory the body is in, defaults to the assets dir
+		"""
+		if parent_dir is None:
+			parent_dir = self._project.get_assets_dir()
+		return self._list_dir(os.path.join(parent_dir, body_name, department), Element.PIPELINE_FILENAME)
+
+	def element(self, body_name, department, name=Element.DEFAULT_NAME, parent_dir=None):
+		"""
+		return the ElementSummary of the given element, or None if it doesn't exist
+		parent_dir -- the directory the body is in, defaults to the assets dir
+		"""
+		if parent_dir is None:
+			parent_dir = self._project.get_assets_dir()
+		filepath = os.path.join(parent_dir, body_name, department, name)
+		datadict = self._read(os.path.join(filepath, Element.PIPELINE_FILENAME))
+		if datadict is None:
+			return None
+		return ElementSummary(body_name, department, filepath, datadict)
+
+	def publish_table(self, department, body_names, parent_dir=None, element_name=Element.DEFAULT_NAME):
+		"""
+		return {body name: latest published version} of the given department's
+		element for each body, in one pass. The version is -1 if nothing has been
+		published and None if the body has no such element. Unchanged .element files
+		aren't read again, so building the table again only costs a stat per body.
+		"""
+		table = {}
+		for body_name in body_names:
+			summary = self.element(body_name, department, element_name, parent_dir)
+			table[body_name] = summary.latest_version if summary is not None else None
+		return table
+
+	def published(self, department, body_names, parent_dir=None):
+		"""
+		return the bodies, in the given order, whose element in the department has been published
+		"""
+		table = self.publish_table(department, body_names, parent_dir)
+		return [name for name in body_names if table[name] is not None and table[name] >= 0]
+
+	def invalidate(self, path=None):
+		"""
+		drop everything cached for path and below it, and the listing of its parent
+		dir, or the whole cache if no path is given. Only needed for changes made
+		within the mtime resolution of the file system, since other changes are
+		picked up by their mtime.
+		"""
+		with self._lock:
+			if path is None:
+				self._listings.clear()
+				self._summaries.clear()
+				return
+			path = os.path.normpath(path)
+			self._listings.pop(os.path.dirname(path), None)
+			for cache in (self._listings, self._summaries):
+				for key in list(cache):
+					if key == path or key.startswith(path + os.sep):
+						del cache[key]
+
+	def _type_of(self, name):
+		summary = self.body(name)
+		return summary.type if summary is not None else None
+
+	def _list_dir(self, dirpath, pipeline_filename):
+		# A directory that is listed between its mkdir and the write of its pipeline
+		# file has no entry yet, and adding the file doesn't change the parent's
+		# mtime, so those directories are checked again on every call
+		dirpath = os.path.normpath(dirpath)
+		try:
+			mtime = os.stat(dirpath).st_mtime
+		except OSError:
+			return []
+
+		with self._lock:
+			cached = self._listings.get(dirpath)
+		if cached is None or cached[0] != mtime:
+			names = []
+			pending = []
+			for name in os.listdir(dirpath):
+				if os.path.exists(os.path.join(dirpath, name, pipeline_filename)):
+					names.append(name)
+				elif os.path.isdir(os.path.join(dirpath, name)):
+					pending.append(name)
+			cached = (mtime, sorted(names), pending)
+		elif cached[2]:
+			ready = [name for name in cached[2] if os.path.exists(os.path.join(dirpath, name, pipeline_filename))]
+			if ready:
+				cached = (mtime, sorted(cached[1] + ready), [name for name in cached[2] if name not in ready])
+
+		with self._lock:
+			self._listings[dirpath] = cached
+		return list(cached[1])
+
+	def _read(self, filepath):
+		filepath = os.path.normpath(filepath)
+		try:
+			mtime = os.stat(filepath).st_mtime
+		except OSError:
+			return None
+
+		with self._lock:
+			cached = self._summaries.get(filepath)
+		if cached is not None and cached[0] == mtime:
+			return cached[1]
+
+		try:
+			datadict = pipeline_io.readfile(filepath)
+		except (IOError, ValueError):
+			return None
+		with self._lock:
+			self._summaries[filepath] = (mtime, datadict)
+		return datadict
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+	global _catalog
+	with _catalog_lock:
+		if _catalog is None:
+			_catalog = Catalog()
+		return _catalog
@@ -0,0 +1,267 @@
+import os
+import threading
+import time
+
+try:
+	import pyinotify
+except ImportError:
+	pyinotify = None
+
+CREATED = "created"
+MODIFIED = "modified"
+DELETED = "deleted"
+
+class ChangeEvent:
+	"""
+	Class describing a change to a path: CREATED, MODIFIED or DELETED. Directory
+	watchers report the directory a change happened in, so a new .element file
+	shows up as its element directory being modified.
+	"""
+
+	def __init__(self, path, kind):
+		self.path = path
+		self.kind = kind
+
+	def __repr__(self):
+		return "ChangeEvent(" + self.path + ", " + self.kind + ")"
+
+	def is_under(self, root):
+		root = os.path.normpath(root)
+		return self.path == root or self.path.startswith(root + os.sep)
+
+def is_network_path(path):
+	"""
+	return whether path is on an NFS (or other network) mount, where inotify doesn't
+	see changes made by other machines
+	"""
+	path = os.path.realpath(path)
+	try:
+		with open("/proc/mounts") as mounts:
+			entries = [line.split() for line in mounts]
+	except IOError:
+		return False
+	best = ("", "")
+	for entry in entries:
+		if len(entry) < 3:
+			continue
+		mount_point, fs_type = entry[1], entry[2]
+		if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > len(best[0]):
+			best = (mount_point, fs_type)
+	return best[1].startswith("nfs") or best[1] in ("cifs", "smbfs", "fuse.sshfs")
+
+class ChangeFeed:
+	"""
+	Class that watches directory trees and delivers batches of ChangeEvents to its
+	subscribers. Events are debounced: a batch goes out once nothing has changed for
+	`debounce` seconds (or after `max_delay` seconds of constant changes), with one
+	event per path, so a publish that writes several files is one update.
+
+	Uses inotify (through pyinotify) for local trees, and polls directory mtimes
+	for trees on network mounts or when pyinotify isn't installed. Pipeline files
+	are written to a temp file and renamed, so their directory's mtime changes with
+	every metadata update and polling the directories is enough to see them.
+
+	feed = ChangeFeed([env.get_assets_dir(), env.get_users_dir()])
+	feed.subscribe(lambda events: ...) # called on the feed's thread
+	feed.start()
+	"""
+
+	def __init__(self, roots, debounce=0.5, max_delay=5.0, poll_interval=5.0, max_depth=4, use_inotify=None):
+		"""
+		roots -- the directories to watch
+		max_depth -- how many directory levels below each root are polled
+		use_inotify -- force inotify on or off, by default it's used for local roots
+		"""
+		self.roots = [os.path.normpath(root) for root in roots]
+		self.debounce = debounce
+		self.max_delay = max_delay
+		self.poll_interval = poll_interval
+		self.max_depth = max_depth
+		self.use_inotify = use_inotify
+		self._subscribers = []
+		self._pending = {}
+		self._first_pending = None
+		self._last_pending = None
+		self._condition = threading.Condition()
+		self._stopped = threading.Event()
+		self._threads = []
+		self._notifier = None
+		self._dirs = {}
+
+	def subscribe(self, callback):
+		"""
+		call callback(events) with each batch of ChangeEvents, on the feed's thread
+		"""
+		self._subscribers.append(callback)
+
+	def unsubscribe(self, callback):
+		if callback in self._subscribers:
+			self._subscribers.remove(callback)
+
+	def start(self):
+		self._stopped.clear()
+		inotify_roots = []
+		poll_roots = []
+		for root in self.roots:
+			if self._should_use_inotify(root):
+				inotify_roots.append(root)
+			else:
+				poll_roots.append(root)
+
+		if inotify_roots and not self._start_inotify(inotify_roots):
+			poll_roots.extend(inotify_roots)
+		if poll_roots:
+			self._start_thread(self._poll, "change_feed_poll", poll_roots)
+		self._start_thread(self._dispatch, "change_feed_dispatch")
+
+	def stop(self):
+		self._stopped.set()
+		with self._condition:
+			self._condition.notify_all()
+		if self._notifier is not None:
+			self._notifier.stop()
+			self._notifier = None
+		for thread in self._threads:
+			if thread is not threading.current_thread():
+				thread.join(self.poll_interval + 1)
+		self._threads = []
+
+	def notify(self, path, kind=MODIFIED):
+		"""
+		queue a change to be delivered with the next batch. Watchers call this, and
+		so can code that knows it changed something and wants it seen right away.
+		"""
+		path = os.path.normpath(path)
+		with self._condition:
+			previous = self._pending.get(path)
+			# A path that was created and then changed in the same batch is still new
+			if not (previous == CREATED and kind == MODIFIED):
+				self._pending[path] = kind
+			now = time.time()
+			if self._first_pending is None:
+				self._first_pending = now
+			self._last_pending = now
+			self._condition.notify_all()
+
+	def _should_use_inotify(self, root):
+		if pyinotify is None:
+			return False
+		if self.use_inotify is not None:
+			return self.use_inotify
+		return not is_network_path(root)
+
+	def _start_thread(self, target, name, *args):
+		thread = threading.Thread(target=target, name=name, args=args)
+		thread.daemon = True
+		thread.start()
+		self._threads.append(thread)
+
+	def _dispatch(self):
+		while not self._stopped.is_set():
+			with self._condition:
+				while not self._pending and not self._stopped.is_set():
+					self._condition.wait(1.0)
+				if self._stopped.is_set():
+					return
+				now = time.time()
+				wait = min(self._last_pending + self.debounce, self._first_pending + self.max_delay) - now
+				if wait > 0:
+					self._condition.wait(wait)
+					continue
+				events = [ChangeEvent(path, kind) for path, kind in sorted(self._pending.items())]
+				self._pending = {}
+				self._first_pending = None
+				self._last_pending = None
+
+			for callback in list(self._subscribers):
+				try:
+					callback(events)
+				except Exception as e:
+					print "Change feed subscriber failed: " + str(e)
+
+	# polling
+
+	def _poll(self, roots):
+		for root in roots:
+			self._scan(root, 0, report=False)
+		while not self._stopped.wait(self.poll_interval):
+			for root in roots:
+				self._scan(root, 0, report=True)
+
+	def _scan(self, dirpath, depth, report):
+		# _dirs holds (mtime, subdirectories) for every directory polled so far
+		try:
+			mtime = os.stat(dirpath).st_mtime
+		except OSError:
+			self._forget(dirpath, report)
+			return
+
+		previous = self._dirs.get(dirpath)
+		if report and previous is None:
+			self.notify(dirpath, CREATED)
+		elif report and previous[0] != mtime:
+			self.notify(dirpath, MODIFIED)
+
+		if depth >= self.max_depth:
+			subdirs = set()
+		elif previous is None or previous[0] != mtime:
+			# Only a changed directory can have new or removed subdirectories
+			try:
+				names = os.listdir(dirpath)
+			except OSError:
+				names = []
+			subdirs = set(os.path.join(dirpath, name) for name in names if os.path.isdir(os.path.join(dirpath, name)))
+			if previous is not None:
+				for removed in previous[1] - subdirs:
+					self._forget(removed, report)
+		else:
+			subdirs = previous[1]
+
+		self._dirs[dirpath] = (mtime, subdirs)
+		for subdir in subdirs:
+			self._scan(subdir, depth + 1, report)
+
+	def _forget(self, dirpath, report):
+		entry = self._dirs.pop(dirpath, None)
+		if entry is None:
+			return
+		for subdir in entry[1]:
+			self._forget(subdir, False)
+		if report:
+			self.notify(dirpath, DELETED)
+
+	# inotify
+
+	def _start_inotify(self, roots):
+		feed = self
+
+		class Handler(pyinotify.ProcessEvent):
+
+			def process_default(self, event):
+				if event.mask & (pyinotify.IN_DELETE_SELF | pyinotify.IN_MOVE_SELF):
+					feed.notify(event.path, DELETED)
+				elif event.mask & pyinotify.IN_ISDIR and event.mask & (pyinotify.IN_CREATE | pyinotify.IN_MOVED_TO):
+					feed.notify(event.pathname, CREATED)
+				elif event.mask & pyinotify.IN_ISDIR and event.mask & (pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM):
+					feed.notify(event.pathname, DELETED)
+				else:
+					feed.notify(event.path, MODIFIED)
+
+		mask = (pyinotify.IN_CREATE | pyinotify.IN_DELETE | pyinotify.IN_CLOSE_WRITE |
+				pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO | pyinotify.IN_DELETE_SELF | pyinotify.IN_MOVE_SELF)
+		manager = pyinotify.WatchManager()
+		try:
+			for root in roots:
+				result = manager.add_watch(root, mask, rec=True, auto_add=True, quiet=False)
+				if not all(descriptor > 0 for descriptor in result.values()):
+					raise pyinotify.WatchManagerError("could not watch all of " + root, result)
+			notifier = pyinotify.ThreadedNotifier(manager, Handler())
+			notifier.daemon = True
+			notifier.start()
+		except (pyinotify.WatchManagerError, OSError) as e:
+			# Usually too many directories for fs.inotify.max_user_watches
+			print "Falling back to polling for " + ", ".join(roots) + ": " + str(e)
+			manager.close()
+			return False
+		self._notifier = notifier
+		return True
@@ -0,0 +1,126 @@
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+class DiskUsage:
+	"""
+	Class that computes directory sizes on a pool of worker threads and caches them.
+	Each directory is cached on its own, keyed by its mtime, with the size of the
+	files directly in it and the list of its subdirectories. Recomputing the size of
+	a tree costs one stat per directory and only lists the directories that changed.
+
+	Adding, removing or renaming a file changes its directory's mtime. Rewriting a
+	file in place doesn't, so callers that know about such changes (from a change
+	feed, say) should invalidate() the file's directory.
+
+	usage = get_disk_usage()
+	usage.request(checkout_dir, lambda path, size: ...) # called on a worker thread
+	usage.cached_size(checkout_dir) # the last computed size, or None
+	"""
+
+	def __init__(self, workers=4):
+		self._pool = ThreadPool(workers)
+		self._lock = threading.Lock()
+		self._dirs = {}
+		self._totals = {}
+		self._pending = {}
+
+	def cached_size(self, path):
+		"""
+		return the last computed size of the tree at path, or None. Doesn't touch the disk.
+		"""
+		with self._lock:
+			return self._totals.get(os.path.normpath(path))
+
+	def size(self, path):
+		"""
+		return the size in bytes of the files in the tree at path, computed on this thread
+		"""
+		path = os.path.normpath(path)
+		total = self._tree_size(path)
+		with self._lock:
+			self._totals[path] = total
+		return total
+
+	def request(self, path, callback=None):
+		"""
+		compute the size of the tree at path in the background and call
+		callback(path, size) on the worker thread when it's done. Requests for a path
+		that is already being computed share that computation.
+		"""
+		path = os.path.normpath(path)
+		with self._lock:
+			callbacks = self._pending.get(path)
+			if callbacks is not None:
+				if callback is not None:
+					callbacks.append(callback)
+				return
+			self._pending[path] = [callback] if callback is not None else []
+		self._pool.apply_async(self._run, (path,))
+
+	def invalidate(self, path):
+		"""
+		forget what is cached for the directory at path and below it, so the next size
+		request lists it again
+		"""
+		path = os.path.normpath(path)
+		with self._lock:
+			for key in list(self._dirs):
+				if key == path or key.startswith(path + os.sep):
+					del self._dirs[key]
+
+	def _run(self, path):
+		try:
+			total = self.size(path)
+		except Exception as e:
+			print "Could not compute the size of " + path + ": " + str(e)
+			total = None
+		with self._lock:
+			callbacks = self._pending.pop(path, [])
+		for callback in callbacks:
+			try:
+				callback(path, total)
+			except Exception as e:
+				print "Disk usage callback for " + path + " failed: " + str(e)
+
+	def _tree_size(self, path):
+		try:
+			mtime = os.stat(path).st_mtime
+		except OSError:
+			return 0
+
+		with self._lock:
+			cached = self._dirs.get(path)
+		if cached is None or cached[0] != mtime:
+			files_size = 0
+			subdirs = []
+			try:
+				names = os.listdir(path)
+			except OSError:
+				names = []
+			for name in names:
+				child = os.path.join(path, name)
+				try:
+					st = os.lstat(child)
+				except OSError:
+					continue
+				if os.path.isdir(child) and not os.path.islink(child):
+					subdirs.append(child)
+				else:
+					files_size += st.st_size
+			cached = (mtime, files_size, subdirs)
+			with self._lock:
+				self._dirs[path] = cached
+
+		return cached[1] + sum(self._tree_size(subdir) for subdir in cached[2])
+
+
+_disk_usage = None
+_disk_usage_lock = threading.Lock()
+
+def get_disk_usage():
+	global _disk_usage
+	with _disk_usage_lock:
+		if _disk_usage is None:
+			_disk_usage = DiskUsage()
+		return _disk_usage
@@ -3,6 +3,10 @@
 import os
 import shutil
 from pipe.am.environment import Environment
+from pipe.am.cache_install import CacheInstaller
+from pipe.am import cache_sync
+from pipe.am import publish_archive
+from pipe.am import sequence_cache
 import pipeline_io
 
 
@@ -18,6 +22,7 @@ class Checkout:
     ELEMENT = "element_name"
     FILES = "filename"
     TIMES = "time"
+    PRUNED = "pruned"
 
     @staticmethod
     def create_new_dict(username, body, department, element):
@@ -72,6 +77,20 @@ class Checkout:
         """
         return self._datadict[self.TIMES]
 
+    def list_pruned_files(self):
+        """
+        list the checked out files that were deleted by a retention policy
+        """
+        return self._datadict.get(self.PRUNED, [])
+
+    def record_pruned_files(self, filepaths):
+        """
+        record that the given checked out files have been deleted
+        """
+        pruned = self._datadict.setdefault(self.PRUNED, [])
+        pruned.extend(filepath for filepath in filepaths if filepath not in pruned)
+        pipeline_io.writefile(self._pipeline_file, self._datadict)
+
     def add_operation(self, filepath):
         """
         record the result of a checkout operation.
@@ -97,6 +116,10 @@ class Element:
     LATEST_VERSION = "latest_version"
     ASSIGNED_USER = "assigned_user"
     PUBLISHES = "publishes"
+    PUBLISH_SEGMENTS = "publish_segments"
+    TAGS = "tags"
+    PRUNED_VERSIONS = "pruned_versions"
+    ROLLBACKS = "rollbacks"
     START_DATE = "start_date"
     END_DATE = "end_date"
     APP_EXT = "app_ext"
@@ -104,6 +127,7 @@ class Element:
     CACHE_FILEPATH = "cache_filepath"
     CHECKOUT_USERS = "checkout_users"
     NOTES = "notes"
+    STATUS = "status"
 
     # @staticmethod
     def create_new_dict(self, name, department, parent_name):
@@ -117,6 +141,10 @@ class Element:
         datadict[Element.LATEST_VERSION] = -1
         datadict[Element.ASSIGNED_USER] = ""
         datadict[Element.PUBLISHES] = []
+        datadict[Element.PUBLISH_SEGMENTS] = []
+        datadict[Element.TAGS] = {}
+        datadict[Element.PRUNED_VERSIONS] = {}
+        datadict[Element.ROLLBACKS] = {}
         datadict[Element.START_DATE] = ""
         datadict[Element.END_DATE] = ""
         datadict[Element.APP_EXT] = self.app_ext
@@ -124,6 +152,7 @@ class Element:
         datadict[Element.CACHE_FILEPATH] = ""
         datadict[Element.CHECKOUT_USERS] = []
         datadict[Element.NOTES] = []
+        datadict[Element.STATUS] = ""
         return datadict
 
     def __init__(self, filepath=None):
@@ -133,6 +162,7 @@ class Element:
         """
         self._env = Environment()
         self.app_ext = None
+        self._history = None
 
         if filepath is not None:
             self.load_pipeline_file(filepath)
@@ -156,6 +186,7 @@ class Element:
         if not os.path.exists(self._pipeline_file):
             raise EnvironmentError("not a valid element: " + self._pipeline_file + " does not exist")
         self._datadict = pipeline_io.readfile(self._pipeline_file)
+        self._history = None
 
     def _update_pipeline_file(self):
 
@@ -202,6 +233,12 @@ class Element:
 
         return self._datadict[self.ASSIGNED_USER]
 
+    def get_latest_version(self):
+        """
+        return the number of the latest published version, or -1 if nothing has been published
+        """
+        return self._datadict[self.LATEST_VERSION]
+
     def get_last_publish(self):
         """
         return a tuple describing the latest publish: (username, timestamp, comment, filepath)
@@ -209,14 +246,153 @@ class Element:
         latest_version = self._datadict[self.LATEST_VERSION]
         if(latest_version<0):
             return None
-        return self._datadict[self.PUBLISHES][latest_version]
+        return self.get_publish_history().get(latest_version)
+
+    def get_publish(self, version):
+        """
+        return the tuple describing the publish of the given version, or None if there is no such version
+        """
+        return self.get_publish_history().get(version)
+
+    def get_publish_history(self):
+        """
+        return the publish_archive.PublishHistory of this element, for paging through its publishes
+        """
+        if self._history is None:
+            self._datadict.setdefault(self.PUBLISH_SEGMENTS, [])
+            self._history = publish_archive.PublishHistory(self._filepath, self._datadict[self.PUBLISHES],
+                                                           self._datadict[self.PUBLISH_SEGMENTS])
+        return self._history
+
+    def count_publishes(self):
 
-    def list_publishes(self):
+        return len(self.get_publish_history())
+
+    def list_publishes(self, first=None, last=None):
         """
-        return a list of tuples describing all publishes for this element.
+        return a list of tuples describing the publishes for this element, oldest first.
         each tuple contains the following: (username, timestamp, comment, filepath)
+        first, last -- only list the versions from first to last (both included).
+                       Listing all of them reads the whole publish archive.
+        """
+        return self.get_publish_history().range(first, last)
+
+    def list_latest_publishes(self, count):
+        """
+        return a list of tuples describing the last count publishes for this element, oldest first
+        """
+        return self.get_publish_history().latest(count)
+
+    def list_publishes_between(self, start=None, end=None):
+        """
+        return a list of tuples describing the publishes made between start and end, oldest first
+        start, end -- seconds since the epoch or timestamps (see pipeline_io.timestamp)
+        """
+        return self.get_publish_history().between(start, end)
+
+    def compact_publishes(self, inline_limit=publish_archive.INLINE_LIMIT, segment_size=publish_archive.SEGMENT_SIZE):
+        """
+        move old publishes out of the .element file into the publish archive, keeping
+        at least inline_limit of them in it. Publishing does this as it goes; this is
+        for elements with a long history from before the archive, or other limits.
+        Returns the number of publishes moved.
+        """
+        moved = self.get_publish_history().compact(inline_limit, segment_size)
+        if moved:
+            self._update_pipeline_file()
+        return moved
+
+    def get_tags(self):
+        """
+        return a dictionary of the tags of this element's versions: {tag: version}
+        """
+        return self._datadict.get(self.TAGS, {})
+
+    def list_tagged_versions(self):
+
+        return sorted(set(self.get_tags().values()))
+
+    def tag_version(self, tag, version):
+        """
+        tag the given published version, e.g. "approved" or "final". A tag names one
+        version at a time, and tagged versions are kept by the retention policies.
+        """
+        if version < 0 or version > self.get_latest_version():
+            raise EnvironmentError("no such version of " + self.get_long_name() + ": " + str(version))
+        if self.is_pruned(version):
+            raise EnvironmentError("version " + str(version) + " of " + self.get_long_name() + " has been pruned")
+        self._datadict.setdefault(self.TAGS, {})[tag] = version
+        self._update_pipeline_file()
+
+    def remove_tag(self, tag):
+
+        if self._datadict.get(self.TAGS, {}).pop(tag, None) is not None:
+            self._update_pipeline_file()
+
+    def list_pruned_versions(self):
+        """
+        return the versions whose files were deleted by a retention policy. Their
+        publishes are still listed, but their filepaths no longer exist.
+        """
+        return sorted(int(version) for version in self._datadict.get(self.PRUNED_VERSIONS, {}))
+
+    def is_pruned(self, version):
+
+        return str(version) in self._datadict.get(self.PRUNED_VERSIONS, {})
+
+    def record_pruned_versions(self, versions):
+        """
+        record that the files of the given versions have been deleted
+        """
+        pruned = self._datadict.setdefault(self.PRUNED_VERSIONS, {})
+        timestamp = pipeline_io.timestamp()
+        for version in versions:
+            pruned[str(version)] = timestamp
+        self._update_pipeline_file()
+
+    def list_rollbacks(self):
+        """
+        return a dictionary of the versions made by rollback: {version: the version whose file it uses}
+        """
+        return dict((int(version), source) for version, source in self._datadict.get(self.ROLLBACKS, {}).items())
+
+    def get_version_source(self, version):
+        """
+        return the version whose directory holds the file of the given version. That's
+        the version itself, unless it was made by a rollback.
+        """
+        return self._datadict.get(self.ROLLBACKS, {}).get(str(version), version)
+
+    def list_rollback_targets(self, count):
+        """
+        return a list of (version, label) tuples for the versions among the last count
+        publishes that this element can be rolled back to, newest first. Versions that
+        use the current version's file, and pruned ones, are left out. Each label reads
+        "v<version> <username> <timestamp> <comment>".
+        """
+        latest_version = self.get_latest_version()
+        publishes = self.list_latest_publishes(count)
+        first_version = latest_version - len(publishes) + 1
+        current_source = self.get_version_source(latest_version)
+
+        targets = []
+        for version in range(latest_version, first_version - 1, -1):
+            publish = publishes[version - first_version]
+            source = self.get_version_source(version)
+            if source == current_source or self.is_pruned(source):
+                continue
+            targets.append((version, "v" + str(version) + " " + publish[0] + " " + publish[1] + " " + publish[2]))
+        return targets
+
+    def list_version_dirs(self):
         """
-        return self._datadict[self.PUBLISHES]
+        return the versions that have a version directory on disk
+        """
+        versions = []
+        for name in os.listdir(self._filepath):
+            if name.startswith(".v") and name[2:].isdigit():
+                versions.append(int(name[2:]))
+        return sorted(versions)
 
     def get_last_note(self):
         """
@@ -240,6 +416,13 @@ class Element:
 
         return self._datadict[self.END_DATE]
 
+    def get_status(self):
+        """
+        return the production status of this element (see environment.Status), or
+        an empty string if it hasn't been set
+        """
+        return self._datadict.get(self.STATUS, "")
+
     def get_app_ext(self):
         """
         return the extension of the application files for this element (including the period)
@@ -340,6 +523,14 @@ class Element:
         self._datadict[self.END_DATE] = date
         self._update_pipeline_file()
 
+    def update_status(self, status):
+        """
+        Update the production status of this element.
+        status -- the new status, one of environment.Status.ALL
+        """
+        self._datadict[self.STATUS] = status
+        self._update_pipeline_file()
+
     def update_checkout_users(self, username):
         """
         add the given username to the checkout_users list, if they aren't already in it.
@@ -400,7 +591,12 @@ class Element:
         dst = self.get_app_filepath()
         timestamp = pipeline_io.timestamp()
         try:
-            shutil.copyfile(src, dst)
+            # Copied next to dst and renamed over it, since after a rollback dst is a
+            # link and writing through it would change the version it points to
+            dst_name, dst_ext = os.path.splitext(dst)
+            tmp_dst = dst_name+"_tmp"+dst_ext
+            shutil.copyfile(src, tmp_dst)
+            os.rename(tmp_dst, dst)
         except Exception, e:
             print(str(e))
 
@@ -414,6 +610,7 @@ class Element:
         old_filepath, new_filename = os.path.split(src)
         new_publish = os.path.join(new_version_dir, new_filename)
         self._datadict[self.PUBLISHES].append((username, timestamp, comment, new_publish))
+        self.get_publish_history().compact()
 
         if status is not None:
             pass
@@ -435,36 +632,120 @@ class Element:
 
         return dst
 
-    def update_cache(self, src, reference=False):
+    def rollback(self, version, username, comment="", hardlink=False):
+        """
+        Make an older version the current one without copying any files. The
+        application file is swapped, in one rename, for a link to the version's file,
+        so a rollback takes the same time whatever the size of the file. The rollback
+        is recorded as a new publish of that file, so get_last_publish (and everything
+        that loads the last publish) gets the older version, and the history shows
+        when it happened. Publishing again replaces the link with a new file.
+        version -- the published version to go back to
+        username -- the username of the user performing this action
+        comment -- defaults to "rollback to version {version}"
+        hardlink -- use a hard link instead of a symbolic link
+        Returns the filepath of the application file.
+        """
+        publish = self.get_publish(version)
+        if publish is None:
+            raise EnvironmentError("no such version of " + self.get_long_name() + ": " + str(version))
+        source_version = self.get_version_source(version)
+        if self.is_pruned(source_version):
+            raise EnvironmentError("version " + str(source_version) + " of " + self.get_long_name() + " has been pruned")
+        src = publish[3]
+        if not os.path.exists(src):
+            raise EnvironmentError("file does not exist: " + src)
+
+        self._datadict[self.APP_EXT] = os.path.splitext(src)[1]
+        dst = self.get_app_filepath()
+        pipeline_io.link_file(src, dst, hardlink)
+
+        new_version = self._datadict[self.LATEST_VERSION] + 1
+        self._datadict[self.LATEST_VERSION] = new_version
+        if not comment:
+            comment = "rollback to version " + str(version)
+        self._datadict[self.PUBLISHES].append((username, pipeline_io.timestamp(), comment, src))
+        self._datadict.setdefault(self.ROLLBACKS, {})[str(new_version)] = source_version
+        self.get_publish_history().compact()
+        self._update_pipeline_file()
+        return dst
+
+    def update_cache(self, src, reference=False, incremental=False, workers=4, use_checksum=False):
         """
-        Update the cache of this element.
+        Update the cache of this element. The rest of the cache is kept, and the
+        new cache is swapped in at once (see CacheInstaller), so readers never see
+        a partial cache.
         src -- the new cache file
         reference -- if false (the default) copy the source into this element's cache folder.
                      if true create a symbolic link to the given source.
                      the reference is useful for very large cache files, where copying would be a hassle.
+        incremental -- only copy the files of src that are new or changed since the last
+                       update, using workers threads, and delete the ones src no longer has.
+                       use_checksum compares files with the same size but another mtime by content.
+                       Returns a cache_sync.SyncReport.
         """
         if not os.path.exists(src):
             raise EnvironmentError("file does not exist: "+src)
         cache_filename = os.path.basename(src)
         cache_dir = self.get_cache_dir()
         cache_filepath = os.path.join(cache_dir, cache_filename)
-        if not os.path.exists(cache_dir):
-            pipeline_io.mkdir(cache_dir)
 
-        if reference: # TODO: sequences?
+        if reference: # Frame sequences are published with publish_sequence
             ref_path = os.path.normpath(src)
             if not ref_path.startswith(self._env.get_project_dir()):
                 raise EnvironmentError("attempted reference is not in the project directory: "+ref_path)
-            self._datadict[self.CACHE_FILEPATH] = ref_path
-            os.symlink(ref_path, cache_filepath)
-        else:
-            self._datadict[self.CACHE_FILEPATH] = cache_filepath
-            if os.path.isdir(src):
-                shutil.copytree(src, cache_filepath)
+
+        installer = self.get_cache_installer()
+        staging = installer.stage()
+        staged_filepath = os.path.join(staging, cache_filename)
+        report = None
+        try:
+            # An incremental update keeps the staged clone and only replaces what changed
+            if reference or not incremental:
+                cache_sync.remove_path(staged_filepath)
+
+            if reference:
+                os.symlink(ref_path, staged_filepath)
+            elif incremental:
+                report = self._sync_cache(src, staged_filepath, workers, use_checksum)
+            elif os.path.isdir(src):
+                shutil.copytree(src, staged_filepath)
             else:
-                shutil.copyfile(src, cache_filepath)
+                shutil.copyfile(src, staged_filepath)
+        except:
+            installer.abort(staging)
+            raise
+        installer.commit(staging)
 
+        self._datadict[self.CACHE_FILEPATH] = ref_path if reference else cache_filepath
         self._update_pipeline_file()
+        return report
+
+    def _sync_cache(self, src, staged_filepath, workers, use_checksum):
+        # A file replaced by a directory or the other way around
+        if os.path.isdir(staged_filepath) != os.path.isdir(src) or os.path.islink(staged_filepath):
+            cache_sync.remove_path(staged_filepath)
+
+        if os.path.isdir(src):
+            report = cache_sync.sync(src, staged_filepath, workers=workers, use_checksum=use_checksum)
+        else:
+            report = cache_sync.sync_file(src, staged_filepath, use_checksum=use_checksum)
+
+        if not report.succeeded():
+            raise EnvironmentError("could not update the cache of " + self.get_long_name() + ": " + str(report.errors))
+        return report
+
+    def get_cache_installer(self):
+        """
+        return a CacheInstaller for this element's cache dir
+        """
+        return CacheInstaller(self.get_cache_dir())
+
+    def rollback_cache(self):
+        """
+        put back the cache this element had before the last cache install
+        """
+        return self.get_cache_installer().rollback()
 
     def list_cache_files(self):
         """
@@ -472,3 +753,69 @@ class Element:
         """
         cache_list = os.listdir(self.get_cache_dir())
         return cache_list
+
+    def get_sequence_dir(self, name):
+        """
+        return the directory the frames of the named sequence cache are kept in
+        """
+        return os.path.join(self.get_cache_dir(), name)
+
+    def publish_sequence(self, src, name=None, start=None, end=None, workers=4):
+        """
+        publish a frame sequence cache and return its SequenceManifest.
+        src -- the directory holding the frames
+        name -- the sequence to publish, if src holds more than one
+        start, end -- only publish (or replace) the frames in this range. The other
+                      published frames are kept.
+        """
+        if not os.path.isdir(src):
+            raise EnvironmentError("directory does not exist: " + src)
+        manifest = sequence_cache.publish(self.get_cache_dir(), src, name, start, end, workers)
+        self._datadict[self.CACHE_FILEPATH] = self.get_sequence_dir(manifest.name)
+        self._update_pipeline_file()
+        return manifest
+
+    def get_sequence(self, name):
+        """
+        return the SequenceManifest of the named sequence cache, or None if it hasn't been published
+        """
+        return sequence_cache.SequenceManifest.read(self.get_sequence_dir(name))
+
+    def list_cache_sequences(self):
+        """
+        list the names of the sequence caches that have been published to this element
+        """
+        cache_dir = self.get_cache_dir()
+        return sorted(name for name in os.listdir(cache_dir)
+                      if os.path.exists(os.path.join(cache_dir, name, sequence_cache.SequenceManifest.FILENAME)))
+
+    def get_frame_path(self, name, frame, manifest=None):
+        """
+        return the path of a frame of the named sequence cache, or None if that frame
+        hasn't been published. Pass the manifest when looking up many frames.
+        """
+        if manifest is None:
+            manifest = self.get_sequence(name)
+        if manifest is None or frame not in manifest:
+            return None
+        return os.path.join(self.get_sequence_dir(name), manifest.filename(frame))
+
+    def get_frame_paths(self, name, start=None, end=None):
+        """
+        return {frame: path} for the published frames of the named sequence cache
+        between start and end
+        """
+        manifest = self.get_sequence(name)
+        if manifest is None:
+            return {}
+        return sequence_cache.frame_paths(self.get_sequence_dir(name), manifest, start, end)
+
+    def list_missing_frames(self, name, start=None, end=None):
+        """
+        list the frames between start and end (the published range by default) that
+        the named sequence cache doesn't have
+        """
+        manifest = self.get_sequence(name)
+        if manifest is None:
+            return [] if start is None or end is None else range(int(start), int(end) + 1)
+        return manifest.missing_frames(start, end)
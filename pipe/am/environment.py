@@ -259,3 +259,17 @@ class Department:
 
     ALL = [ANIM, ASSEMBLY, CFX, CLOTH, COMP, CYCLES, DESIGN, FX, HAIR, HDA, LAYOUT, LIGHTING, MATERIAL, MODEL, MODIFY, RENDER, RIB_ARCHIVE, RIG, TEXTURE]
     HOUDINI_DEPTS = [ASSEMBLY, CLOTH, HAIR, MATERIAL, MODIFY]
+
+
+class Status:
+    '''
+    Class describing the production status of an element.
+    '''
+
+    WAITING = 'waiting'
+    READY = 'ready'
+    STARTED = 'started'
+    REVIEW = 'review'
+    DONE = 'done'
+
+    ALL = [WAITING, READY, STARTED, REVIEW, DONE]
@@ -1,4 +1,5 @@
 import glob
+import gzip
 import json
 import os
 import re
@@ -14,16 +15,56 @@ def readfile(filepath):
 
 	return json_data
 
-def writefile(filepath, datadict):
+def writefile(filepath, datadict, indent=0):
 	"""
 	writes the given data dictionary to a pipeline json file at the given filepath
+	indent -- passed on to json.dump. Use None for a compact file.
 	"""
 	tmp_name, tmp_ext = os.path.splitext(filepath)
 	tmp_filepath = tmp_name+"_tmp"+tmp_ext
 	with open(tmp_filepath, "w") as json_file:
-		json.dump(datadict, json_file, indent=0)
+		json.dump(datadict, json_file, indent=indent)
 	os.rename(tmp_filepath, filepath)
 
+def readfile_compressed(filepath):
+	"""
+	reads a gzip compressed pipeline json file and returns the resulting data
+	"""
+	json_file = gzip.open(filepath, "rb")
+	try:
+		return json.loads(json_file.read())
+	finally:
+		json_file.close()
+
+def writefile_compressed(filepath, data):
+	"""
+	writes the given data to a gzip compressed pipeline json file at the given filepath
+	"""
+	tmp_filepath = filepath+"_tmp"
+	json_file = gzip.open(tmp_filepath, "wb")
+	try:
+		json_file.write(json.dumps(data, separators=(",", ":")))
+	finally:
+		json_file.close()
+	os.rename(tmp_filepath, filepath)
+
+def link_file(target, linkpath, hardlink=False):
+	"""
+	make linkpath a link to the file target, replacing whatever is at linkpath in
+	one rename so readers see either the old file or the new link. Symbolic links
+	are relative, so they survive moving the project. Falls back to a hard link
+	where symbolic links aren't supported.
+	"""
+	dirpath, filename = os.path.split(linkpath)
+	tmp_linkpath = os.path.join(dirpath, "."+filename+".link_tmp")
+	if os.path.lexists(tmp_linkpath):
+		os.remove(tmp_linkpath)
+	if hardlink or not hasattr(os, "symlink"):
+		os.link(target, tmp_linkpath)
+	else:
+		os.symlink(os.path.relpath(target, dirpath), tmp_linkpath)
+	os.rename(tmp_linkpath, linkpath)
+
 def mkdir(dirpath):
 	"""
 	create the given filepath. returns true if successful, false otherwise.
@@ -91,11 +132,23 @@ def alphanumeric(name):
 
 	return ''.join(seq).lower()
 
+TIMESTAMP_FORMAT = "%a, %d %b %Y %I:%M:%S %p"
+
 def timestamp():
 	"""
 	return a string containing the current time
 	"""
-	return time.strftime("%a, %d %b %Y %I:%M:%S %p", time.localtime())
+	return time.strftime(TIMESTAMP_FORMAT, time.localtime())
+
+def parse_timestamp(string):
+	"""
+	return the time (in seconds since the epoch) of a string made by timestamp(),
+	or None if it can't be read
+	"""
+	try:
+		return time.mktime(time.strptime(string, TIMESTAMP_FORMAT))
+	except (TypeError, ValueError, OverflowError):
+		return None
 
 def get_project_info(project_dir, key):
 	'''
@@ -0,0 +1,187 @@
+import bisect
+import os
+import threading
+
+from . import pipeline_io
+
+DIRNAME = ".publishes"
+INLINE_LIMIT = 50
+SEGMENT_SIZE = 200
+
+# keys of the segment descriptors kept in the .element file
+FILENAME = "file"
+FIRST = "first"
+COUNT = "count"
+START = "start"
+END = "end"
+
+def offset(segments):
+	"""
+	return the version of the first publish kept in the .element file, given its
+	list of segment descriptors
+	"""
+	if not segments:
+		return 0
+	return segments[-1][FIRST] + segments[-1][COUNT]
+
+def to_time(value):
+	"""
+	return value (seconds since the epoch, or a string made by pipeline_io.timestamp)
+	as seconds since the epoch
+	"""
+	if value is None or isinstance(value, (int, long, float)):
+		return value
+	seconds = pipeline_io.parse_timestamp(value)
+	if seconds is None:
+		raise ValueError("not a timestamp: " + str(value))
+	return seconds
+
+class PublishHistory:
+	"""
+	Class describing the publishes of an element, with the latest ones kept in its
+	.element file and older ones moved to gzip compressed segment files of
+	SEGMENT_SIZE publishes each in the element's .publishes dir. The .element file
+	keeps a small descriptor per segment (its versions and the times of its first
+	and last publish), so paging through the history only reads the segments a page
+	overlaps, and the latest publish is always in the .element file.
+
+	Segments are never changed once written, so their contents are cached.
+
+	history = PublishHistory(element_dir, publishes, segments)
+	history.latest(20)
+	history.between("Mon, 01 Oct 2018 09:00:00 AM", time.time())
+	"""
+
+	def __init__(self, element_dir, publishes, segments):
+		"""
+		publishes -- the publishes list of the .element data
+		segments -- the segment descriptor list of the .element data
+		both lists are used (and changed by compact) in place
+		"""
+		self._dir = element_dir
+		self._publishes = publishes
+		self._segments = segments
+		self._cache = {}
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return self.offset() + len(self._publishes)
+
+	def offset(self):
+		return offset(self._segments)
+
+	def get(self, version):
+		"""
+		return the publish of the given version, or None if there is no such version
+		"""
+		if version < 0 or version >= len(self):
+			return None
+		first = self.offset()
+		if version >= first:
+			return self._publishes[version - first]
+		segment = self._segments[self._segment_index(version)]
+		return self._read(segment)[version - segment[FIRST]]
+
+	def range(self, first=None, last=None):
+		"""
+		return the publishes from version first to version last (both included), oldest first
+		"""
+		first = 0 if first is None else max(first, 0)
+		last = len(self) - 1 if last is None else min(last, len(self) - 1)
+		if first > last:
+			return []
+
+		publishes = []
+		inline_first = self.offset()
+		if first < inline_first:
+			for segment in self._segments[self._segment_index(first):]:
+				if segment[FIRST] > last:
+					break
+				entries = self._read(segment)
+				publishes.extend(entries[max(first - segment[FIRST], 0):last - segment[FIRST] + 1])
+		if last >= inline_first:
+			publishes.extend(self._publishes[max(first - inline_first, 0):last - inline_first + 1])
+		return publishes
+
+	def latest(self, count):
+		"""
+		return the last count publishes, oldest first
+		"""
+		if count <= 0:
+			return []
+		return self.range(len(self) - count, None)
+
+	def between(self, start=None, end=None):
+		"""
+		return the publishes made between start and end (both included), oldest first.
+		start and end are seconds since the epoch or timestamp strings, and default to
+		the first and last publish. Publishes with unreadable timestamps are left out.
+		"""
+		start = to_time(start)
+		end = to_time(end)
+		publishes = []
+		for segment in self._segments:
+			if start is not None and segment[END] is not None and segment[END] < start:
+				continue
+			if end is not None and segment[START] is not None and segment[START] > end:
+				continue
+			publishes.extend(self._in_time_range(self._read(segment), start, end))
+		publishes.extend(self._in_time_range(self._publishes, start, end))
+		return publishes
+
+	def compact(self, inline_limit=INLINE_LIMIT, segment_size=SEGMENT_SIZE):
+		"""
+		move the oldest publishes of the .element data into new segment files, a whole
+		segment at a time, as long as at least inline_limit publishes are left. The
+		segment files are written here, the caller then writes the .element file.
+		Returns the number of publishes moved.
+		"""
+		moved = 0
+		while len(self._publishes) - segment_size >= inline_limit:
+			entries = self._publishes[:segment_size]
+			first = self.offset()
+			times = [t for t in (pipeline_io.parse_timestamp(entry[1]) for entry in entries) if t is not None]
+			segment = {
+				FILENAME: "v%04d-v%04d.json.gz" % (first, first + len(entries) - 1),
+				FIRST: first,
+				COUNT: len(entries),
+				START: min(times) if times else None,
+				END: max(times) if times else None
+			}
+			archive_dir = os.path.join(self._dir, DIRNAME)
+			if not os.path.exists(archive_dir):
+				pipeline_io.mkdir(archive_dir)
+			pipeline_io.writefile_compressed(os.path.join(archive_dir, segment[FILENAME]), entries)
+			with self._lock:
+				self._cache[segment[FILENAME]] = entries
+			self._segments.append(segment)
+			del self._publishes[:segment_size]
+			moved += len(entries)
+		return moved
+
+	def _segment_index(self, version):
+		firsts = [segment[FIRST] for segment in self._segments]
+		return max(bisect.bisect_right(firsts, version) - 1, 0)
+
+	def _read(self, segment):
+		with self._lock:
+			entries = self._cache.get(segment[FILENAME])
+		if entries is None:
+			filepath = os.path.join(self._dir, DIRNAME, segment[FILENAME])
+			entries = pipeline_io.readfile_compressed(filepath)
+			if len(entries) != segment[COUNT]:
+				raise EnvironmentError("publish archive segment " + filepath + " has " + str(len(entries)) +
+					" publishes, expected " + str(segment[COUNT]))
+			with self._lock:
+				self._cache[segment[FILENAME]] = entries
+		return entries
+
+	def _in_time_range(self, entries, start, end):
+		publishes = []
+		for entry in entries:
+			seconds = pipeline_io.parse_timestamp(entry[1])
+			if seconds is None:
+				continue
+			if (start is None or seconds >= start) and (end is None or seconds <= end):
+				publishes.append(entry)
+		return publishes
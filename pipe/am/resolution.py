@@ -0,0 +1,181 @@
+import functools
+import os
+import threading
+import time
+
+from . import pipeline_io
+from .element import Element
+from .project import Project
+
+_local = threading.local()
+
+class ResolutionContext:
+	"""
+	Class that caches project lookups (the project, bodies, elements, json files and
+	anything else passed to memo()) for the length of one operation, like tabbing in
+	a set. While a context is entered it is the active context for the thread, so
+	nested calls can pick it up with active() instead of having it passed in.
+
+	with ResolutionContext() as context:
+		body = context.get_body("tree")
+	"""
+
+	def __init__(self, name="resolution", verbose=True):
+		self.name = name
+		self.verbose = verbose
+		self._project = None
+		self._cache = {}
+		self._hits = {}
+		self._misses = {}
+		self._start = None
+
+	def __enter__(self):
+		_stack().append(self)
+		self._start = time.time()
+		return self
+
+	def __exit__(self, exc_type, exc_value, tb):
+		stack = _stack()
+		if stack and stack[-1] is self:
+			stack.pop()
+		if self.verbose and self.saved_lookups():
+			print self.report()
+		return False
+
+	@staticmethod
+	def active():
+		"""
+		return the innermost context entered on this thread, or None
+		"""
+		stack = _stack()
+		return stack[-1] if stack else None
+
+	def memo(self, kind, key, create):
+		"""
+		return the cached value for (kind, key), calling create() to make it the
+		first time. kind groups the lookups in the stats, e.g. "body".
+		"""
+		cache_key = (kind, key)
+		if cache_key in self._cache:
+			self._hits[kind] = self._hits.get(kind, 0) + 1
+			return self._cache[cache_key]
+		self._misses[kind] = self._misses.get(kind, 0) + 1
+		value = create()
+		self._cache[cache_key] = value
+		return value
+
+	def forget(self, kind, key):
+		"""
+		drop a cached value, for when the operation changed what it points to
+		"""
+		self._cache.pop((kind, key), None)
+
+	def get_project(self):
+		if self._project is None:
+			self._misses["project"] = self._misses.get("project", 0) + 1
+			self._project = Project()
+		else:
+			self._hits["project"] = self._hits.get("project", 0) + 1
+		return self._project
+
+	def get_body(self, name):
+		return self.memo("body", name, lambda: self.get_project().get_body(name))
+
+	def get_element(self, body_name, department, name=Element.DEFAULT_NAME, force_create=False):
+		"""
+		return the element of the given body, cached. Raises EnvironmentError like
+		Body.get_element if the element doesn't exist and force_create is False.
+		"""
+		def create():
+			body = self.get_body(body_name)
+			if body is None:
+				raise EnvironmentError("no such body: " + str(body_name))
+			return body.get_element(department, name=name, force_create=force_create)
+		return self.memo("element", (body_name, department, name), create)
+
+	def readfile(self, filepath):
+		"""
+		return the parsed json file at filepath, cached. Callers must not change it.
+		"""
+		return self.memo("json", os.path.abspath(filepath), lambda: pipeline_io.readfile(filepath))
+
+	def stats(self):
+		"""
+		return a dict of kind -> (hits, misses)
+		"""
+		kinds = set(self._hits) | set(self._misses)
+		return dict((kind, (self._hits.get(kind, 0), self._misses.get(kind, 0))) for kind in kinds)
+
+	def saved_lookups(self):
+		return sum(self._hits.values())
+
+	def report(self):
+		elapsed = time.time() - self._start if self._start is not None else 0.0
+		lines = ["{0}: saved {1} lookups in {2:.3f}s".format(self.name, self.saved_lookups(), elapsed)]
+		for kind, (hits, misses) in sorted(self.stats().items()):
+			lines.append("    {0:<12} {1:6d} cached {2:6d} resolved".format(kind, hits, misses))
+		return "\n".join(lines)
+
+def _stack():
+	stack = getattr(_local, "stack", None)
+	if stack is None:
+		stack = _local.stack = []
+	return stack
+
+class _Reuse:
+	"""
+	Context manager that does nothing but hand back an already active context
+	"""
+
+	def __init__(self, context):
+		self.context = context
+
+	def __enter__(self):
+		return self.context
+
+	def __exit__(self, exc_type, exc_value, tb):
+		return False
+
+def ensure(name="resolution", verbose=True):
+	"""
+	return a context manager for the active context if there is one, or for a new
+	context otherwise. Use it at every entry point so nested calls share one context.
+	"""
+	context = ResolutionContext.active()
+	if context is not None:
+		return _Reuse(context)
+	return ResolutionContext(name, verbose)
+
+def scoped(method):
+	"""
+	decorator that runs the method inside ensure(), named after the method
+	"""
+	@functools.wraps(method)
+	def wrapper(*args, **kwargs):
+		with ensure(method.__name__):
+			return method(*args, **kwargs)
+	return wrapper
+
+def get_project():
+	"""
+	return the active context's project, or a new Project when there's no context
+	"""
+	context = ResolutionContext.active()
+	return context.get_project() if context is not None else Project()
+
+def get_body(name):
+	context = ResolutionContext.active()
+	return context.get_body(name) if context is not None else Project().get_body(name)
+
+def get_element(body_name, department, name=Element.DEFAULT_NAME, force_create=False):
+	context = ResolutionContext.active()
+	if context is not None:
+		return context.get_element(body_name, department, name, force_create)
+	return Project().get_body(body_name).get_element(department, name=name, force_create=force_create)
+
+def memo(kind, key, create):
+	"""
+	return create(), cached in the active context if there is one
+	"""
+	context = ResolutionContext.active()
+	return context.memo(kind, key, create) if context is not None else create()
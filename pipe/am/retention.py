@@ -0,0 +1,485 @@
+import os
+import re
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from . import cache_sync
+from . import pipeline_io
+from . import publish_archive
+from .disk_usage import get_disk_usage
+from .element import Checkout, Element
+from .environment import Department, Environment
+
+RETENTION = "retention"
+DEFAULT = "default"
+
+# /assets/tree/model/main/.v0012/tree.mb -> ("/assets/tree/model/main", "0012")
+VERSION_PATH = re.compile(r"^(?P<element>.+)/\.v(?P<version>\d{4,})(/|$)")
+
+class RetentionPolicy:
+	"""
+	Class describing which published versions (and checked out files) of a
+	department's elements may be deleted. A version is deleted only if it is none of:
+	- the latest version
+	- one of the last keep_last versions
+	- published less than min_age_days ago
+	- tagged (with keep_tagged)
+	- referenced by a shot or set (with keep_referenced)
+	- the version whose file a rollback kept for one of the above uses
+	A policy without keep_last or min_age_days deletes nothing. Checked out files are
+	kept the same way with keep_checkout_files and min_age_days.
+	"""
+
+	def __init__(self, keep_last=None, min_age_days=None, keep_tagged=True, keep_referenced=True, keep_checkout_files=None):
+		self.keep_last = keep_last
+		self.min_age_days = min_age_days
+		self.keep_tagged = keep_tagged
+		self.keep_referenced = keep_referenced
+		self.keep_checkout_files = keep_checkout_files
+
+	def __repr__(self):
+		return "RetentionPolicy(" + ", ".join(key + "=" + str(value) for key, value in sorted(self.to_dict().items())) + ")"
+
+	def prunes_versions(self):
+		return self.keep_last is not None or self.min_age_days is not None
+
+	def prunes_checkouts(self):
+		return self.keep_checkout_files is not None or self.min_age_days is not None
+
+	def is_old(self, seconds, now):
+		"""
+		return whether something from the given time (seconds since the epoch, None if
+		unknown) is old enough to be deleted
+		"""
+		if self.min_age_days is None:
+			return True
+		return seconds is not None and now - seconds >= self.min_age_days * 24 * 60 * 60
+
+	def to_dict(self):
+		return {
+			"keep_last": self.keep_last,
+			"min_age_days": self.min_age_days,
+			"keep_tagged": self.keep_tagged,
+			"keep_referenced": self.keep_referenced,
+			"keep_checkout_files": self.keep_checkout_files
+		}
+
+	@classmethod
+	def from_dict(cls, datadict):
+		return cls(**dict((str(key), value) for key, value in datadict.items()))
+
+def load_policies():
+	"""
+	return {department: RetentionPolicy} from the "retention" entry of the .project
+	file, e.g. {"default": {"keep_last": 10}, "anim": {"keep_last": 3, "min_age_days": 30}}.
+	Departments without an entry get the "default" policy, which keeps everything
+	unless it is set.
+	"""
+	project_file = os.path.join(Environment().get_project_dir(), Environment.PIPELINE_FILENAME)
+	settings = pipeline_io.readfile(project_file).get(RETENTION, {})
+	policies = dict((department, RetentionPolicy.from_dict(value)) for department, value in settings.items())
+	policies.setdefault(DEFAULT, RetentionPolicy())
+	return policies
+
+def policy_for(policies, department):
+
+	return policies.get(department, policies.get(DEFAULT, RetentionPolicy()))
+
+class Candidate:
+	"""
+	Class describing something a retention policy would delete:
+	kind -- VERSION (a .vNNNN dir of an element) or CHECKOUT_FILE (a file in a checkout dir)
+	owner_dir -- the element or checkout dir that records it
+	path -- what is deleted
+	version -- the version number, for VERSION candidates
+	size -- its size in bytes
+	seconds -- when it was published or checked out, or None if unknown
+	"""
+
+	VERSION = "version"
+	CHECKOUT_FILE = "checkout_file"
+
+	def __init__(self, kind, owner_dir, path, version=None, size=0, seconds=None):
+		self.kind = kind
+		self.owner_dir = owner_dir
+		self.path = path
+		self.version = version
+		self.size = size
+		self.seconds = seconds
+
+	def __repr__(self):
+		return "Candidate(" + self.kind + ", " + self.path + ")"
+
+	def to_dict(self):
+		return {"kind": self.kind, "owner_dir": self.owner_dir, "path": self.path,
+			"version": self.version, "size": self.size, "seconds": self.seconds}
+
+class RetentionReport:
+	"""
+	Class describing a retention run. plan() fills in:
+	candidates -- the Candidates the policies would delete
+	kept -- {reason: count} of the versions and files that are kept
+	and Collector.collect() fills in:
+	deleted -- the Candidates that were deleted
+	skipped -- the Candidates that were kept after all, since their element changed
+	errors -- (path, error message) pairs
+	"""
+
+	def __init__(self, dry_run=True):
+		self.dry_run = dry_run
+		self.candidates = []
+		self.kept = {}
+		self.deleted = []
+		self.skipped = []
+		self.errors = []
+		self.elapsed = 0.0
+
+	def keep(self, reason):
+		self.kept[reason] = self.kept.get(reason, 0) + 1
+
+	def candidate_size(self):
+		return sum(candidate.size for candidate in self.candidates)
+
+	def deleted_size(self):
+		return sum(candidate.size for candidate in self.deleted)
+
+	def succeeded(self):
+		return not self.errors
+
+	def __str__(self):
+		versions = len([candidate for candidate in self.candidates if candidate.kind == Candidate.VERSION])
+		summary = "{0} versions and {1} checked out files ({2}) can be deleted, kept {3}".format(
+			versions, len(self.candidates) - versions, cache_sync.format_size(self.candidate_size()),
+			", ".join("{0} {1}".format(count, reason) for reason, count in sorted(self.kept.items())) or "nothing")
+		if not self.dry_run:
+			summary += "; deleted {0} ({1}), skipped {2} in {3:.1f}s".format(
+				len(self.deleted), cache_sync.format_size(self.deleted_size()), len(self.skipped), self.elapsed)
+		if self.errors:
+			summary += ", {0} errors".format(len(self.errors))
+		return summary
+
+	def to_dict(self):
+		return {
+			"dry_run": self.dry_run,
+			"candidates": [candidate.to_dict() for candidate in self.candidates],
+			"kept": self.kept,
+			"deleted": [candidate.path for candidate in self.deleted],
+			"skipped": [candidate.path for candidate in self.skipped],
+			"errors": self.errors
+		}
+
+	def write(self, filepath):
+
+		pipeline_io.writefile(filepath, self.to_dict())
+
+def find_referenced_versions(project):
+	"""
+	return {element dir: set of versions} for the published versions that the json
+	files in the caches of the project's shots and sets point at by path. Shots and
+	sets mostly refer to assets by name (and get their latest publish), so this is
+	only the versions that were pinned by path.
+	"""
+	referenced = {}
+	bodies = [(project.get_shots_dir(), name) for name in project.list_shots()]
+	bodies += [(project.get_assets_dir(), name) for name in project.list_sets()]
+	for parent_dir, name in bodies:
+		body_dir = os.path.join(parent_dir, name)
+		for department in os.listdir(body_dir):
+			department_dir = os.path.join(body_dir, department)
+			if not os.path.isdir(department_dir):
+				continue
+			for element_name in os.listdir(department_dir):
+				cache_dir = os.path.join(department_dir, element_name, Element.DEFAULT_CACHE_DIR)
+				if not os.path.isdir(cache_dir):
+					continue
+				for filename in os.listdir(cache_dir):
+					if filename.endswith(".json"):
+						_add_referenced(os.path.join(cache_dir, filename), referenced)
+	return referenced
+
+def _add_referenced(filepath, referenced):
+	try:
+		data = pipeline_io.readfile(filepath)
+	except (IOError, ValueError):
+		return
+	stack = [data]
+	while stack:
+		value = stack.pop()
+		if isinstance(value, dict):
+			stack.extend(value.values())
+		elif isinstance(value, list):
+			stack.extend(value)
+		elif isinstance(value, basestring):
+			match = VERSION_PATH.match(value)
+			if match:
+				element_dir = os.path.normpath(match.group("element"))
+				referenced.setdefault(element_dir, set()).add(int(match.group("version")))
+
+def plan(project, policies=None, departments=None, bodies=None, checkouts=True, referenced=None):
+	"""
+	return a dry run RetentionReport of what the policies would delete. Nothing is changed.
+	policies -- {department: RetentionPolicy}, defaults to load_policies()
+	departments -- only look at these departments, defaults to Department.ALL
+	bodies -- only look at these bodies (names), defaults to every asset and shot
+	checkouts -- also look at the files in the users' checkout dirs
+	referenced -- {element dir: versions} to keep, defaults to find_referenced_versions(project)
+	"""
+	if policies is None:
+		policies = load_policies()
+	if departments is None:
+		departments = Department.ALL
+	if referenced is None:
+		referenced = find_referenced_versions(project)
+
+	report = RetentionReport()
+	now = time.time()
+	body_dirs = []
+	for parent_dir, names in [(project.get_assets_dir(), project.list_assets()), (project.get_shots_dir(), project.list_shots())]:
+		body_dirs.extend(os.path.join(parent_dir, name) for name in names if bodies is None or name in bodies)
+
+	for department in departments:
+		policy = policy_for(policies, department)
+		if not policy.prunes_versions():
+			continue
+		for body_dir in body_dirs:
+			department_dir = os.path.join(body_dir, department)
+			if not os.path.isdir(department_dir):
+				continue
+			for element_name in sorted(os.listdir(department_dir)):
+				element_dir = os.path.join(department_dir, element_name)
+				if os.path.exists(os.path.join(element_dir, Element.PIPELINE_FILENAME)):
+					_plan_element(element_dir, policy, referenced.get(os.path.normpath(element_dir), set()), now, report)
+
+	if checkouts:
+		users_dir = project.get_users_dir()
+		for username in sorted(os.listdir(users_dir)):
+			user_dir = os.path.join(users_dir, username)
+			if not os.path.isdir(user_dir):
+				continue
+			for name in sorted(os.listdir(user_dir)):
+				checkout_dir = os.path.join(user_dir, name)
+				if os.path.exists(os.path.join(checkout_dir, Checkout.PIPELINE_FILENAME)):
+					_plan_checkout(checkout_dir, policies, departments, bodies, now, report)
+	return report
+
+def protected_versions(datadict, policy, referenced):
+	"""
+	return {version: reason} for the versions of an element (given its .element
+	data) that the policy keeps whatever their age
+	"""
+	protected = {}
+	latest = datadict.get(Element.LATEST_VERSION, -1)
+	if latest >= 0:
+		protected[latest] = "latest"
+	if policy.keep_last:
+		for version in range(max(latest - policy.keep_last + 1, 0), latest + 1):
+			protected.setdefault(version, "recent")
+	if policy.keep_tagged:
+		for version in datadict.get(Element.TAGS, {}).values():
+			protected.setdefault(version, "tagged")
+	if policy.keep_referenced:
+		for version in referenced:
+			protected.setdefault(version, "referenced")
+	# A version made by a rollback has no directory, its file is in an older version's
+	rollbacks = datadict.get(Element.ROLLBACKS, {})
+	for version, reason in protected.items():
+		source = rollbacks.get(str(version))
+		if source is not None:
+			protected.setdefault(source, reason)
+	return protected
+
+def _plan_element(element_dir, policy, referenced, now, report):
+	try:
+		datadict = pipeline_io.readfile(os.path.join(element_dir, Element.PIPELINE_FILENAME))
+	except (IOError, ValueError) as e:
+		report.errors.append((element_dir, str(e)))
+		return
+	protected = protected_versions(datadict, policy, referenced)
+	history = publish_archive.PublishHistory(element_dir, datadict.get(Element.PUBLISHES, []), datadict.get(Element.PUBLISH_SEGMENTS, []))
+	versions = sorted(int(name[2:]) for name in os.listdir(element_dir) if name.startswith(".v") and name[2:].isdigit())
+	for version in versions:
+		if version in protected:
+			report.keep(protected[version])
+			continue
+		publish = history.get(version)
+		seconds = pipeline_io.parse_timestamp(publish[1]) if publish is not None else None
+		if not policy.is_old(seconds, now):
+			report.keep("new")
+			continue
+		version_dir = os.path.join(element_dir, ".v%04d" % version)
+		report.candidates.append(Candidate(Candidate.VERSION, element_dir, version_dir, version,
+			get_disk_usage().size(version_dir), seconds))
+
+def _plan_checkout(checkout_dir, policies, departments, bodies, now, report):
+	try:
+		datadict = pipeline_io.readfile(os.path.join(checkout_dir, Checkout.PIPELINE_FILENAME))
+	except (IOError, ValueError) as e:
+		report.errors.append((checkout_dir, str(e)))
+		return
+	department = datadict.get(Checkout.DEPARTMENT)
+	if department not in departments or (bodies is not None and datadict.get(Checkout.BODY) not in bodies):
+		return
+	policy = policy_for(policies, department)
+	if not policy.prunes_checkouts():
+		return
+
+	# The files checked out last are the ones users are working in
+	files = [filepath for filepath in datadict.get(Checkout.FILES, []) if os.path.exists(filepath)]
+	keep = max(policy.keep_checkout_files or 0, 1)
+	for index, filepath in enumerate(files):
+		if index >= len(files) - keep:
+			report.keep("recent checkout")
+			continue
+		stat = os.stat(filepath)
+		if not policy.is_old(stat.st_mtime, now):
+			report.keep("new checkout")
+			continue
+		report.candidates.append(Candidate(Candidate.CHECKOUT_FILE, checkout_dir, filepath, None, stat.st_size, stat.st_mtime))
+
+class RateLimiter:
+	"""
+	Class that spaces out calls to acquire() from any number of threads to at most
+	rate per second
+	"""
+
+	def __init__(self, rate):
+		self.interval = 1.0 / rate if rate else 0.0
+		self._next = 0.0
+		self._lock = threading.Lock()
+
+	def acquire(self):
+		if not self.interval:
+			return
+		with self._lock:
+			now = time.time()
+			start = max(self._next, now)
+			self._next = start + self.interval
+		if start > now:
+			time.sleep(start - now)
+
+class Collector:
+	"""
+	Class that deletes the candidates of a RetentionReport on a pool of worker
+	threads, at most deletes_per_second of them, so a large clean up doesn't load
+	the file server. Each element or checkout dir is handled by one worker: its
+	metadata is read again right before deleting, so versions that became latest,
+	got tagged or were checked out again since the plan are skipped, and the deleted
+	versions are then recorded in it (see Element.list_pruned_versions).
+
+	report = retention.plan(Project())
+	print report # the dry run
+	Collector().start(report, lambda report: ...) # called on the collector's thread
+	"""
+
+	def __init__(self, workers=4, deletes_per_second=20.0, referenced=None):
+		"""
+		referenced -- {element dir: versions} to keep, as given to plan()
+		"""
+		self.workers = workers
+		self.referenced = referenced if referenced is not None else {}
+		self._limiter = RateLimiter(deletes_per_second)
+		self._lock = threading.Lock()
+		self._stopped = threading.Event()
+
+	def collect(self, report, policies=None):
+		"""
+		delete the report's candidates on this thread (using the workers) and return the report
+		policies -- the policies the report was planned with, defaults to load_policies()
+		"""
+		if policies is None:
+			policies = load_policies()
+		start = time.time()
+		report.dry_run = False
+		groups = {}
+		for candidate in report.candidates:
+			groups.setdefault((candidate.kind, candidate.owner_dir), []).append(candidate)
+
+		pool = ThreadPool(self.workers)
+		try:
+			pool.map(lambda group: self._collect_group(group[0][0], group[0][1], group[1], policies, report), groups.items())
+		finally:
+			pool.close()
+			pool.join()
+		report.elapsed = time.time() - start
+		return report
+
+	def start(self, report, callback=None, policies=None):
+		"""
+		delete the report's candidates in the background and call callback(report) when it's done
+		"""
+		def run():
+			self.collect(report, policies)
+			if callback is not None:
+				callback(report)
+		thread = threading.Thread(target=run, name="retention_collector")
+		thread.daemon = True
+		thread.start()
+		return thread
+
+	def stop(self):
+		"""
+		stop deleting after the candidates being deleted now. Everything deleted so far is recorded.
+		"""
+		self._stopped.set()
+
+	def _collect_group(self, kind, owner_dir, candidates, policies, report):
+		try:
+			if kind == Candidate.VERSION:
+				self._collect_versions(owner_dir, candidates, policies, report)
+			else:
+				self._collect_checkout_files(owner_dir, candidates, report)
+		except Exception as e:
+			with self._lock:
+				report.errors.append((owner_dir, str(e)))
+		get_disk_usage().invalidate(owner_dir)
+
+	def _collect_versions(self, element_dir, candidates, policies, report):
+		element = Element(element_dir)
+		policy = policy_for(policies, element.get_department())
+		datadict = {Element.LATEST_VERSION: element.get_latest_version(), Element.TAGS: element.get_tags(),
+			Element.ROLLBACKS: dict((str(version), source) for version, source in element.list_rollbacks().items())}
+		protected = protected_versions(datadict, policy, self.referenced.get(os.path.normpath(element_dir), set()))
+		deleted = []
+		for candidate in candidates:
+			if candidate.version in protected:
+				with self._lock:
+					report.skipped.append(candidate)
+				continue
+			if self._delete(candidate, report):
+				deleted.append(candidate.version)
+		if deleted:
+			# Read again, the element may have been published to while deleting
+			element.load_pipeline_file(element_dir)
+			element.record_pruned_versions(deleted)
+
+	def _collect_checkout_files(self, checkout_dir, candidates, report):
+		checkout = Checkout(checkout_dir)
+		files = checkout.list_files()
+		deleted = []
+		for candidate in candidates:
+			# A file that was checked out again is the one being worked in
+			if files and files[-1] == candidate.path:
+				with self._lock:
+					report.skipped.append(candidate)
+				continue
+			if self._delete(candidate, report):
+				deleted.append(candidate.path)
+		if deleted:
+			Checkout(checkout_dir).record_pruned_files(deleted)
+
+	def _delete(self, candidate, report):
+		if self._stopped.is_set():
+			with self._lock:
+				report.skipped.append(candidate)
+			return False
+		self._limiter.acquire()
+		try:
+			cache_sync.remove_path(candidate.path)
+		except OSError as e:
+			with self._lock:
+				report.errors.append((candidate.path, str(e)))
+			return False
+		with self._lock:
+			report.deleted.append(candidate)
+		return True
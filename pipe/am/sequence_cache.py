@@ -0,0 +1,219 @@
+import os
+import re
+from multiprocessing.pool import ThreadPool
+
+from . import cache_sync
+from . import pipeline_io
+from .cache_install import CacheInstaller
+
+# name.1001.bgeo.sc -> ("name.", "1001", ".bgeo.sc")
+FRAME_PATTERN = re.compile(r"^(?P<prefix>.*?)(?P<frame>\d+)(?P<ext>\.[^\d].*)$")
+
+class SequenceManifest:
+	"""
+	Class describing a frame sequence cache: the file name pattern, and the size and
+	checksum of every frame that has been published. It is stored in the sequence's
+	directory, so frames can be looked up, and missing frames found, without listing
+	a directory that may hold thousands of files.
+
+	manifest = SequenceManifest.read(sequence_dir)
+	path = os.path.join(sequence_dir, manifest.filename(1001))
+	"""
+
+	FILENAME = ".sequence.json"
+	FORMAT_VERSION = 1
+
+	def __init__(self, name, prefix, padding, ext):
+		self.name = name
+		self.prefix = prefix
+		self.padding = padding
+		self.ext = ext
+		self._frames = {}
+
+	def __len__(self):
+		return len(self._frames)
+
+	def __contains__(self, frame):
+		return int(frame) in self._frames
+
+	def filename(self, frame):
+		"""
+		return the file name of the given frame, whether or not it has been published
+		"""
+		return self.prefix + str(int(frame)).zfill(self.padding) + self.ext
+
+	def frames(self):
+		return sorted(self._frames)
+
+	def frame_range(self):
+		"""
+		return the (first, last) published frame, or None if there aren't any
+		"""
+		if not self._frames:
+			return None
+		return min(self._frames), max(self._frames)
+
+	def frame_info(self, frame):
+		"""
+		return the (size, checksum) of the given frame, or None if it hasn't been published
+		"""
+		return self._frames.get(int(frame))
+
+	def missing_frames(self, start=None, end=None):
+		"""
+		return the frames between start and end (the published range by default)
+		that haven't been published
+		"""
+		frame_range = self.frame_range()
+		if frame_range is None:
+			return [] if start is None or end is None else range(int(start), int(end) + 1)
+		start = frame_range[0] if start is None else int(start)
+		end = frame_range[1] if end is None else int(end)
+		return [frame for frame in range(start, end + 1) if frame not in self._frames]
+
+	def add_frame(self, frame, size, checksum):
+		self._frames[int(frame)] = (size, checksum)
+
+	def remove_frame(self, frame):
+		self._frames.pop(int(frame), None)
+
+	def matches(self, filename):
+		"""
+		return the frame number of the given file name if it belongs to this sequence, or None
+		"""
+		match = FRAME_PATTERN.match(filename)
+		if match is None or match.group("prefix") != self.prefix or match.group("ext") != self.ext:
+			return None
+		return int(match.group("frame"))
+
+	def to_dict(self):
+		return {
+			"format_version": self.FORMAT_VERSION,
+			"name": self.name,
+			"prefix": self.prefix,
+			"padding": self.padding,
+			"ext": self.ext,
+			"frames": dict((str(frame), list(info)) for frame, info in self._frames.items())
+		}
+
+	@classmethod
+	def from_dict(cls, datadict):
+		if datadict.get("format_version", 0) > cls.FORMAT_VERSION:
+			raise ValueError("sequence manifest format " + str(datadict.get("format_version")) + " is newer than this pipe")
+		manifest = cls(datadict["name"], datadict["prefix"], datadict["padding"], datadict["ext"])
+		for frame, info in datadict.get("frames", {}).items():
+			manifest.add_frame(frame, info[0], info[1])
+		return manifest
+
+	@classmethod
+	def read(cls, sequence_dir):
+		"""
+		return the manifest in the given sequence dir, or None if there isn't one
+		"""
+		filepath = os.path.join(sequence_dir, cls.FILENAME)
+		if not os.path.exists(filepath):
+			return None
+		return cls.from_dict(pipeline_io.readfile(filepath))
+
+	def write(self, sequence_dir):
+		pipeline_io.writefile(os.path.join(sequence_dir, self.FILENAME), self.to_dict(), indent=None)
+
+def scan(src_dir):
+	"""
+	return the frame sequences in src_dir as a list of (manifest, {frame: path}) pairs.
+	The manifests have no frames yet. Files that aren't numbered are ignored.
+	"""
+	sequences = {}
+	for filename in sorted(os.listdir(src_dir)):
+		match = FRAME_PATTERN.match(filename)
+		if match is None or os.path.isdir(os.path.join(src_dir, filename)):
+			continue
+		key = (match.group("prefix"), match.group("ext"))
+		if key not in sequences:
+			name = match.group("prefix").rstrip("._") or match.group("ext").lstrip(".")
+			sequences[key] = (SequenceManifest(name, key[0], len(match.group("frame")), key[1]), {})
+		sequences[key][1][int(match.group("frame"))] = os.path.join(src_dir, filename)
+	return sorted(sequences.values(), key=lambda sequence: sequence[0].name)
+
+def find_sequence(src_dir, name=None):
+	"""
+	return the (manifest, {frame: path}) pair for the named sequence in src_dir, or
+	for the only sequence there if no name is given. Raises EnvironmentError if
+	there's no such sequence.
+	"""
+	sequences = scan(src_dir)
+	if name is not None:
+		sequences = [sequence for sequence in sequences if sequence[0].name == name]
+	if len(sequences) != 1:
+		raise EnvironmentError("expected one frame sequence" + (" named " + name if name else "") + " in " + src_dir + ", found " + str(len(sequences)))
+	return sequences[0]
+
+def publish(cache_dir, src_dir, name=None, start=None, end=None, workers=4):
+	"""
+	publish the frames of a sequence in src_dir into cache_dir/<name>, and return the
+	updated manifest. Without start and end the sequence is replaced, dropping frames
+	src_dir no longer has. With start and/or end, only that sub-range is replaced (the
+	frames in it that src_dir no longer has are dropped too) and the frames outside it
+	are kept, so a re-simmed range doesn't touch the rest.
+	Publishing frames with another name pattern replaces the sequence either way.
+	Frames are copied in parallel into a staged clone of the cache, which then goes
+	live in one swap (see CacheInstaller).
+	"""
+	source, src_frames = find_sequence(src_dir, name)
+	frames = [frame for frame in sorted(src_frames)
+			if (start is None or frame >= int(start)) and (end is None or frame <= int(end))]
+	if not frames:
+		raise EnvironmentError("no frames of " + source.name + " to publish in " + src_dir)
+
+	installer = CacheInstaller(cache_dir)
+	staging = installer.stage()
+	try:
+		sequence_dir = os.path.join(staging, source.name)
+		manifest = SequenceManifest.read(sequence_dir) if os.path.isdir(sequence_dir) else None
+		# A full publish replaces the sequence, and frames named another way can't be
+		# kept next to the new ones, so the staged sequence starts out empty then
+		if manifest is None or (start is None and end is None) or (manifest.prefix, manifest.padding, manifest.ext) != (source.prefix, source.padding, source.ext):
+			cache_sync.remove_path(sequence_dir)
+			manifest = source
+		else:
+			# Empty the sub-range first, so frames deleted from src_dir go too
+			for frame in manifest.frames():
+				if (start is None or frame >= int(start)) and (end is None or frame <= int(end)):
+					cache_sync.remove_path(os.path.join(sequence_dir, manifest.filename(frame)))
+					manifest.remove_frame(frame)
+		if not os.path.isdir(sequence_dir):
+			os.makedirs(sequence_dir)
+
+		def copy(frame):
+			dst = os.path.join(sequence_dir, manifest.filename(frame))
+			cache_sync.copy_file(src_frames[frame], dst)
+			return frame, os.path.getsize(dst), cache_sync.checksum(dst)
+
+		pool = ThreadPool(max(1, min(workers, len(frames))))
+		try:
+			copied = pool.map(copy, frames)
+		finally:
+			pool.close()
+			pool.join()
+
+		for frame, size, checksum in copied:
+			manifest.add_frame(frame, size, checksum)
+		manifest.write(sequence_dir)
+	except:
+		installer.abort(staging)
+		raise
+	installer.commit(staging)
+	return manifest
+
+def frame_paths(sequence_dir, manifest, start=None, end=None):
+	"""
+	return {frame: path} for the published frames between start and end, e.g. for a
+	farm task that only needs its own frames
+	"""
+	frame_range = manifest.frame_range()
+	if frame_range is None:
+		return {}
+	start = frame_range[0] if start is None else int(start)
+	end = frame_range[1] if end is None else int(end)
+	return dict((frame, os.path.join(sequence_dir, manifest.filename(frame)))
+			for frame in range(start, end + 1) if frame in manifest)
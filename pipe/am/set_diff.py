@@ -0,0 +1,87 @@
+from collections import defaultdict, deque
+
+def reference_key(reference):
+	"""
+	return the (asset_name, version_number) key of a set reference dict. Versions are
+	compared as strings, since node data parms store them that way.
+	"""
+	return (str(reference["asset_name"]), str(reference.get("version_number", 0)))
+
+def asset_name_group(key):
+	return key[0]
+
+class SetDiff:
+	"""
+	Class describing what it takes to turn the current contents of a set into the
+	target contents:
+	keep -- (current, target) pairs with the same key. Nothing to do.
+	update -- (current, target) pairs with the same asset but another version
+	add -- targets with no current item
+	remove -- current items with no target
+	"""
+
+	def __init__(self):
+		self.keep = []
+		self.update = []
+		self.add = []
+		self.remove = []
+
+	def is_empty(self):
+		return not (self.update or self.add or self.remove)
+
+	def __str__(self):
+		return "keep {0}, update {1}, add {2}, remove {3}".format(
+			len(self.keep), len(self.update), len(self.add), len(self.remove))
+
+def diff(current, target, current_key=reference_key, target_key=reference_key, group=asset_name_group):
+	"""
+	return a SetDiff between the current items and the target items in linear time.
+	Both sides are multisets: a set holding the same prop three times keeps three
+	matching items and adds or removes the difference. Each key function is called
+	once per item.
+	current_key, target_key -- return the hashable key of an item on either side
+	group -- maps a key to the part that has to match for an item to be updated in
+		place instead of removed and added (the asset name by default). None turns
+		updates off.
+	"""
+	result = SetDiff()
+	current = list(current)
+	target = list(target)
+
+	current_keys = [current_key(item) for item in current]
+	target_keys = [target_key(item) for item in target]
+
+	# Match equal keys first, in order, one current item per target
+	unmatched = defaultdict(deque)
+	for index, key in enumerate(current_keys):
+		unmatched[key].append(index)
+
+	used = set()
+	leftover_targets = []
+	for item, key in zip(target, target_keys):
+		candidates = unmatched.get(key)
+		if candidates:
+			index = candidates.popleft()
+			used.add(index)
+			result.keep.append((current[index], item))
+		else:
+			leftover_targets.append((item, key))
+
+	# Pair what's left by group, so another version of the same asset is updated
+	by_group = defaultdict(deque)
+	if group is not None:
+		for index, key in enumerate(current_keys):
+			if index not in used:
+				by_group[group(key)].append(index)
+
+	for item, key in leftover_targets:
+		candidates = by_group.get(group(key)) if group is not None else None
+		if candidates:
+			index = candidates.popleft()
+			used.add(index)
+			result.update.append((current[index], item))
+		else:
+			result.add.append(item)
+
+	result.remove = [current[index] for index in range(len(current)) if index not in used]
+	return result
@@ -0,0 +1,190 @@
+import os
+
+from . import pipeline_io
+
+class SetLayout:
+	"""
+	Class describing the layout of a set: every prop in the set with its version,
+	prim path and anchor points. The layout is stored as one json file per set
+	publish, with each field kept as a column (a list with one entry per prop).
+	"""
+
+	FILENAME = "set_layout.json"
+	LEGACY_FILENAME = "whole_set.json"
+	FORMAT_VERSION = 1
+
+	ASSET_NAME = "asset_name"
+	VERSION_NUMBER = "version_number"
+	PATH = "path"
+	A = "a"
+	B = "b"
+	C = "c"
+	COLUMNS = [ASSET_NAME, VERSION_NUMBER, PATH, A, B, C]
+	ANCHORS = [A, B, C]
+
+	def __init__(self, set_name=None, columns=None):
+		self.set_name = set_name
+		self.columns = dict((column, []) for column in self.COLUMNS)
+		if columns is not None:
+			for column in self.COLUMNS:
+				self.columns[column] = list(columns.get(column, []))
+			if len(set(len(values) for values in self.columns.values())) > 1:
+				raise ValueError("set layout columns have different lengths")
+
+	def __len__(self):
+		return len(self.columns[self.ASSET_NAME])
+
+	def __iter__(self):
+		for index in range(len(self)):
+			yield self.row(index)
+
+	def row(self, index):
+		"""
+		return the prop at the given index as a dict, in the same form as the
+		legacy <prop>_<version>.json files
+		"""
+		return dict((column, self.columns[column][index]) for column in self.COLUMNS)
+
+	def index(self, asset_name, version_number=None):
+		"""
+		return the index of the first prop with the given name (and version, if
+		given), or None if the set doesn't contain it
+		"""
+		names = self.columns[self.ASSET_NAME]
+		versions = self.columns[self.VERSION_NUMBER]
+		for index in range(len(names)):
+			if str(names[index]) != str(asset_name):
+				continue
+			if version_number is None or str(versions[index]) == str(version_number):
+				return index
+		return None
+
+	def asset_names(self):
+		return list(self.columns[self.ASSET_NAME])
+
+	def references(self):
+		"""
+		return the props as a list of {asset_name, version_number} dicts, the same
+		form as whole_set.json
+		"""
+		return [{self.ASSET_NAME: name, self.VERSION_NUMBER: version}
+				for name, version in zip(self.columns[self.ASSET_NAME], self.columns[self.VERSION_NUMBER])]
+
+	def anchors(self):
+		"""
+		return the anchor points as a list with one [a, b, c] entry per prop
+		"""
+		return [list(points) for points in zip(*[self.columns[anchor] for anchor in self.ANCHORS])]
+
+	def add(self, asset_name, version_number=0, path="", a=None, b=None, c=None):
+		"""
+		append a prop to the layout and return its index
+		"""
+		row = {
+			self.ASSET_NAME: asset_name,
+			self.VERSION_NUMBER: version_number,
+			self.PATH: path,
+			self.A: list(a) if a is not None else [0, 0, 0],
+			self.B: list(b) if b is not None else [0, 0, 0],
+			self.C: list(c) if c is not None else [0, 0, 0]
+		}
+		for column in self.COLUMNS:
+			self.columns[column].append(row[column])
+		return len(self) - 1
+
+	def update(self, index, **values):
+		"""
+		set the given columns of the prop at index, e.g. update(3, version_number=2)
+		"""
+		for column, value in values.items():
+			if column not in self.columns:
+				raise KeyError(column)
+			self.columns[column][index] = value
+
+	def remove(self, indices):
+		"""
+		remove the props at the given indices
+		"""
+		drop = set(indices)
+		for column in self.COLUMNS:
+			self.columns[column] = [value for index, value in enumerate(self.columns[column]) if index not in drop]
+
+	def to_dict(self):
+		return {
+			"format_version": self.FORMAT_VERSION,
+			"set_name": self.set_name,
+			"count": len(self),
+			"columns": self.columns
+		}
+
+	@classmethod
+	def from_dict(cls, datadict):
+		if datadict.get("format_version", 0) > cls.FORMAT_VERSION:
+			raise ValueError("set layout format " + str(datadict.get("format_version")) + " is newer than this pipe")
+		return cls(datadict.get("set_name"), datadict.get("columns", {}))
+
+	def write(self, cache_dir):
+		"""
+		write this layout to the given cache dir. The file is replaced atomically,
+		so readers never see half a layout. returns the path of the file.
+		"""
+		filepath = os.path.join(cache_dir, self.FILENAME)
+		pipeline_io.writefile(filepath, self.to_dict(), indent=None)
+		return filepath
+
+	def write_legacy(self, cache_dir, props=True):
+		"""
+		write whole_set.json (and, if props, the <prop>_<version>.json files) for the
+		tools and HDAs that still read the old format. Call it before write, since
+		load converts the set again when whole_set.json is the newer file.
+		"""
+		pipeline_io.writefile(os.path.join(cache_dir, self.LEGACY_FILENAME), self.references(), indent=None)
+		if props:
+			for row in self:
+				pipeline_io.writefile(legacy_prop_file(cache_dir, row[self.ASSET_NAME], row[self.VERSION_NUMBER]), row, indent=None)
+
+	@classmethod
+	def read(cls, cache_dir):
+		return cls.from_dict(pipeline_io.readfile(os.path.join(cache_dir, cls.FILENAME)))
+
+	@classmethod
+	def from_legacy(cls, cache_dir, set_name=None):
+		"""
+		build a layout from whole_set.json and the per-prop json files in the given
+		cache dir. Props without a prop file keep an empty path and zero anchors.
+		"""
+		layout = cls(set_name)
+		for reference in pipeline_io.readfile(os.path.join(cache_dir, cls.LEGACY_FILENAME)):
+			name = reference[cls.ASSET_NAME]
+			version = reference.get(cls.VERSION_NUMBER, 0)
+			prop_file = legacy_prop_file(cache_dir, name, version)
+			prop_data = pipeline_io.readfile(prop_file) if os.path.exists(prop_file) else {}
+			layout.add(name, version, prop_data.get(cls.PATH, ""),
+					prop_data.get(cls.A), prop_data.get(cls.B), prop_data.get(cls.C))
+		return layout
+
+def legacy_prop_file(cache_dir, asset_name, version_number):
+	return os.path.join(cache_dir, str(asset_name) + "_" + str(version_number) + ".json")
+
+def load(cache_dir, set_name=None, convert=True):
+	"""
+	return the layout stored in the given cache dir, or None if there isn't one.
+	Sets that were only ever published in the old format, or whose whole_set.json
+	was written after set_layout.json by a tool that doesn't know about the layout,
+	are converted, and if convert is True the converted layout is written next to
+	the old files.
+	"""
+	filepath = os.path.join(cache_dir, SetLayout.FILENAME)
+	legacy_filepath = os.path.join(cache_dir, SetLayout.LEGACY_FILENAME)
+	if not os.path.exists(legacy_filepath):
+		return SetLayout.read(cache_dir) if os.path.exists(filepath) else None
+	if os.path.exists(filepath) and os.path.getmtime(filepath) >= os.path.getmtime(legacy_filepath):
+		return SetLayout.read(cache_dir)
+
+	layout = SetLayout.from_legacy(cache_dir, set_name)
+	if convert:
+		try:
+			layout.write(cache_dir)
+		except (IOError, OSError) as e:
+			print "Could not write " + SetLayout.FILENAME + " to " + cache_dir + ": " + str(e)
+	return layout
@@ -0,0 +1,152 @@
+import os
+
+from . import pipeline_io
+from . import resolution
+from . import set_layout
+from .environment import Department
+
+CAMERA_NAME = "dcc_camera"
+
+def version_key(version_number):
+	"""
+	return a version number as a comparable string. Older animated_props.json files
+	store versions like ": 0", so the separator is stripped.
+	"""
+	if version_number is None:
+		return "0"
+	return str(version_number).lstrip(": ").strip() or "0"
+
+class ShotManifest:
+	"""
+	Class describing everything a shot pulls in, resolved in one pass from the
+	sets.json, characters.json and animated_props.json files in the shot's anim cache:
+	sets -- one dict per set: asset_name, version_number, layout (SetLayout or None)
+	characters -- one dict per character: asset_name, version_number, body and
+		department_paths (department -> latest publish path)
+	animated_props -- one dict per animated prop: asset_name, version_number
+	has_camera -- whether the shot has a camera
+	Animated props can be looked up by name and version in constant time with is_animated().
+	"""
+
+	SETS_FILENAME = "sets.json"
+	CHARACTERS_FILENAME = "characters.json"
+	ANIMATED_PROPS_FILENAME = "animated_props.json"
+
+	# The departments whose latest publishes make up a character in Houdini
+	CHARACTER_DEPARTMENTS = [Department.MODIFY, Department.MATERIAL, Department.HAIR, Department.CLOTH]
+
+	def __init__(self, shot_name, cache_dir):
+		self.shot_name = shot_name
+		self.cache_dir = cache_dir
+		self.sets = []
+		self.characters = []
+		self.animated_props = []
+		self.has_camera = False
+		self.missing = []
+		self._animated = {}
+
+	@classmethod
+	def load(cls, shot_name, character_departments=None):
+		"""
+		resolve the given shot. Raises EnvironmentError if the shot or its anim element
+		doesn't exist. Missing json files are listed in the missing attribute.
+		Runs in the active resolution context, so callers that go on to build the shot
+		can reuse the bodies and elements it looked up.
+		"""
+		if character_departments is None:
+			character_departments = cls.CHARACTER_DEPARTMENTS
+
+		with resolution.ensure("shot manifest " + str(shot_name), verbose=False):
+			body = resolution.get_body(shot_name)
+			if body is None or not body.is_shot():
+				raise EnvironmentError("not a shot: " + str(shot_name))
+			cache_dir = resolution.get_element(shot_name, Department.ANIM).get_cache_dir()
+
+			manifest = cls(shot_name, cache_dir)
+			assets_dir = resolution.get_project().get_assets_dir()
+
+			for reference in manifest._read(cls.SETS_FILENAME):
+				set_name = reference["asset_name"]
+				set_cache_dir = os.path.join(assets_dir, set_name, "model", "main", "cache")
+				try:
+					layout = resolution.memo("set_layout", set_cache_dir, lambda: set_layout.load(set_cache_dir, set_name))
+				except (IOError, OSError, ValueError):
+					layout = None
+				manifest.sets.append({
+					"asset_name": set_name,
+					"version_number": reference.get("version_number", 0),
+					"layout": layout
+				})
+
+			for reference in manifest._read(cls.CHARACTERS_FILENAME):
+				if reference["asset_name"] == CAMERA_NAME:
+					manifest.has_camera = True
+					continue
+				manifest.characters.append(manifest._resolve_character(reference, character_departments))
+
+			for reference in manifest._read(cls.ANIMATED_PROPS_FILENAME):
+				manifest.add_animated_prop(reference["asset_name"], reference.get("version_number"))
+
+		return manifest
+
+	def _read(self, filename):
+		filepath = os.path.join(self.cache_dir, filename)
+		if not os.path.exists(filepath):
+			self.missing.append(filepath)
+			return []
+		return pipeline_io.readfile(filepath)
+
+	def _resolve_character(self, reference, departments):
+		asset_name = reference["asset_name"]
+		department_paths = {}
+		for department in departments:
+			try:
+				publish = resolution.get_element(asset_name, department).get_last_publish()
+			except EnvironmentError:
+				continue
+			if publish:
+				department_paths[department] = publish[3]
+
+		return {
+			"asset_name": asset_name,
+			"version_number": reference.get("version_number", 0),
+			"body": resolution.get_body(asset_name),
+			"department_paths": department_paths
+		}
+
+	def add_animated_prop(self, asset_name, version_number):
+		self.animated_props.append({"asset_name": asset_name, "version_number": version_key(version_number)})
+		self._animated[(str(asset_name), version_key(version_number))] = self.animated_props[-1]
+
+	def is_animated(self, asset_name, version_number):
+		return (str(asset_name), version_key(version_number)) in self._animated
+
+	def set_props(self, set_name):
+		"""
+		return the props of the given set as SetLayout rows, each with an "animated" flag
+		"""
+		for entry in self.sets:
+			if entry["asset_name"] != set_name or entry["layout"] is None:
+				continue
+			props = []
+			for row in entry["layout"]:
+				row["animated"] = self.is_animated(row["asset_name"], row["version_number"])
+				props.append(row)
+			return props
+		return []
+
+	def to_dict(self):
+		"""
+		return the manifest as plain data, e.g. to hand to a farm job as json
+		"""
+		return {
+			"shot_name": self.shot_name,
+			"cache_dir": self.cache_dir,
+			"has_camera": self.has_camera,
+			"sets": [{"asset_name": entry["asset_name"], "version_number": entry["version_number"],
+					"props": self.set_props(entry["asset_name"])} for entry in self.sets],
+			"characters": [{"asset_name": entry["asset_name"], "version_number": entry["version_number"],
+					"department_paths": entry["department_paths"]} for entry in self.characters],
+			"animated_props": list(self.animated_props),
+			"missing": list(self.missing)
+		}
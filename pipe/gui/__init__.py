@@ -4,7 +4,7 @@ byu mini gui tools
 @author Brigham Young University
 """
 
-__all__ = ["checkbox_options", "quick_dialogs", "select_from_list", "write_message"]
+__all__ = ["checkbox_options", "quick_dialogs", "search_index", "select_from_list", "write_message"]
 
 #from checkbox_options import *
 #from quick_dialogs import *
@@ -6,7 +6,9 @@ try:
     from PySide import QtCore
 except ImportError:
     from PySide2 import QtWidgets, QtGui, QtCore
-from pipe.am.project import Project
+from pipe.am.body import AssetType
+from pipe.am.catalog import get_catalog
+from pipe.am.change_feed import ChangeFeed
 from pipe.am.environment import Department, Environment
 
 
@@ -16,13 +18,18 @@ WINDOW_HEIGHT = 600
 class CheckoutWindow(QtWidgets.QWidget):
 
     finished = QtCore.Signal()
+    catalogChanged = QtCore.Signal(object)
 
     def __init__(self, parent, dept_list=Department.ALL):
         super(CheckoutWindow, self).__init__()
         self.parent = parent
-        self.project = Project()
+        self.catalog = get_catalog()
+        self.project = self.catalog.get_project()
         self.environment = Environment()
+        self._bodies = {}
+        self._published = {}
         self.initUI(dept_list)
+        self.watchCatalog()
 
     def initUI(self, dept_list):
         #define gui elements
@@ -102,98 +109,139 @@ class CheckoutWindow(QtWidgets.QWidget):
         return
 
     def createTabs(self):
-        #remember the current index so that we can restore it when we create the tabs
-        currIndex = self.dept_tabs.currentIndex()
         #clear out the old tabs
         self.dept_tabs.clear()
-        #create tabs
+        #create empty tabs, each is filled the first time it is shown
         for dept in self.dept_list:
             tab = DepartmentTab(self)
             self.dept_tabs.addTab(tab, dept)
             tab_layout = QtWidgets.QHBoxLayout()
             element_list = QtWidgets.QTreeWidget()
             element_list.setColumnCount(1)
+            element_list.currentItemChanged.connect(self.set_current_item)
             commentBox = QtWidgets.QTextEdit()
             commentBox.setReadOnly(False)
+            tab.element_list = element_list
             tab.commentBox = commentBox
-
-            if dept in Department.ASSET_DEPTS:
-                for asset in self.project.list_assets():
-                    #print(asset)
-                    if not self.show_published.isChecked() or self.hasPreviousPublish(asset, dept):
-                        asset_array = asset.split("_")
-                        firstelement = element_list.findItems(asset_array[0], 0, 0)
-                        if not firstelement:
-                            item = QtWidgets.QTreeWidgetItem(asset_array[0])
-                            item.setText(0,asset_array[0])
-                            item.setTextColor(0,"#d0d0d0")
-                            font = QtGui.QFont()
-                            font.setPointSize(11)
-                            font.setBold(True)
-                            item.setFont(0,font)
-                            self.recurseTree(item, asset_array[1:],asset)
-                            element_list.insertTopLevelItem(0,item)
-                        else:
-                            self.recurseTree(firstelement[0], asset_array[1:],asset)
-                        element_list.currentItemChanged.connect(self.set_current_item)
-            elif dept in Department.SHOT_DEPTS:
-                for shot in self.project.list_shots():
-                    #print(shot)
-                    if not self.show_published.isChecked() or self.hasPreviousPublish(shot, dept):
-                        shot_array = shot.split("_")
-                        firstelement = element_list.findItems(shot_array[0], 0, 0)
-                        if not firstelement:
-                            item = QtWidgets.QTreeWidgetItem(shot_array[0])
-                            item.setText(0,shot_array[0])
-                            item.setTextColor(0,"#d0d0d0")
-                            font = QtGui.QFont()
-                            font.setPointSize(11)
-                            font.setBold(True)
-                            item.setFont(0,font)
-                            self.recurseTree(item, shot_array[1:],shot)
-                            element_list.insertTopLevelItem(0,item)
-                        else:
-                            self.recurseTree(firstelement[0], shot_array[1:],shot)
-                        element_list.currentItemChanged.connect(self.set_current_item)
-            elif dept in Department.CROWD_DEPTS:
-                for crowdCycle in self.project.list_crowd_cycles():
-                    if not self.show_published.isChecked() or self.hasPreviousPublish(crowdCycle, dept):
-                        crowdCycle_array = crowdCycle.split("_")
-                        firstelement = element_list.findItems(crowdCycle_array[0], 0, 0)
-                        if not firstelement:
-                            item = QtWidgets.QTreeWidgetItem(crowdCycle_array[0])
-                            item.setText(0,crowdCycle_array[0])
-                            item.setTextColor(0,"#d0d0d0")
-                            font = QtGui.QFont()
-                            font.setPointSize(11)
-                            font.setBold(True)
-                            item.setFont(0,font)
-                            self.recurseTree(item, crowdCycle_array[1:],crowdCycle)
-                            element_list.insertTopLevelItem(0,item)
-                        else:
-                            self.recurseTree(firstelement[0], crowdCycle_array[1:],crowdCycle)
-                        element_list.currentItemChanged.connect(self.set_current_item)
             tab_layout.addWidget(element_list)
             tab_layout.addWidget(commentBox)
             tab.setLayout(tab_layout)
 
-        #restore the previous index
-        self.dept_tabs.setCurrentIndex(currIndex)
+        self.dept_tabs.currentChanged.connect(self.populateTab)
+        self.populateTab(self.dept_tabs.currentIndex())
+
+    def populateTab(self, index):
+        tab = self.dept_tabs.widget(index)
+        if tab is None or tab.populated:
+            return
+        dept = self.dept_list[index]
+        bodies = self.listBodies(dept)
+        if self.show_published.isChecked():
+            published = self.listPublishedBodies(dept)
+            bodies = [body for body in bodies if body in published]
+
+        tab.element_list.clear()
+        for body in bodies:
+            body_array = body.split("_")
+            firstelement = tab.element_list.findItems(body_array[0], 0, 0)
+            if not firstelement:
+                item = QtWidgets.QTreeWidgetItem(body_array[0])
+                item.setText(0,body_array[0])
+                item.setTextColor(0,"#d0d0d0")
+                font = QtGui.QFont()
+                font.setPointSize(11)
+                font.setBold(True)
+                item.setFont(0,font)
+                self.recurseTree(item, body_array[1:],body)
+                tab.element_list.insertTopLevelItem(0,item)
+            else:
+                self.recurseTree(firstelement[0], body_array[1:],body)
+        tab.populated = True
+
+    def bodiesDir(self, dept):
+        '''
+        return the directory the department's bodies live in, or None
+        '''
+        if dept in Department.ASSET_DEPTS:
+            return self.project.get_assets_dir()
+        elif dept in Department.SHOT_DEPTS:
+            return self.project.get_shots_dir()
+        elif dept in Department.CROWD_DEPTS:
+            return self.project.get_crowds_dir()
+        return None
+
+    def watchCatalog(self):
+        '''
+        watch the departments' directories, so the bodies listed for a department are
+        dropped when something under its directory changes
+        '''
+        roots = set()
+        for dept in self.dept_list:
+            dirpath = self.bodiesDir(dept)
+            if dirpath is not None and os.path.isdir(dirpath):
+                roots.add(os.path.normpath(dirpath))
 
+        # The feed calls back on its own thread, the signal queues the batch to the GUI thread
+        self.catalogChanged.connect(self.applyChanges, QtCore.Qt.QueuedConnection)
+        self.changeFeed = ChangeFeed(sorted(roots))
+        self.changeFeed.subscribe(self.catalogChanged.emit)
+        self.changeFeed.start()
+
+    def applyChanges(self, events):
+        '''
+        drop the bodies of every department a batch of change events touched, and fill
+        the current tab again if it was one of them
+        '''
+        for event in events:
+            self.catalog.invalidate(event.path)
+        for index, dept in enumerate(self.dept_list):
+            dirpath = self.bodiesDir(dept)
+            if dirpath is None or not any(event.is_under(dirpath) for event in events):
+                continue
+            self._bodies.pop(dept, None)
+            self._published.pop(dept, None)
+            self.dept_tabs.widget(index).populated = False
+        self.populateTab(self.dept_tabs.currentIndex())
+
+    def listBodies(self, dept):
+        '''
+        return the names of the bodies the department works on. They're listed once,
+        until the change feed sees something change under the department's directory.
+        '''
+        if dept not in self._bodies:
+            if dept in Department.ASSET_DEPTS:
+                self._bodies[dept] = self.catalog.list_assets()
+            elif dept in Department.SHOT_DEPTS:
+                self._bodies[dept] = self.catalog.list_assets(AssetType.SHOT)
+            elif dept in Department.CROWD_DEPTS:
+                self._bodies[dept] = self.catalog.list_crowd_cycles()
+            else:
+                self._bodies[dept] = []
+        return self._bodies[dept]
+
+    def listPublishedBodies(self, dept):
+        '''
+        return the set of bodies whose element in the department has been published.
+        The table is built in one pass the first time it's needed, so toggling the
+        filter after that doesn't touch the disk until the department changes.
+        '''
+        if dept not in self._published:
+            parent_dir = self.project.get_crowds_dir() if dept in Department.CROWD_DEPTS else None
+            self._published[dept] = set(self.catalog.published(dept, self.listBodies(dept), parent_dir))
+        return self._published[dept]
 
     def hasPreviousPublish(self, body, department):
-        asset_obj = self.project.get_body(body)
-        element_obj = asset_obj.get_element(department)
-        last_publish = element_obj.get_last_publish()
-        if last_publish is None:
-            return False
-        return True
+        return body in self.listPublishedBodies(department)
 
     def changeBodyCheckoutVisibility(self):
-        #recreate tabs the with the new check option
-        self.createTabs()
+        #empty the tabs so they're filled again with the new check option when shown
+        for i in range(self.dept_tabs.count()):
+            self.dept_tabs.widget(i).populated = False
+        self.populateTab(self.dept_tabs.currentIndex())
 
     def set_current_item(self, index):
+        if index is None:
+            return
         current_dept = self.dept_list[self.dept_tabs.currentIndex()]
         if current_dept in Department.ASSET_DEPTS:
             self.current_item = str(index.text(1))
@@ -230,6 +278,7 @@ class CheckoutWindow(QtWidgets.QWidget):
 
 
     def closeEvent(self, event):
+        self.changeFeed.stop()
         self.finished.emit()
         event.accept()
 
@@ -237,7 +286,9 @@ class DepartmentTab(QtWidgets.QWidget):
     def __init__(self, parent):
         super(DepartmentTab, self).__init__()
         self.parent = parent
+        self.element_list = None
         self.commentBox = None
+        self.populated = False
 
 if __name__ == '__main__':
     app = QtWidgets.QApplication(sys.argv)
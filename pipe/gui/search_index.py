@@ -0,0 +1,163 @@
+'''
+Ranked searching for pick lists like SelectFromList. Results are sorted best first:
+exact matches, then matches at the start of the name, at the start of a word in
+it ("tree" in "big_tree"), anywhere in it, and last (in fuzzy mode) names that
+hold the letters in order ("btr" in "big_tree").
+
+Each search only ranks the names holding all of the query's letters, or the
+results of the search before when the query just got longer (anything that
+matches the longer query also matches the shorter one), whichever is fewer.
+
+index = SearchIndex(project.list_assets())
+names = [index.items[i] for i in index.search("tre")]
+'''
+
+import re
+from collections import defaultdict
+
+PREFIX = "prefix"
+SUBSTRING = "substring"
+FUZZY = "fuzzy"
+MODES = [PREFIX, SUBSTRING, FUZZY]
+
+EXACT_RANK = 0
+PREFIX_RANK = 1
+WORD_RANK = 2
+SUBSTRING_RANK = 3
+FUZZY_RANK = 4
+
+WORD_SEPARATORS = "_- ./:"
+WORD_START = re.compile("[" + re.escape(WORD_SEPARATORS) + "]([^" + re.escape(WORD_SEPARATORS) + "])")
+
+class SearchIndex(object):
+
+    def __init__(self, items=(), mode=FUZZY, case_sensitive=False):
+        if mode not in MODES:
+            raise ValueError("not a search mode: " + str(mode))
+        self.mode = mode
+        self.case_sensitive = case_sensitive
+        self.set_items(items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def set_items(self, items):
+        self.items = list(items)
+        self._keys = [self._key(item) for item in self.items]
+        # The items holding, starting with, and with a word starting with each letter
+        by_char = defaultdict(set)
+        by_first_char = defaultdict(set)
+        by_word_char = defaultdict(set)
+        for i, key in enumerate(self._keys):
+            for char in set(key):
+                by_char[char].add(i)
+            if key:
+                by_first_char[key[0]].add(i)
+            for char in set(WORD_START.findall(key)):
+                by_word_char[char].add(i)
+        self._by_char = dict(by_char)
+        self._by_first_char = dict(by_first_char)
+        self._by_word_char = dict(by_word_char)
+        self._last_query = None
+        self._last_matches = None
+
+    '''
+        Return the indices of the items that match query, best first. An empty
+        query matches everything, in the original order.
+    '''
+    def search(self, query):
+        query = self._key(query)
+        if not query:
+            self._last_query = None
+            self._last_matches = None
+            return range(len(self.items))
+
+        if len(query) == 1:
+            matches = self._ranked_by_char(query)
+        else:
+            candidates = self._with_chars(query)
+            if self._last_query and query.startswith(self._last_query) and len(self._last_matches) < len(candidates):
+                candidates = self._last_matches
+            matches = self._ranked(candidates, query)
+        self._last_query = query
+        # Kept in index order so a narrower search doesn't depend on this one's ranking
+        self._last_matches = sorted(matches)
+        return matches
+
+    def _key(self, text):
+        text = unicode(text) if not isinstance(text, basestring) else text
+        return text if self.case_sensitive else text.lower()
+
+    def _with_chars(self, query):
+        sets = []
+        for char in set(query):
+            found = self._by_char.get(char)
+            if not found:
+                return []
+            sets.append(found)
+        sets.sort(key=len)
+        return sorted(sets[0].intersection(*sets[1:]))
+
+    def _ranked_by_char(self, char):
+        # The first letter typed matches the most items, so it's ranked from the sets
+        # built in set_items instead of item by item. Each rank is in item order.
+        first = self._by_first_char.get(char, set())
+        word = self._by_word_char.get(char, set()) - first
+        rest = self._by_char.get(char, set()) - first - word
+        exact = [i for i in first if len(self._keys[i]) == 1]
+        prefix = sorted(first.difference(exact))
+        if self.mode == PREFIX:
+            return sorted(exact) + prefix
+        return sorted(exact) + prefix + sorted(word) + sorted(rest)
+
+    def _ranked(self, candidates, query):
+        # Ranks are packed into one int per item, since sorting ints is much faster
+        # than sorting tuples: rank, then where the match starts, how much of the
+        # name it spans and the name's length, each clamped to 10 bits
+        keys = self._keys
+        size = len(query)
+        scored = []
+        for i in candidates:
+            key = keys[i]
+            position = key.find(query)
+            if position == 0:
+                rank = EXACT_RANK if len(key) == size else PREFIX_RANK
+                span = size
+            elif position > 0:
+                if self.mode == PREFIX:
+                    continue
+                rank, position = self._substring_rank(key, query, position)
+                span = size
+            else:
+                if self.mode != FUZZY:
+                    continue
+                fuzzy = self._fuzzy_span(key, query)
+                if fuzzy is None:
+                    continue
+                rank = FUZZY_RANK
+                position, span = fuzzy[0], fuzzy[1] - fuzzy[0]
+            scored.append(((((rank << 10) + min(position, 1023) << 10) + min(span, 1023) << 10) + min(len(key), 1023), i))
+        scored.sort()
+        return [i for score, i in scored]
+
+    def _substring_rank(self, key, query, position):
+        first = position
+        while position >= 0:
+            if key[position - 1] in WORD_SEPARATORS:
+                return WORD_RANK, position
+            position = key.find(query, position + 1)
+        return SUBSTRING_RANK, first
+
+    def _fuzzy_span(self, key, query):
+        # Match every letter as early as possible to find where the match ends, then
+        # walk back from there for the latest place it can start
+        position = -1
+        for char in query:
+            position = key.find(char, position + 1)
+            if position < 0:
+                return None
+        end = position + 1
+        position = end
+        for char in reversed(query):
+            position = key.rfind(char, 0, position)
+        return position, end
@@ -5,29 +5,153 @@ try:
 except ImportError:
     from PySide2 import QtWidgets, QtGui, QtCore
 
+from pipe.gui import search_index
+
 
 def select_from_list(list, parent):  # TODO: finish this.
     window = QtWidgets.QWidget()
     pass
 
-class ItemList(QtWidgets.QListWidget):
-    all_items = []
-    shown_items = []
+class SearchListModel(QtCore.QAbstractListModel):
+
+    def __init__(self, items=[], parent=None):
+        QtCore.QAbstractListModel.__init__(self, parent)
+        self.items = list(items)
+
+    def set_items(self, items):
+        self.beginResetModel()
+        self.items = list(items)
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.items)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role not in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            return None
+        return self.items[index.row()]
+
+
+class SearchProxyModel(QtCore.QAbstractProxyModel):
+    '''
+    Shows the rows of a SearchListModel that match the query, best first. The
+    matching is done by a SearchIndex, and filtering only swaps the list of source
+    rows, so the view asks for the few rows it shows instead of every item being
+    re-created.
+    '''
+
+    def __init__(self, mode=search_index.FUZZY, parent=None):
+        QtCore.QAbstractProxyModel.__init__(self, parent)
+        self.search_index = search_index.SearchIndex(mode=mode)
+        self.query = ""
+        self._rows = []
+        self._proxy_rows = None
+
+    def setSourceModel(self, model):
+        QtCore.QAbstractProxyModel.setSourceModel(self, model)
+        model.modelReset.connect(self._source_reset)
+        self._source_reset()
+
+    def set_query(self, query):
+        self.beginResetModel()
+        self.query = query
+        self._rows = self.search_index.search(query)
+        self._proxy_rows = None
+        self.endResetModel()
+
+    def shown_items(self):
+        items = self.sourceModel().items
+        return [items[row] for row in self._rows]
+
+    def _source_reset(self):
+        self.beginResetModel()
+        self.search_index.set_items(self.sourceModel().items)
+        self._rows = self.search_index.search(self.query)
+        self._proxy_rows = None
+        self.endResetModel()
 
-    def __init__(self, l=[], multiple_selection=False):
-        QtWidgets.QListWidget.__init__(self)
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if parent.isValid() or column != 0 or not 0 <= row < len(self._rows):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
 
-        # Create the list widget
-        self.shown_items = l
-        self.all_items = l
+    def parent(self, index):
+        return QtCore.QModelIndex()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 1
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QtCore.QModelIndex()
+        return self.sourceModel().index(self._rows[proxy_index.row()], 0)
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QtCore.QModelIndex()
+        if self._proxy_rows is None:
+            self._proxy_rows = dict((row, i) for i, row in enumerate(self._rows))
+        row = self._proxy_rows.get(source_index.row())
+        if row is None:
+            return QtCore.QModelIndex()
+        return self.index(row, 0)
+
+
+class ItemList(QtWidgets.QListView):
+
+    def __init__(self, l=[], multiple_selection=False, mode=search_index.FUZZY):
+        QtWidgets.QListView.__init__(self)
+
+        # Create the list view
+        self.source_model = SearchListModel(l, self)
+        self.proxy_model = SearchProxyModel(mode, self)
+        self.proxy_model.setSourceModel(self.source_model)
+        self.setModel(self.proxy_model)
+        self.setUniformItemSizes(True)
         self.setSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding, QtWidgets.QSizePolicy.Expanding)
         if multiple_selection:
             self.setSelectionMode(QtWidgets.QAbstractItemView.MultiSelection)
 
+    @property
+    def all_items(self):
+        return self.source_model.items
+
+    @property
+    def shown_items(self):
+        return self.proxy_model.shown_items()
+
     def set_list(self, l):
-        self.clear()
-        for item in l:
-            self.addItem(item)
+        self.source_model.set_items(l)
+
+    def filter(self, text):
+        '''
+        show only the items matching text, keeping the selected ones that still match selected
+        '''
+        selected = set(self.selected_rows())
+        self.proxy_model.set_query(text)
+        selection = QtWidgets.QItemSelection()
+        for source_row in selected:
+            index = self.proxy_model.mapFromSource(self.source_model.index(source_row, 0))
+            if index.isValid():
+                selection.select(index, index)
+        if not selection.isEmpty():
+            self.selectionModel().select(selection, QtCore.QItemSelectionModel.Select)
+
+    def selected_rows(self):
+        '''
+        return the source rows of the selected items
+        '''
+        return sorted(self.proxy_model.mapToSource(index).row() for index in self.selectionModel().selectedIndexes())
+
+    def selected_values(self):
+        return [self.source_model.items[row] for row in self.selected_rows()]
 
 
 class SelectFromList(QtWidgets.QWidget):
@@ -75,10 +199,8 @@ class SelectFromList(QtWidgets.QWidget):
 
     def initializeListWidget(self):
         self.listWidget = ItemList(self.list, self.multiple_selection)
-        self.listWidget.itemSelectionChanged.connect(self.select)
+        self.listWidget.selectionModel().selectionChanged.connect(self.select)
         self.vbox.addWidget(self.listWidget)
-        self.listWidget.shown_items = self.list
-        self.listWidget.set_list(self.listWidget.shown_items)
 
     def initializeSubmitButton(self):
         # Create the button widget
@@ -92,23 +214,15 @@ class SelectFromList(QtWidgets.QWidget):
         self.values = values
         self.button.setEnabled(len(self.values) > 0)
 
-    def select(self):
-        # print "selected items: {0}".format(self.listWidget.selectedItems())
-        if len(self.listWidget.selectedItems()) == 0:
-            self.set_values([])
-        else:
-            self.set_values([x.text() for x in self.listWidget.selectedItems()])
+    def select(self, *args):
+        self.set_values(self.listWidget.selected_values())
 
     '''
     Update the shown list items when a user types in the search bar
     '''
     def textEdited(self, newText):
-        self.listWidget.shown_items = []
-        for item in self.listWidget.all_items:
-            if newText in item:
-                self.listWidget.shown_items.append(item)
-        self.listWidget.set_list(self.listWidget.shown_items)
-        self.set_values([x.text() for x in self.listWidget.selectedItems()])
+        self.listWidget.filter(newText)
+        self.set_values(self.listWidget.selected_values())
 
     '''
     Send the selected values to a function set up in the calling class and
@@ -134,6 +248,8 @@ class SelectFromMultipleLists(SelectFromList):
         self.resize(600,600)
         self.setWindowTitle(title)
         self.lists = lists
+        self.list = []
+        self.values = []
         self.multiple_selection = multiple_selection
 
         self.labels = sorted([x for x in lists])
@@ -169,9 +285,6 @@ class SelectFromMultipleLists(SelectFromList):
             return
         newList = self.lists[newLabel]
         self.currLabel = newLabel
-        self.listWidget.all_items = newList
-        self.listWidget.shown_items = newList
-        print "newList: {0}".format(newList)
         self.listWidget.set_list(newList)
         if not init and self.multiple_selection:
             self.textEdited(self.searchBox.text())
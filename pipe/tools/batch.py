@@ -0,0 +1,155 @@
+'''
+    Run a JSON defined tool many times, once per set of arguments, in
+    non-gui mode. Every argument set is checked before anything runs, so a
+    batch that would need a prompt fails upfront instead of half way through.
+
+    >>> from pipe.tools.batch import run_batch
+    >>> report = run_batch("test.message_displayer.tool", [{"message": "a"}, {"message": "b"}])
+    >>> print report
+'''
+import time
+import traceback
+from multiprocessing.pool import ThreadPool
+
+from pipe.tools.tool import Tool, NeedsUserInputError, get_registry
+
+class BatchResult:
+
+    def __init__(self, index, kwargs):
+        self.index = index
+        self.kwargs = kwargs
+        self.success = False
+        self.error = None
+        self.details = None
+        self.elapsed = 0.0
+        self.timings = {}
+
+    def __str__(self):
+        status = "ok" if self.success else "FAILED: {0}".format(self.error)
+        return "[{0}] {1} ({2:.3f}s) {3}".format(self.index, self.kwargs, self.elapsed, status)
+
+class BatchReport:
+
+    def __init__(self, tool_name, results, elapsed):
+        self.tool_name = tool_name
+        self.results = sorted(results, key=lambda result: result.index)
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.success]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.success]
+
+    # Total time spent in each method over the whole batch
+    def method_timings(self):
+        totals = {}
+        for result in self.results:
+            for name, elapsed in result.timings.items():
+                totals[name] = totals.get(name, 0.0) + elapsed
+        return totals
+
+    def __str__(self):
+        lines = ["{0}: {1} succeeded, {2} failed in {3:.3f}s".format(
+            self.tool_name, len(self.succeeded), len(self.failed), self.elapsed)]
+
+        totals = self.method_timings()
+        for name in sorted(totals, key=totals.get, reverse=True):
+            lines.append("    {0:<32} {1:8.3f}s".format(name, totals[name]))
+
+        for result in self.failed:
+            lines.append(str(result))
+            lines.append(result.details)
+        return "\n".join(lines)
+
+# Walk the methods the way Tool.execute() would and fail on the first prompt
+# that would have to run for any of the argument sets
+def check_batch(tool_path, arg_sets, registry=None):
+    if registry is None:
+        registry = get_registry()
+    definition = registry.definition(tool_path)
+
+    for index, kwargs in enumerate(arg_sets):
+        available = set(key for key, value in definition.items() if value)
+        available.update(key for key, value in kwargs.items() if value)
+
+        for method in definition["methods"]:
+            provides = method.get("provides", [])
+            if provides and all(provided in available for provided in provides):
+                continue
+            if method.get("prompt"):
+                raise NeedsUserInputError(
+                    "Argument set ", index, " ", kwargs, " needs user input through ",
+                    Tool.pre + method["module"] + "." + method["name"] + "()",
+                    ". Pass ", ", ".join(provides) if provides else "the prompt's fields", " instead."
+                    )
+            available.update(provides)
+
+# One Tool per job so jobs never share fields
+def _run_job(tool_path, registry, index, kwargs):
+    result = BatchResult(index, kwargs)
+    start = time.time()
+    tool = None
+    try:
+        tool = Tool(tool_path, gui=False, registry=registry, max_workers=1)
+        tool.execute(**kwargs)
+        result.success = not tool.cancelled
+        if tool.cancelled:
+            result.error = "cancelled"
+    except Exception as e:
+        result.error = "{0}: {1}".format(type(e).__name__, e)
+        result.details = traceback.format_exc()
+    result.elapsed = time.time() - start
+    if tool is not None:
+        result.timings = dict(getattr(tool, "timings", {}))
+    return result
+
+# A batch can only spread its jobs over threads if every method of the tool
+# is marked thread_safe. hou, maya.cmds and pymel must stay on the main thread.
+def is_thread_safe(definition):
+    return all(method.get("thread_safe") and not method.get("prompt") for method in definition["methods"])
+
+# Run tool_path once for every dict of keyword arguments in arg_sets.
+# Jobs run one after another on the calling thread. workers > 1 runs them on
+# a pool of worker threads, but only for tools whose methods are all
+# thread_safe. Other tools still run one job at a time.
+def run_batch(tool_path, arg_sets, workers=1, registry=None):
+    if registry is None:
+        registry = get_registry()
+    arg_sets = list(arg_sets)
+    check_batch(tool_path, arg_sets, registry)
+
+    if workers > 1 and not is_thread_safe(registry.definition(tool_path)):
+        print "{0} has methods that aren't thread_safe, running the batch on one thread".format(tool_path)
+        workers = 1
+
+    start = time.time()
+    jobs = [(tool_path, registry, index, kwargs) for index, kwargs in enumerate(arg_sets)]
+    if workers <= 1 or len(jobs) <= 1:
+        results = [_run_job(*job) for job in jobs]
+    else:
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(lambda job: _run_job(*job), jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    name = registry.definition(tool_path).get("name", tool_path)
+    return BatchReport(name, results, time.time() - start)
+
+# One argument set per body, e.g. body_arg_sets(project.list_assets(), element="model")
+# Leave bodies out to use every body in the project.
+def body_arg_sets(bodies=None, field="body", **common):
+    if bodies is None:
+        from pipe.am.project import Project
+        bodies = Project().list_bodies()
+
+    arg_sets = []
+    for body in bodies:
+        kwargs = dict(common)
+        kwargs[field] = body
+        arg_sets.append(kwargs)
+    return arg_sets
@@ -1,5 +1,10 @@
 '''
     If anything needs to happen after the scene loads, here's where to do it
 '''
+from pipe.tools.tool import get_registry
 
 print "script that runs before"
+
+# Parse the tools in houtools/_program.json once, so the menus start them warm.
+# After the first scene this only stats the tool files.
+get_registry().warm_program("houtools", gui=True)
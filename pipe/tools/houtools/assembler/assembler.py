@@ -84,12 +84,16 @@ from pipe.am.project import Project
 from pipe.am.environment import Environment, Department
 from pipe.am.element import Element
 from pipe.am.body import Body, Asset, Shot, AssetType
+from pipe.am import set_layout
+from pipe.am import resolution
+from pipe.am import set_diff
 
 import pipe.gui.select_from_list as sfl
 import pipe.gui.quick_dialogs as qd
 import pipe.gui.write_message as wm
 
 from pipe.tools.houtools.utils.utils import *
+from pipe.tools.houtools.utils import hda_resolver
 from pipe.tools.houtools.publisher.publisher import Publisher
 try:
     from pipe.tools.houtools.cloner.cloner import Cloner
@@ -123,13 +127,8 @@ class Assembler:
         # The source HDA's are currently stored inside the pipe source code.
         self.hda_path = Environment().get_otl_dir()
 
-        # We define the template HDAs definitions here, for use in the methods below
-        self.hda_definitions = {
-            Department.MATERIAL: hou.hdaDefinition(hou.sopNodeTypeCategory(), "dcc_material", os.path.join(self.hda_path, "dcc_material.hda")),
-            Department.MODIFY: hou.hdaDefinition(hou.sopNodeTypeCategory(), "dcc_modify", os.path.join(self.hda_path, "dcc_modify.hda")),
-            Department.HAIR: hou.hdaDefinition(hou.objNodeTypeCategory(), "dcc_hair", os.path.join(self.hda_path, "dcc_hair.hda")),
-            Department.CLOTH: hou.hdaDefinition(hou.objNodeTypeCategory(), "dcc_cloth", os.path.join(self.hda_path, "dcc_cloth.hda"))
-        }
+        # The template HDAs definitions, for use in the methods below. They are only created once per session.
+        self.hda_definitions = hda_resolver.template_definitions()
 
         # By default, we ignore "Asset Controls", so that we can put things in there without them being promoted.
         # See: inherit_parameters() method
@@ -139,7 +138,7 @@ class Assembler:
         # step 1: Select the body
         # step 2: assemble the element
 
-        project = Project()
+        project = resolution.get_project()
         asset_list = project.list_assets()
 
         non_shot_list = []
@@ -153,16 +152,17 @@ class Assembler:
         self.asset_gui.submitted.connect(self.asset_results)
 
     def clone_set(self):
-        project = Project()
+        project = resolution.get_project()
         asset_list = project.list_sets()
 
         self.asset_gui = sfl.SelectFromList(l=asset_list, parent=houdini_main_window(), title="Select a set to clone")
         self.asset_gui.submitted.connect(self.asset_results)
 
+    @resolution.scoped
     def asset_results(self, asset):
         self.selected_asset = asset[0]
 
-        project = Project()
+        project = resolution.get_project()
         self.body = project.get_body(self.selected_asset)
 
         parent, instances = self.create_hda(self.selected_asset)
@@ -174,9 +174,10 @@ class Assembler:
     '''
         Easily callable method, meant for tool scripts
     '''
+    @resolution.scoped
     def tab_in(self, parent, asset_name, already_tabbed_in_node=None, excluded_departments=[]):
         print "Creating node for {0}".format(asset_name)
-        body = Project().get_body(asset_name)
+        body = resolution.get_body(asset_name)
         if body is None or not body.is_asset():
             qd.error("Pipeline error: This asset either doesn't exist or isn't an asset.")
             return
@@ -193,6 +194,7 @@ class Assembler:
     '''
         Easily callable method, meant for tool scripts
     '''
+    @resolution.scoped
     def update_contents(self, node, asset_name, mode=UpdateModes.SMART):
         if node.type().name() == "dcc_set":
             self.update_contents_set(node, asset_name, mode=mode)
@@ -201,8 +203,9 @@ class Assembler:
         elif node.type().name() == "dcc_geo":
             self.update_contents_geo(node, asset_name, mode=mode)
 
+    @resolution.scoped
     def subnet_type(self, asset_name):
-        body = Project().get_body(asset_name)
+        body = resolution.get_body(asset_name)
         if body is None or not body.is_asset():
             qd.error("Pipeline error: This asset either doesn't exist or isn't an asset.")
             return
@@ -222,10 +225,11 @@ class Assembler:
         This function tabs in a DCC Set and fills its contents with other DCC Geo nodes based on JSON data
     '''
 
+    @resolution.scoped
     def dcc_set(self, parent, set_name, already_tabbed_in_node=False, mode=UpdateModes.CLEAN):
 
         # Check if it's a set and that it exists
-        body = Project().get_body(set_name)
+        body = resolution.get_body(set_name)
         if not body.is_asset() or not body.get_type() == AssetType.SET:
             qd.error("Must be a set.")
 
@@ -239,36 +243,54 @@ class Assembler:
         return node
 
 
-    # Utility function to find if a node's asset and version number match an entry in the set's JSON
-    def matches_reference(self, child, reference):
-
-        # Grab data off the node. This data is stored as a key-value map parameter
+    # The (asset_name, version_number) key of a child of a set, read off its data parm
+    def reference_key(self, child):
         data = child.parm("data").evalAsJSONMap()
+        return (str(data.get("asset_name", "")), str(data.get("version_number", "")))
 
-        print "{0}:\n\t checked {1} against {2}".format(str(child), str(data), str(reference))
+    # Point a child of a set at its entry in the set
+    def set_reference_parms(self, subnet, set_name, reference, mode):
+        # Try to not override parameters in the set
+        if mode == UpdateModes.SMART:
+            for key in reference:
+                # Pull parm from node
+                parm = subnet.parm(key)
+                # If a non-default value is there, it most likely came from a user. Don't overwrite it.
+                if parm and parm.isAtDefault():
+                    parm.set(reference[key])
+
+        # Override parameters in the set
+        elif mode == UpdateModes.CLEAN:
+            newparms = {"asset_name" : reference["asset_name"], "version_number" : reference["version_number"] }
+            subnet.setParms(newparms)
 
-        # If it matches both the asset_name and version_number, it's a valid entry in the list
-        if data["asset_name"] == reference["asset_name"] and data["version_number"] == str(reference["version_number"]):
-            print "\tand it matched"
-            return True
-        else:
-            print "\tand it didn't match"
-            return False
+        # Build the set accordingly
+        subnet.parm("space").set("set")
+        subnet.parm("set").set(set_name)
+        subnet.parm("update_mode").set(UpdateModes.list_modes().index(mode))
+        # Set the data
+        subnet.parm("data").set({
+            "asset_name": str(reference["asset_name"]),
+            "version_number" : str(reference["version_number"])
+        })
 
     '''
         Updates the contents of a set
     '''
+    @resolution.scoped
     def update_contents_set(self, node, set_name, mode=UpdateModes.SMART):
-        # Check if reference file exists
-        set_file = os.path.join(Project().get_assets_dir(), set_name, "model", "main", "cache", "whole_set.json")
+        # Read the set's layout (converted from whole_set.json for older sets)
+        cache_dir = os.path.join(resolution.get_project().get_assets_dir(), set_name, "model", "main", "cache")
 
         # Error checking
         try:
-            with open(set_file) as f:
-                set_data = json.load(f)
+            layout = resolution.memo("set_layout", cache_dir, lambda: set_layout.load(cache_dir, set_name))
         except Exception as error:
+            layout = None
+        if layout is None:
             qd.error("No valid JSON file for " + set_name)
             return
+        set_data = layout.references()
 
         node.parm("asset_name").set(set_name)
         data = node.parm("data").evalAsJSONMap()
@@ -279,22 +301,26 @@ class Assembler:
         # Grab current DCC Dynamic Content Subnets that have been tabbed in
         current_children = [child for child in inside.children() if child.type().name() in ["dcc_set", "dcc_character", "dcc_geo"]]
 
-        # Smart updating will only destroy assets that no longer exist in the Set's JSON list
-        if mode == UpdateModes.SMART:
-            non_matching = [child for child in current_children if len([reference for reference in set_data if matches_reference(child, reference)]) == 0]
-            for non_match in non_matching:
-                non_match.destroy()
-
-        # Clean updating will destroy all children.
-        elif mode == UpdateModes.CLEAN:
+        # Clean updating will destroy all children and tab everything in again.
+        if mode == UpdateModes.CLEAN:
             inside.deleteItems(inside.children())
+            current_children = []
 
-        # Grab current children again
-        current_children = [child for child in inside.children() if child.type().name() in ["dcc_set", "dcc_character", "dcc_geo"]]
+        # Work out what changed. Each child's data parm is read once. A child on
+        # another version of its asset is a remove and an add, so it's tabbed in
+        # again and loads the version its data says.
+        delta = set_diff.diff(current_children, set_data, current_key=self.reference_key, group=None)
+        print "{0}: {1}".format(set_name, delta)
 
-        # Tab-in/update all assets in list
-        for reference in set_data:
-            body = Project().get_body(reference["asset_name"])
+        # Smart updating only destroys assets whose entry in the set changed.
+        # Frozen updating only adds assets that are missing.
+        if mode == UpdateModes.SMART:
+            for child in delta.remove:
+                child.destroy()
+
+        # Tab-in all assets that aren't there yet
+        for reference in delta.add:
+            body = resolution.get_body(reference["asset_name"])
 
             if body is None:
                 print 'Error on: ', reference["asset_name"]
@@ -309,29 +335,7 @@ class Assembler:
             subnet = cloned_subnet.copyTo(inside)
             cloned_subnet.destroy()
 
-            # Try to not override parameters in the set
-            if mode == UpdateModes.SMART:
-                for key in reference:
-                    # Pull parm from node
-                    parm = subnet.parm(key)
-                    # If a non-default value is there, it most likely came from a user. Don't overwrite it.
-                    if parm and parm.isAtDefault():
-                        parm.set(reference[key])
-
-            # Override parameters in the set
-            elif mode == UpdateModes.CLEAN:
-                newparms = {"asset_name" : reference["asset_name"], "version_number" : reference["version_number"] }
-                subnet.setParms(newparms)
-
-            # Build the set accordingly
-            subnet.parm("space").set("set")
-            subnet.parm("set").set(set_name)
-            subnet.parm("update_mode").set(UpdateModes.list_modes().index(mode))
-            # Set the data
-            subnet.parm("data").set({
-                "asset_name": str(reference["asset_name"]),
-                "version_number" : str(reference["version_number"])
-            })
+            self.set_reference_parms(subnet, set_name, reference, mode)
 
         inside.layoutChildren()
 
@@ -375,10 +379,11 @@ class Assembler:
         This function tabs in a DCC Character node and fills its contents with the appropriate character name.
         Departments is a mask because sometimes we tab this asset in when we want to work on Hair or Cloth, and don't want the old ones to be there.
     '''
+    @resolution.scoped
     def dcc_character(self, parent, asset_name, already_tabbed_in_node=None, excluded_departments=[], mode=UpdateModes.CLEAN, shot=None):
 
         # Set up the body/elements and make sure it's a character
-        body = Project().get_body(asset_name)
+        body = resolution.get_body(asset_name)
         if not body.is_asset() or not body.get_type() == AssetType.CHARACTER:
             qd.error("Must be a character.")
             return None
@@ -403,10 +408,11 @@ class Assembler:
     '''
         This function sets the inner contents of a DCC Character node.
     '''
+    @resolution.scoped
     def update_contents_character(self, node, asset_name, excluded_departments=[], mode=UpdateModes.SMART, shot=None):
 
         # Set up the body/elements and make sure it's a character. Just do some simple error checking.
-        body = Project().get_body(asset_name)
+        body = resolution.get_body(asset_name)
         if not body.is_asset() or body.get_type() != AssetType.CHARACTER or "dcc_character" not in node.type().name():
             qd.error("Must be a character.")
             return None
@@ -458,9 +464,10 @@ class Assembler:
     '''
         This function tabs in a DCC Geo node and fills its contents according to the appropriate asset name.
     '''
+    @resolution.scoped
     def dcc_geo(self, parent, asset_name, already_tabbed_in_node=None, excluded_departments=[], character=False, mode=UpdateModes.CLEAN):
         # Set up the body/elements and check if it's an asset.
-        body = Project().get_body(asset_name)
+        body = resolution.get_body(asset_name)
         if not body.is_asset():
             qd.error("Must be an asset.")
             return None
@@ -488,10 +495,11 @@ class Assembler:
     '''
         This function sets the dynamic inner contents of a DCC Geo node.
     '''
+    @resolution.scoped
     def update_contents_geo(self, node, asset_name, excluded_departments=[], mode=UpdateModes.SMART):
 
         # Set up the body/elements and make sure it's not a character. Just do some simple error checking.
-        body = Project().get_body(asset_name)
+        body = resolution.get_body(asset_name)
         if body is None:
             qd.error("Asset doesn't exist.")
             return None
@@ -535,6 +543,7 @@ class Assembler:
         @param department_paths: a dictionary of department to existing hda filepaths to clone. None if assembling
         @param already_tabbed_in_node: an hda where the new content hdas should be created. Typically None
     '''
+    @resolution.scoped
     def create_hda(self, asset_name, body=None, department_paths=None, already_tabbed_in_node=None):
         if body is None:
             body = self.body
@@ -617,7 +626,7 @@ class Assembler:
         Helper function for create_hda
     '''
     def get_checkout_file(self, element):
-        username = Project().get_current_username()
+        username = resolution.get_project().get_current_username()
         checkout_file = element.checkout(username)
 
         return checkout_file
@@ -735,35 +744,8 @@ class Assembler:
         Check if a definition is the published definition or not
     '''
     def published_definition(self, asset_name, department):
-        # Set the node type correctly
-        category = hou.objNodeTypeCategory() if department in self.dcc_character_departments else hou.sopNodeTypeCategory()
-        hou.hda.reloadAllFiles()
-
-        # Get the HDA File Path
-        hda_name = asset_name + "_" + department
-        hda_file = hda_name + "_main.hdanc"
-        new_hda_path = os.path.join(Project().get_project_dir(), "production", "hda", hda_file)
-        old_hda_path = os.path.join(Project().get_project_dir(), "production", "otls", hda_file)
-
-        hda_path = ""
-        # Does it exist?
-        if os.path.islink(new_hda_path):
-            hda_path = os.readlink(new_hda_path)
-        elif os.path.islink(old_hda_path):
-            hda_path = os.readlink(old_hda_path)
-        else:
-            return False
-
-        # If it does, grab the definition
-        hou.hda.installFile(hda_path)
-        hda_definition = hou.hdaDefinition(category, hda_name, hda_path)
-
-        # If the definition failed for some reason, don't tab it in.
-        if hda_definition is not None:
-            hda_definition.setPreferred(True)
-            return True
-        else:
-            return False
+        # The resolver caches the lookup for the session and installs each definition once
+        return hda_resolver.get_resolver().install(asset_name, department) is not None
 
     '''
         Promote parameters from an inner node up to an outer node.
@@ -950,7 +932,7 @@ class Assembler:
     '''this function has the set look for shot specific information, specifically if it has any animated objects'''
     def shotInfo(self, shot_name):
         print shot_name
-        shot_file = os.path.join(Project().get_shots_dir(),shot_name, "anim", "main", "cache", "animated_props.json")
+        shot_file = os.path.join(resolution.get_project().get_shots_dir(),shot_name, "anim", "main", "cache", "animated_props.json")
 
         shot_data=None
         try:
@@ -11,6 +11,7 @@ from pipe.am.body import Body
 from pipe.am.element import Element
 from pipe.am.environment import Department
 from pipe.am.environment import Environment
+from pipe.am import resolution
 
 
 class Cloner:
@@ -91,13 +92,13 @@ class Cloner:
         print("Selected asset: ", value[0])
         filename = value[0]
 
-        project = Project()
-        self.body = project.get_body(filename)
+        # Inside an assembly (e.g. tabbing in a set) these come from its resolution context
+        self.body = resolution.get_body(filename)
 
-        self.modify_element = self.body.get_element("modify")
-        self.material_element = self.body.get_element("material")
-        self.hair_element = self.body.get_element("hair")
-        self.cloth_element = self.body.get_element("cloth")
+        self.modify_element = resolution.get_element(filename, "modify")
+        self.material_element = resolution.get_element(filename, "material")
+        self.hair_element = resolution.get_element(filename, "hair")
+        self.cloth_element = resolution.get_element(filename, "cloth")
 
         self.filepath = self.body.get_filepath()
 
@@ -4,6 +4,8 @@ from pipe.am.project import Project
 from pipe.am.environment import Department, Environment
 from pipe.am.element import Element
 from pipe.am.body import Body, Asset, Shot, AssetType
+from pipe.am.shot_manifest import ShotManifest
+from pipe.am import resolution
 from pipe.tools.houtools.assembler.assembler import Assembler
 from pipe.tools.houtools.cloner.cloner import Cloner
 from pipe.tools.houtools.utils.utils import *
@@ -24,98 +26,65 @@ class Importer:
         self.select_from_list_dialog = sfl.SelectFromList(l=shot_list, parent=houdini_main_window(), title="Select a shot to import")
         self.select_from_list_dialog.submitted.connect(self.import_shot)
 
+    @resolution.scoped
     def import_shot(self, shot_name):
         shot_name = shot_name[0]
 
-        # Bring in the body so we can get info
-        body = Project().get_body(shot_name)
-        if not body:
-            qd.error("Error with body.")
-            return
-        elif not body.is_shot():
-            qd.error("Body is not shot?")
-            return
-
-        # Bring in element so we can get cache directory
-        element = body.get_element(Department.ANIM)
-        if not element:
-            qd.error("Anim department does not exist for {0} ".format(shot_name))
-            return
-
-        cache_dir = element.get_cache_dir()
-
-        sets_json = []
-        characters_json = []
-        animated_props_json = []
-
-        # open the json files for sets characters and animated props
+        # Resolve the whole shot (sets, characters, animated props, publishes) up front
         try:
-            with open(os.path.join(cache_dir, "sets.json")) as f:
-                sets_json = json.load(f)
-        except Exception as error:
-            print "{0}/sets.json not found.".format(cache_dir)
-
-        try:
-            with open(os.path.join(cache_dir, "characters.json")) as f:
-                characters_json = json.load(f)
-        except Exception as error:
-            print "{0}/characters.json not found.".format(cache_dir)
+            manifest = ShotManifest.load(shot_name)
+        except EnvironmentError as error:
+            qd.error("Error loading shot {0}: {1}".format(shot_name, error))
+            return
 
-        try:
-            with open(os.path.join(cache_dir, "animated_props.json")) as f:
-                animated_props_json = json.load(f)
-        except Exception as error:
-            print "{0}/animated_props.json not found.".format(cache_dir)
+        for filepath in manifest.missing:
+            print "{0} not found.".format(filepath)
 
         set_nodes = []
         character_nodes = []
         animated_prop_nodes = []
 
+        assembler = Assembler()
+
         print("Loading sets:")
-        for set in sets_json:
-            print("Set: ", set)
+        for set in manifest.sets:
+            print("Set: ", set["asset_name"])
 
             try:
-                set_node = Assembler().tab_in(hou.node("/obj"), set["asset_name"])
+                set_node = assembler.tab_in(hou.node("/obj"), set["asset_name"])
             except:
-                print "Error with {0}".format(set)
+                print "Error with {0}".format(set["asset_name"])
                 continue
 
             set_nodes.append(set_node)
 
-            print("Loading props in set ", set)
-            for prop in set_node.children():
-                print("Prop: ", prop)
+            # The props live inside the set's "inside" subnet
+            print("Loading props in set ", set["asset_name"])
+            props_parent = set_node.node("inside") or set_node
+            for prop in props_parent.children():
                 data_parm = prop.parm("data")
 
                 if data_parm is None:
                     continue
 
                 data = data_parm.evalAsJSONMap()
-                for animated_prop in animated_props_json:
-                    if data["asset_name"] == animated_prop["asset_name"] and data["version_number"] == animated_prop["version_number"]:
-                        prop.parm("space").set("anim")
-                        prop.parm("shot").set(shot_name)
-                        animated_prop_nodes.append(prop)
+                if manifest.is_animated(data.get("asset_name"), data.get("version_number")):
+                    print("Animated prop: ", prop)
+                    prop.parm("space").set("anim")
+                    prop.parm("shot").set(shot_name)
+                    animated_prop_nodes.append(prop)
 
         print("Loading characters: ")
-        for character in characters_json:
-            print("Character: ", character)
+        if manifest.has_camera:
+            character_nodes.append(self.tab_in_camera(shot_name))
 
-            if character["asset_name"] == "dcc_camera":
-                camera_node = self.tab_in_camera(shot_name)
-                character_nodes.append(camera_node)
-                continue
+        for character in manifest.characters:
+            print("Character: ", character["asset_name"])
 
             try:
-                # get the most recent data for this reference
+                # The manifest already has the most recent publishes for this character
                 asset_name = character["asset_name"]
-                character_node, instances = Cloner().asset_results([asset_name])
-                # Assembler().update_contents_character(character_node, asset_name, shot=shot_name)
-
-                # character_node = cloned_subnet.copyTo(inside)
-                # cloned_subnet.destroy()
-                # character_node = Assembler().dcc_character(hou.node("/obj"), character["asset_name"],shot=shot_name)
+                character_node, instances = assembler.create_hda(asset_name, body=character["body"], department_paths=character["department_paths"] or None)
 
                 # TODO: add the shot name in the dcc_geo inside dcc_character
                 inside = character_node.node("inside")
@@ -127,10 +96,8 @@ class Importer:
 
                 character_nodes.append(character_node)
             except:
-                print "Error with {0}".format(character)
+                print "Error with {0}".format(character["asset_name"])
                 continue
-            #shot_parm = character_node.parm("shot")
-            #shot_parm.set(shot_name)
 
             data_parm = character_node.parm("data")
             data = data_parm.evalAsJSONMap()
@@ -140,6 +107,8 @@ class Importer:
             version_number_parm = character_node.parm("version_number")
             version_number_parm.set(character["version_number"])
 
+        layout_object_level_nodes()
+
         # create network box in houdini and fill it with all objects in the shot
         box = hou.node("/obj").createNetworkBox()
         box.setComment(shot_name)
@@ -7,9 +7,13 @@ from pipe.am.environment import Environment
 from pipe.am.body import Body, AssetType
 from pipe.am.project import Project
 from pipe.am.element import Element
+from pipe.am import pipeline_io
+from pipe.am import set_layout
+from pipe.am import set_diff
 import pipe.gui.quick_dialogs as qd
 import pipe.gui.select_from_list as sfl
 from pipe.tools.houtools.utils.utils import *
+from pipe.tools.houtools.utils import hda_resolver
 
 
 class Publisher:
@@ -66,119 +70,105 @@ class Publisher:
         print("set: ", set)
         inside = set.node("inside")
         children = inside.children()
-        set_file = os.path.join(Project().get_assets_dir(), set_name, "model", "main", "cache", "whole_set.json")
+        cache_dir = os.path.join(project.get_assets_dir(), set_name, "model", "main", "cache")
 
-        set_data = []
+        # One read for the whole set (converted from whole_set.json for older sets)
         try:
-            with open(set_file) as f:
-                set_data = json.load(f)
+            layout = set_layout.load(cache_dir, set_name)
         except Exception as error:
+            layout = None
+        if layout is None:
             qd.error("No valid JSON file for " + str(set_name))
             return
 
-        items_in_set = []
-        for item in set_data:
-            item_name = item['asset_name']
-            item_version = item['version_number']
-            items_in_set.append(item_name)
-
-        # TODO: for each child, make sure that it exists in whole_set.json, or add it if it doesn't, or remove it if it does not
-        child_names = []
-        for child in children:
-            child_path = child.path()
-            name = child_path.split('/')[-1].lower()
-            child_names.append(name)
-
-        for item in set_data:
-            if str(item['asset_name']) not in child_names:
-                set_data.remove(item)
+        # Pair each child with a prop in the layout by name. Props with no child
+        # left in the set are dropped from the layout once the others are updated.
+        names = layout.asset_names()
+        delta = set_diff.diff(range(len(layout)), children,
+                              current_key=lambda index: str(names[index]),
+                              target_key=self.child_asset_name, group=None)
+        matched = dict((child.path(), index) for index, child in delta.keep)
+        print("set {0}: {1}".format(set_name, delta))
 
+        records = []
         for child in children:
             print("child: ", child)
             inside = child.node("inside")
             out = inside.node("OUT")
             set_transform = inside.node("set_dressing_transform")
-            child_path = child.path()
-            name = child_path.split('/')[-1].lower()
+            name = self.child_asset_name(child)
 
             child_body = project.get_body(name)
             if child_body is None:
                 qd.warning(str(name) + " not found in pipe. Please check that node is named correctly.")
                 continue
 
-            # get transform parms: t is translate, r rotate and s scale (with associated x,y,z vals)
-            tx, ty, tz = self.get_transform(set_transform, "tx", "ty", "tz")
-            rx, ry, rz = self.get_transform(set_transform, "rx", "ry", "rz")
-            sx, sy, sz = self.get_transform(set_transform, "sx", "sy", "sz")
-
-            latest_file, latest_version = self.body.get_latest_json_version(name)
-            if latest_version == int(9):
-                new_version = 0
-            else:
-                new_version = int(latest_version) + 1
-
-            prop_file = os.path.join(Project().get_assets_dir(), set_name, "model", "main", "cache", str(name) + "_" + str(latest_version) + ".json")
-
-            if name in items_in_set:
+            index = matched.get(child.path())
+            if index is not None:
                 print("set contains asset: " + str(name))
-                try:
-                    with open(prop_file) as f:
-                        prop_data = json.load(f)
-                except Exception as error:
-                    qd.warning("No valid JSON file for " + str(name) + ". Skipping changes made to this asset.")
-                    continue
-
-                for set_item in set_data:
-                    if str(set_item['asset_name']) == str(name):
-                        set_item['version_number'] = new_version
-                        break
+                prop_data = layout.row(index)
+                latest_version = int(prop_data["version_number"] or 0)
+                if latest_version == int(9):
+                    new_version = 0
+                else:
+                    new_version = latest_version + 1
 
             else:
                 print(str(name) + " not found in set file.")
                 path = self.get_prim_path(out)
-                prop_data = {"asset_name": name, "version_number": 0, "path" : str(path), "a" : [0, 0, 0], "b" : [0, 0, 0], "c" : [0, 0, 0] }
-                set_data.append({"asset_name": str(name), "version_number": 0})
+                index = layout.add(name, 0, str(path))
+                prop_data = layout.row(index)
                 new_version = 0
 
-            new_prop_file = os.path.join(Project().get_assets_dir(), set_name, "model", "main", "cache", str(name) + "_" + str(new_version) + ".json")
-
-            # get a b and c from prop_data file. Each is an array of size 3, representing x,y,z coords
-            a = prop_data['a']
-            b = prop_data['b']
-            c = prop_data['c']
+            records.append({
+                "child": child,
+                "name": name,
+                "index": index,
+                "out": out,
+                "set_transform": set_transform,
+                "prop_data": prop_data,
+                "new_version": new_version
+            })
 
-            self.update_points_by_geo(out, a, b, c)
+        for record in records:
+            prop_data = record["prop_data"]
 
-            # put the updated coords back into prop_data
-            prop_data['a'] = a
-            prop_data['b'] = b
-            prop_data['c'] = c
+            # get a b and c from the placed geometry. Each is an array of size 3, representing x,y,z coords
+            self.update_points_by_geo(record["out"], prop_data["a"], prop_data["b"], prop_data["c"])
 
             # TODO: add a commit and a publish for this set
 
+            prop_data["version_number"] = record["new_version"]
+            layout.update(record["index"], **prop_data)
             print("prop data (updated): ", prop_data)
 
-            updated_prop_data = json.dumps(prop_data)
-            outfile = open(new_prop_file, "w")
-            outfile.write(updated_prop_data)
-            outfile.close()
-
-            print("prop file updated for " + str(name))
-
-            self.clear_transform(set_transform)
-            self.update_version_number(child, new_version)
+        layout.remove(delta.remove)
+
+        # The old per-prop files the read_from_json HDA loads, and whole_set.json.
+        # The layout is written last, so set_layout.load never sees it older
+        # than whole_set.json and converts the set back from these files.
+        for record in records:
+            new_prop_file = set_layout.legacy_prop_file(cache_dir, record["name"], record["new_version"])
+            pipeline_io.writefile(new_prop_file, record["prop_data"], indent=None)
+            print("prop file updated for " + str(record["name"]))
+        layout.write_legacy(cache_dir, props=False)
+        layout.write(cache_dir)
+
+        for record in records:
+            child = record["child"]
+            self.clear_transform(record["set_transform"])
+            self.update_version_number(child, record["new_version"])
             import_node = child.node("import")
             read_from_json = import_node.node("read_from_json")
             read_from_json.parm("reload").pressButton()
 
-        outfile = open(set_file, "w")
-        print("set data: ", set_data)
-        updated_set_data = json.dumps(set_data)
-        outfile.write(updated_set_data)
-        outfile.close()
+        print("set data: ", layout.references())
 
         qd.info("Set " + str(set_name) + " published successfully!")
 
+    def child_asset_name(self, child):
+        return child.path().split('/')[-1].lower()
+
     def update_version_number(self, child, version_number):
         version_parm = child.parm("version_number").evalAsInt()
         child.parm("version_number").set(version_number)
@@ -222,14 +212,20 @@ class Publisher:
         return x, y, z
 
     def clear_transform(self, child):
-        parm_scale_list = ["sx", "sy", "sz"]
-        parm_list = ["tx", "ty", "tz", "rx", "ry", "rz", "sx", "sy", "sz"]
+        parm_scale_list = ["sx", "sy", "sz", "scale"]
+        parm_order_list = ["xOrd", "rOrd"]
+        # Every parm read_transform_parms reads, so nothing is left to apply twice
+        parm_list = ["tx", "ty", "tz", "rx", "ry", "rz", "sx", "sy", "sz", "scale", "px", "py", "pz", "xOrd", "rOrd"]
 
         for parm in parm_list:
-            if parm not in parm_scale_list:
-                child.parm(parm).set(0.0)
-            else:
+            if child.parm(parm) is None:
+                continue
+            if parm in parm_scale_list:
                 child.parm(parm).set(1.0)
+            elif parm in parm_order_list:
+                child.parm(parm).set(0)
+            else:
+                child.parm(parm).set(0.0)
             child.parm(parm).eval()
 
     def publish_shot(self):
@@ -378,6 +374,7 @@ class Publisher:
             hou.hda.installFile(dst)
             definition = hou.hdaDefinition(node.type().category(), node.type().name(), dst)
             definition.setPreferred(True)
+            hda_resolver.get_resolver().note_installed(dst)
 
         else:
             qd.error('File does not exist', details=src)
@@ -1,16 +1,141 @@
-import *  # Something
+import hou
+import pipe.gui.quick_dialogs as qd
+import pipe.gui.select_from_list as sfl
+
+from pipe.tools.houtools.utils.utils import *
+from pipe.tools.houtools.utils import hda_resolver
+
+from pipe.am.project import Project
+from pipe.am.environment import Department
+from pipe.am.environment import Environment
 
 
 class Rollback:
 
+    # How many of the latest publishes are offered to roll back to
+    HISTORY_LENGTH = 100
+
     def __init__(self):
-        pass
+        self.item_gui = None
+        self.node = None
+        self.element = None
+        self.versions = {}
+        self.on_rollback = None
+        environment = Environment()
+        self.user = environment.get_user()
 
+    '''
+        Roll back the content HDA (asset_department) of the given node, or of the selected node
+    '''
     def rollback_asset(self, node=None):
-        pass
+        node = self.get_node(node)
+        if node is None:
+            return
+
+        node_name = node.type().name()
+        index = node_name.rfind('_')
+        asset_name = node_name[:index]
+        department = node_name[index+1:]
+
+        body = Project().get_body(asset_name)
+        if body is None or not body.is_asset():
+            qd.error('The selected node is not an asset in the pipe.')
+            return
+
+        self.node = node
+        self.on_rollback = self.install_hda
+        self.select_version(body, department, asset_name + " " + department)
 
     def rollback_tool(self, node=None):
-        pass
+        node = self.get_node(node)
+        if node is None:
+            return
+
+        tool_name = node.path().split('/')[-1].lower()
+        body = Project().get_tool(tool_name)
+        if body is None:
+            qd.error('The selected node is not a tool in the pipe.')
+            return
+
+        self.node = node
+        self.on_rollback = self.install_hda
+        self.select_version(body, Department.HDA, tool_name)
 
     def rollback_shot(self):
-        pass
+        shot_list = Project().list_shots()
+        self.item_gui = sfl.SelectFromList(l=shot_list, parent=houdini_main_window(), title="Select a shot to roll back")
+        self.item_gui.submitted.connect(self.shot_results)
+
+    def shot_results(self, value):
+        shot_name = value[0]
+        body = Project().get_body(shot_name)
+
+        self.on_rollback = self.open_hip
+        self.select_version(body, Department.LIGHTING, shot_name)
+
+    def get_node(self, node):
+        if node is not None:
+            return node
+
+        nodes = hou.selectedNodes()
+        if len(nodes) == 1:
+            return nodes[0]
+        elif len(nodes) > 1:
+            qd.error('Too many nodes selected. Please select only one node.')
+        else:
+            qd.error('No nodes selected. Please select a node.')
+        return None
+
+    '''
+        Let the user pick one of the latest publishes of the body's element in the
+        department, newest first. The current version and versions whose files
+        were pruned aren't offered.
+    '''
+    def select_version(self, body, department, name):
+        try:
+            element = body.get_element(department)
+        except EnvironmentError, e:
+            qd.error('Nothing has been published for ' + name + '.', details=str(e))
+            return
+        self.element = element
+
+        targets = element.list_rollback_targets(self.HISTORY_LENGTH)
+        self.versions = dict((label, version) for version, label in targets)
+        labels = [label for version, label in targets]
+
+        if not labels:
+            qd.error('There are no older versions of ' + name + ' to roll back to.')
+            return
+
+        self.item_gui = sfl.SelectFromList(l=labels, parent=houdini_main_window(), title="Select a version of " + name + " to roll back to")
+        self.item_gui.submitted.connect(self.version_results)
+
+    def version_results(self, value):
+        version = self.versions.get(value[0])
+        if version is None:
+            return
+
+        try:
+            dst = self.element.rollback(version, self.user.get_username())
+        except EnvironmentError, e:
+            qd.error('Could not roll back ' + self.element.get_long_name() + '.', details=str(e))
+            return
+
+        if self.on_rollback is not None:
+            self.on_rollback(dst)
+        qd.message('Rolled back ' + self.element.get_long_name() + ' to version ' + str(version) + '.')
+
+    def install_hda(self, dst):
+        hou.hda.installFile(dst)
+        definition = hou.hdaDefinition(self.node.type().category(), self.node.type().name(), dst)
+        if definition is not None:
+            definition.setPreferred(True)
+        hda_resolver.get_resolver().note_installed(dst)
+        try:
+            self.node.matchCurrentDefinition()
+        except hou.OperationFailed, e:
+            print(str(e))
+
+    def open_hip(self, dst):
+        if qd.yes_or_no('Open the rolled back scene now? Unsaved changes will be lost.'):
+            hou.hipFile.load(dst)
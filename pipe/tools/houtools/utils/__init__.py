@@ -1,2 +1,2 @@
 
-__all__ = ['reload_scripts', 'utils', 'create_tool_hda']
+__all__ = ['reload_scripts', 'utils', 'create_tool_hda', 'transforms', 'hda_resolver']
@@ -0,0 +1,203 @@
+'''
+    Resolves published content HDAs (asset_name, department) to the file the
+    production/hda (or production/otls) symlink points to, and installs each
+    definition into the Houdini session at most once. Results are cached for
+    the session and checked against the symlink target's mtime, so a publish
+    from another session is still picked up.
+'''
+import hou
+import os
+import threading
+
+from pipe.am.environment import Department, Environment
+from pipe.am import resolution
+
+# Departments whose content HDAs are OBJ level nodes. The rest are SOPs.
+OBJ_DEPARTMENTS = [Department.HAIR, Department.CLOTH]
+
+TEMPLATE_HDAS = {
+    Department.MATERIAL: "dcc_material",
+    Department.MODIFY: "dcc_modify",
+    Department.HAIR: "dcc_hair",
+    Department.CLOTH: "dcc_cloth"
+}
+
+_template_definitions = None
+_template_lock = threading.Lock()
+
+def node_type_category(department):
+    return hou.objNodeTypeCategory() if department in OBJ_DEPARTMENTS else hou.sopNodeTypeCategory()
+
+'''
+    The template HDA definitions the Assembler copies new content HDAs from.
+    They are created once per session.
+'''
+def template_definitions():
+    global _template_definitions
+    with _template_lock:
+        if _template_definitions is None:
+            otl_dir = Environment().get_otl_dir()
+            _template_definitions = {}
+            for department, type_name in TEMPLATE_HDAS.items():
+                _template_definitions[department] = hou.hdaDefinition(node_type_category(department), type_name, os.path.join(otl_dir, type_name + ".hda"))
+        return _template_definitions
+
+
+class HDAResolution:
+
+    def __init__(self, asset_name, department, link, path, mtime, version):
+        self.asset_name = asset_name
+        self.department = department
+        self.hda_name = asset_name + "_" + department
+        self.link = link
+        self.path = path
+        self.mtime = mtime
+        self.version = version
+        self.definition = None
+
+    def __repr__(self):
+        return "HDAResolution({0}, {1}, v{2})".format(self.hda_name, self.path, self.version)
+
+
+class HDAResolver:
+
+    def __init__(self):
+        self._entries = {}
+        self._missing = {}
+        self._installed = {}
+        self._lock = threading.RLock()
+        self._search_dirs = None
+        self.hits = 0
+        self.misses = 0
+        self.installs = 0
+
+    '''
+        Where published content HDAs are linked from, newest layout first
+    '''
+    def search_dirs(self):
+        if self._search_dirs is None:
+            project_dir = resolution.get_project().get_project_dir()
+            self._search_dirs = [os.path.join(project_dir, "production", "hda"), os.path.join(project_dir, "production", "otls")]
+        return self._search_dirs
+
+    '''
+        Return the HDAResolution for a published content HDA, or None if it
+        hasn't been published.
+    '''
+    def resolve(self, asset_name, department):
+        key = (asset_name, department)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._still_valid(entry):
+                self.hits += 1
+                return entry
+
+            # Not published last time we looked. Only look again if a link was added since.
+            missing = self._missing.get(key)
+            if entry is None and missing is not None and missing == self._dir_mtimes():
+                self.hits += 1
+                return None
+
+            self.misses += 1
+            entry = self._lookup(asset_name, department)
+            if entry is None:
+                self._entries.pop(key, None)
+                self._missing[key] = self._dir_mtimes()
+            else:
+                self._entries[key] = entry
+                self._missing.pop(key, None)
+            return entry
+
+    '''
+        Make sure the published definition is installed and preferred.
+        Returns the hou.HDADefinition, or None if it hasn't been published.
+    '''
+    def install(self, asset_name, department):
+        with self._lock:
+            entry = self.resolve(asset_name, department)
+            if entry is None:
+                return None
+
+            if self._installed.get(entry.path) != entry.mtime:
+                hou.hda.installFile(entry.path)
+                self._installed[entry.path] = entry.mtime
+                self.installs += 1
+                entry.definition = None
+
+            if entry.definition is None:
+                definition = hou.hdaDefinition(node_type_category(department), entry.hda_name, entry.path)
+                if definition is None:
+                    return None
+                definition.setPreferred(True)
+                entry.definition = definition
+            return entry.definition
+
+    '''
+        Tell the resolver a file was just installed by someone else (e.g. the
+        publisher), so it isn't installed again.
+    '''
+    def note_installed(self, path):
+        with self._lock:
+            try:
+                self._installed[os.path.realpath(path)] = os.stat(path).st_mtime
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._missing.clear()
+            self._installed.clear()
+            self._search_dirs = None
+
+    def _lookup(self, asset_name, department):
+        hda_file = asset_name + "_" + department + "_main.hdanc"
+        for search_dir in self.search_dirs():
+            link = os.path.join(search_dir, hda_file)
+            if not os.path.islink(link):
+                continue
+            try:
+                path = self._link_target(link)
+                mtime = os.stat(link).st_mtime
+            except OSError:
+                continue
+            return HDAResolution(asset_name, department, link, path, mtime, self._version(asset_name, department))
+        return None
+
+    def _still_valid(self, entry):
+        try:
+            return self._link_target(entry.link) == entry.path and os.stat(entry.link).st_mtime == entry.mtime
+        except OSError:
+            return False
+
+    def _link_target(self, link):
+        target = os.readlink(link)
+        if not os.path.isabs(target):
+            target = os.path.join(os.path.dirname(link), target)
+        return os.path.realpath(target)
+
+    def _dir_mtimes(self):
+        mtimes = []
+        for search_dir in self.search_dirs():
+            try:
+                mtimes.append(os.stat(search_dir).st_mtime)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def _version(self, asset_name, department):
+        try:
+            return resolution.get_element(asset_name, department).get_latest_version()
+        except (EnvironmentError, AttributeError):
+            return None
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+def get_resolver():
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = HDAResolver()
+        return _resolver
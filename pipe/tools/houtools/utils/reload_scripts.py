@@ -6,6 +6,7 @@ from pipe.tools.houtools.importer import importer as hou_importer
 from pipe.tools.houtools.publisher import publisher as hou_publisher
 from pipe.tools.houtools.cloner import cloner as hou_cloner
 import pipe.gui.quick_dialogs as qd
+from pipe.tools.tool import get_registry
 
 
 class ReloadScripts:
@@ -19,3 +20,6 @@ class ReloadScripts:
         reload(hou_publisher)
         reload(hou_importer)
         reload(qd)
+
+        # Cached tool callables point at the old modules
+        get_registry().clear()
@@ -0,0 +1,159 @@
+'''
+    Batch transform math for set dressing. Builds translate/rotate/scale
+    matrices for N props at once as (N,4,4) arrays and applies them to all
+    of their anchor points in one call. This module must not import hou so
+    it can be tested and timed outside of Houdini.
+
+    Matrices act on column vectors, so composing "srt" gives T * R * S.
+    Angles are in degrees. Orders use the names (and menu order) of the
+    Houdini transform SOP's xOrd and rOrd parms.
+'''
+import numpy as np
+
+TRANSFORM_ORDERS = ("srt", "str", "rst", "rts", "tsr", "trs")
+ROTATE_ORDERS = ("xyz", "xzy", "yxz", "yzx", "zxy", "zyx")
+
+def _vectors(values, default, count=None):
+    '''
+        return values as an (N,3) float array. A single vector is repeated
+        for every prop, None gives the default.
+    '''
+    if values is None:
+        values = default
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values.reshape(1, 3)
+    if values.ndim != 2 or values.shape[1] != 3:
+        raise ValueError("expected (N,3) values, got shape {0}".format(values.shape))
+    if count is not None and values.shape[0] != count:
+        if values.shape[0] != 1:
+            raise ValueError("expected {0} vectors, got {1}".format(count, values.shape[0]))
+        values = np.repeat(values, count, axis=0)
+    return values
+
+def _identities(count):
+    return np.tile(np.eye(4), (count, 1, 1))
+
+def translate_matrices(translate):
+    translate = _vectors(translate, (0, 0, 0))
+    m = _identities(len(translate))
+    m[:, :3, 3] = translate
+    return m
+
+def scale_matrices(scale):
+    scale = _vectors(scale, (1, 1, 1))
+    m = _identities(len(scale))
+    m[:, 0, 0] = scale[:, 0]
+    m[:, 1, 1] = scale[:, 1]
+    m[:, 2, 2] = scale[:, 2]
+    return m
+
+def axis_rotation_matrices(angles, axis):
+    '''
+        return (N,4,4) rotations about a single axis ("x", "y" or "z")
+    '''
+    radians = np.radians(np.asarray(angles, dtype=np.float64).reshape(-1))
+    cos = np.cos(radians)
+    sin = np.sin(radians)
+
+    # The two axes that rotate into each other, in right handed order
+    i, j = {"x": (1, 2), "y": (2, 0), "z": (0, 1)}[axis]
+    m = _identities(len(radians))
+    m[:, i, i] = cos
+    m[:, i, j] = -sin
+    m[:, j, i] = sin
+    m[:, j, j] = cos
+    return m
+
+def rotate_matrices(rotate, rotate_order="xyz"):
+    '''
+        return (N,4,4) rotations. The order names the axis applied first,
+        so "xyz" gives Rz * Ry * Rx.
+    '''
+    if rotate_order not in ROTATE_ORDERS:
+        raise ValueError("unknown rotate order " + str(rotate_order))
+    rotate = _vectors(rotate, (0, 0, 0))
+
+    m = _identities(len(rotate))
+    for axis in rotate_order:
+        r = axis_rotation_matrices(rotate[:, "xyz".index(axis)], axis)
+        m = np.matmul(r, m)
+    return m
+
+def compose_transforms(translate=None, rotate=None, scale=None, pivot=None,
+                       rotate_order="xyz", transform_order="srt", count=None):
+    '''
+        return (N,4,4) matrices for N props. Each argument is an (N,3) array
+        or a single vector shared by every prop. The orders are either one
+        name for every prop or a list with one name per prop. The pivot is
+        applied around the scale and rotation like the transform SOP does.
+    '''
+    if count is None:
+        count = max([len(_vectors(v, (0, 0, 0))) for v in (translate, rotate, scale, pivot)])
+    translate = _vectors(translate, (0, 0, 0), count)
+    rotate = _vectors(rotate, (0, 0, 0), count)
+    scale = _vectors(scale, (1, 1, 1), count)
+    pivot = _vectors(pivot, (0, 0, 0), count)
+
+    if isinstance(rotate_order, (list, tuple)) or isinstance(transform_order, (list, tuple)):
+        rotate_orders = _per_prop(rotate_order, count)
+        transform_orders = _per_prop(transform_order, count)
+
+        # Compose each group of props that share their orders together
+        m = np.empty((count, 4, 4))
+        for orders in set(zip(rotate_orders, transform_orders)):
+            rows = np.array([i for i in range(count) if (rotate_orders[i], transform_orders[i]) == orders])
+            m[rows] = compose_transforms(translate[rows], rotate[rows], scale[rows], pivot[rows],
+                                         orders[0], orders[1], len(rows))
+        return m
+
+    if transform_order not in TRANSFORM_ORDERS:
+        raise ValueError("unknown transform order " + str(transform_order))
+    parts = {
+        "t": translate_matrices(translate),
+        "r": rotate_matrices(rotate, rotate_order),
+        "s": scale_matrices(scale)
+    }
+
+    has_pivot = pivot.any()
+    m = _identities(count)
+    for part in transform_order:
+        if has_pivot and part != "t":
+            m = np.matmul(translate_matrices(-pivot), m)
+            m = np.matmul(parts[part], m)
+            m = np.matmul(translate_matrices(pivot), m)
+        else:
+            m = np.matmul(parts[part], m)
+    return m
+
+def _per_prop(order, count):
+    if isinstance(order, (list, tuple)):
+        if len(order) != count:
+            raise ValueError("expected {0} orders, got {1}".format(count, len(order)))
+        return list(order)
+    return [order] * count
+
+def apply_transforms(matrices, points):
+    '''
+        return the points moved by their prop's matrix. points is (N,K,3)
+        for K points per prop, or (K,3) to move the same points by every
+        matrix. The result is (N,K,3).
+    '''
+    matrices = np.asarray(matrices, dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64)
+    if matrices.ndim == 2:
+        matrices = matrices[np.newaxis]
+    if points.ndim == 2:
+        points = np.broadcast_to(points, (len(matrices),) + points.shape)
+
+    moved = np.einsum("nij,nkj->nki", matrices[:, :3, :3], points)
+    return moved + matrices[:, np.newaxis, :3, 3]
+
+def transform_points(points, **kwargs):
+    '''
+        compose the transforms described by kwargs (see compose_transforms)
+        and apply them to points in one go
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    count = len(points) if points.ndim == 3 else None
+    return apply_transforms(compose_transforms(count=count, **kwargs), points)
@@ -2,6 +2,8 @@ import hou
 import numpy as np
 import math
 
+from pipe.tools.houtools.utils import transforms
+
 def houdini_main_window():
     return hou.ui.mainQtWindow()
 
@@ -16,66 +18,38 @@ def convert_to_matrix(x, y, z):
                         [1]])
 
 
+# The per-point helpers below are kept for old callers. To move many props
+# at once use compose_transforms/apply_transforms from transforms.py.
 def do_translate_matrix(x, y, z, point):
-    t = np.matrix([  [1,0,0,x],
-                        [0,1,0,y],
-                        [0,0,1,z],
-                        [0,0,0,1]])
-
-    r = np.matmul(t, point)
-
-    return r
+    return np.matmul(transforms.translate_matrices([x, y, z])[0], point)
 
 def do_rotate_matrix(x, y, z, point):
-    x_rad = x * math.pi/180
-    y_rad = y * math.pi/180
-    z_rad = z * math.pi/180
-
-    cos_x = math.cos(x_rad)
-    cos_y = math.cos(y_rad)
-    cos_z = math.cos(z_rad)
-
-    sin_x = math.sin(x_rad)
-    sin_y = math.sin(y_rad)
-    sin_z = math.sin(z_rad)
-
-    print("sin x y z: ", sin_x, sin_y, sin_z)
-    print("cos x y z: ", cos_x, cos_y, cos_z)
-
-    rx = np.matrix([    [1,0,0,0],
-                        [0,cos_x,-sin_x,0],
-                        [0,sin_x,cos_x,0],
-                        [0,0,0,1]])
-
-    ry = np.matrix([    [cos_y,0,sin_y,0],
-                        [0,1,0,0],
-                        [-sin_y,0,cos_y,0],
-                        [0,0,0,1]])
-
-    rz = np.matrix([    [cos_z,-sin_z,0,0],
-                        [sin_z,cos_z,0,0],
-                        [0,0,1,0],
-                        [0,0,0,1]])
-
-    print("rx: ", rx)
-    print("ry: ", ry)
-    print("rz: ", rz)
-
-    r = np.matmul(rx, point)
-    print("r and point: ", r)
-    r = np.matmul(ry, r)
-    print("ry and r: ", r)
-    r = np.matmul(rz, r)
-    print("rz and r: ", r)
-
-    return r
+    return np.matmul(transforms.rotate_matrices([x, y, z], "xyz")[0], point)
 
 def do_scale_matrix(x, y, z, point):
-    s = np.matrix([  [x,0,0,0],
-                        [0,y,0,0],
-                        [0,0,z,0],
-                        [0,0,0,1]])
-
-    r = np.matmul(s, point)
-
-    return r
+    return np.matmul(transforms.scale_matrices([x, y, z])[0], point)
+
+def read_transform_parms(nodes):
+    '''
+        Read the transform parms off a list of transform SOPs as keyword
+        arguments for transforms.compose_transforms, one row per node.
+    '''
+    def value(node, name, default):
+        parm = node.parm(name)
+        return default if parm is None else parm.eval()
+
+    def vectors(names, default):
+        return [[value(node, name, default) for name in names] for node in nodes]
+
+    scale = vectors(("sx", "sy", "sz"), 1.0)
+    uniform = [value(node, "scale", 1.0) for node in nodes]
+    kwargs = {
+        "translate": vectors(("tx", "ty", "tz"), 0.0),
+        "rotate": vectors(("rx", "ry", "rz"), 0.0),
+        "scale": [[s * u for s in xyz] for xyz, u in zip(scale, uniform)],
+        "pivot": vectors(("px", "py", "pz"), 0.0)
+    }
+
+    kwargs["transform_order"] = [transforms.TRANSFORM_ORDERS[value(node, "xOrd", 0)] for node in nodes]
+    kwargs["rotate_order"] = [transforms.ROTATE_ORDERS[value(node, "rOrd", 0)] for node in nodes]
+    return kwargs
@@ -11,7 +11,6 @@ except ImportError:
 
 from app import *
 from resources import *
-from pipelion.lion_mng.logger import Logger
 from window import *
 from resources import *
 import viewmodel as ViewModel
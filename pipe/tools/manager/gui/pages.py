@@ -48,6 +48,8 @@ class DashboardPage(PageWidget):
     def __init__(self):
         super(DashboardPage, self).__init__(Strings.dashboard)
         ViewModel.signals.updateProduction.connect(self.updateData)
+        ViewModel.signals.updateCheckedOutTable.connect(self.updateData)
+        ViewModel.signals.updateDirectorySize.connect(self.updateSize)
         self.setLayout(self.layoutPage())
 
     def layoutPage(self):
@@ -83,6 +85,18 @@ class DashboardPage(PageWidget):
         #self.tableStack.addWidget(table)
         self.update()
 
+    @Slot(str, str)
+    def updateSize(self, path, size):
+        # Rows can be sorted, so find the row by its path instead of its position
+        sizeColumn = len(self.table.model.headers) - 1
+        for row in range(self.table.rowCount()):
+            item = self.table.item(row, 0)
+            if item is not None and item.text() == path:
+                self.table.item(row, sizeColumn).setText(size)
+        for i, entry in enumerate(self.table.model.entries):
+            if entry[0] == path:
+                self.table.model.entries[i] = entry[:sizeColumn] + (size,)
+
 
 
 class SettingsPage(PageWidget):
@@ -110,6 +124,7 @@ class BodyOverviewPage(PageWidget):
         self.bodyType = bodyType
         super(BodyOverviewPage, self).__init__(self.bodyType[1])
         ViewModel.signals.updateProduction.connect(self.updateData)
+        ViewModel.signals.updateOverviewTable.connect(self.updateOverview)
         self.cbc = CreateBodyController(self.bodyType)
         self.setLayout(self.layoutPage())
 
@@ -151,6 +166,11 @@ class BodyOverviewPage(PageWidget):
         #self.tableStack.addWidget(table)
         self.update()
 
+    @Slot(tuple)
+    def updateOverview(self, bodyType):
+        if bodyType[0] == self.bodyType[0]:
+            self.updateData("")
+
 
 class DepartmentPage(PageWidget):
     def __init__(self, department):
@@ -59,6 +59,8 @@ class Strings():
     type = "Type"
     departments = "Departments"
     size = "Size"
+    calculating = "Calculating..."
+    unknown = "Unknown"
 
 class Styles():
     openButton = '''
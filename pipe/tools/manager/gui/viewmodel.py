@@ -1,6 +1,5 @@
 import sys
 import os
-import threading
 import traceback
 
 try:
@@ -11,8 +10,12 @@ except ImportError:
     from PySide2.QtCore import Qt, Slot, Signal, QObject
 
 from tables import *
+from pipe.am.cache_sync import format_size
+from pipe.am.catalog import get_catalog
+from pipe.am.change_feed import ChangeFeed
+from pipe.am.disk_usage import get_disk_usage
+from pipe.am.environment import Environment
 import pipelion.lion_mng.reader as Reader
-from pipelion.lion_mng.logger import Logger
 from resources import *
 from dialogs import *
 
@@ -21,26 +24,91 @@ class ViewModelSignals(QObject):
     updateDepartment = Signal(str)
     updateBody = Signal(str)
     updateCheckedOutBodies = Signal(dict)
+    updateDirectorySize = Signal(str, str)
     updateOverviewBodies = Signal(tuple, dict)
+    updateCheckedOutTable = Signal(str)
+    updateOverviewTable = Signal(tuple)
+    productionChanged = Signal(object)
     changePage = Signal(int, list)
 
 this = sys.modules[__name__]
 
 def initialize():
     this.signals = ViewModelSignals()
+    this.diskUsage = get_disk_usage()
+    this.catalog = get_catalog()
 
-    this.loggerEvent = threading.Event()
-    this.logger = Logger(this.loggerEvent)
-    this.logger.start()
-    this.logger.productionUpdate.connect(this.productionUpdate, Qt.QueuedConnection)
-    #QtGui.QGuiApplication.lastWindowClosed.connect(this.endLoggerThread)
+    environment = Environment()
+    this.usersDir = os.path.normpath(environment.get_users_dir())
+    this.assetsDir = os.path.normpath(environment.get_assets_dir())
     this.userBodies = Reader.getBodiesByUser()
     this.allBodies = Reader.getBodies()
 
-@Slot()
-def endLoggerThread():
-    this.loggerEvent.set()
+    # The feed calls back on its own thread, the signal queues the batch to the GUI thread
+    this.signals.productionChanged.connect(this.applyChanges, Qt.QueuedConnection)
+    this.changeFeed = ChangeFeed([this.assetsDir, this.usersDir])
+    this.changeFeed.subscribe(this.signals.productionChanged.emit)
+    this.changeFeed.start()
+    #QtGui.QGuiApplication.lastWindowClosed.connect(this.stopChangeFeed)
 
+@Slot()
+def stopChangeFeed():
+    this.changeFeed.stop()
+
+@Slot(object)
+def applyChanges(events):
+    '''
+    Update only what a batch of change events touched. Changes inside a body that
+    is already listed only refresh that body's size or its type's overview table,
+    the body lists are read again only when a body was added or removed.
+    '''
+    for event in events:
+        this.diskUsage.invalidate(event.path)
+        this.catalog.invalidate(event.path)
+
+    userEvents = [event for event in events if event.is_under(this.usersDir)]
+    if userEvents:
+        changed = bodiesChanged(this.userBodies, userEvents)
+        if changed is None:
+            this.userBodies = Reader.getBodiesByUser()
+            this.signals.updateCheckedOutBodies.emit(this.getCheckedOutBodies())
+            this.signals.updateCheckedOutTable.emit("")
+        else:
+            for body in changed:
+                this.diskUsage.request(body.path, directorySizeComputed)
+
+    assetEvents = [event for event in events if event.is_under(this.assetsDir)]
+    if assetEvents:
+        changed = bodiesChanged(this.allBodies, assetEvents)
+        if changed is None:
+            this.allBodies = Reader.getBodies()
+            changedTypes = None
+        else:
+            changedTypes = set(body.type[0] for body in changed)
+        for bodyType in PipelionResources.bodyTypes():
+            if changedTypes is None or bodyType[0] in changedTypes:
+                this.signals.updateOverviewBodies.emit(bodyType, this.getOverviewBodies(bodyType))
+                this.signals.updateOverviewTable.emit(bodyType)
+
+def bodiesChanged(bodies, events):
+    '''
+    return the bodies the events happened in, or None if any event happened outside
+    of all of them (a body was added or removed)
+    '''
+    changed = []
+    for event in events:
+        owner = None
+        for body in bodies:
+            if event.is_under(body.path):
+                owner = body
+                break
+        if owner is None:
+            return None
+        if owner not in changed:
+            changed.append(owner)
+    return changed
+
+# Reads everything again, for when the whole production needs a refresh
 @Slot(str)
 def productionUpdate(update):
     print("Production update in viewmodel: " + update)
@@ -91,13 +159,15 @@ def bodyOverViewButtons(bodyType):
     buttons.append(TableData.buttonEntry(Strings.delete, Styles().deleteButton, Styles().disabledButton, TableData.ButtonRoles.Delete, controller, controller.showDeleteBodyDialog))
     return buttons
 
+# Sizes are computed in the background, the table shows the last known size (or
+# a placeholder) and gets updateDirectorySize signals as the new sizes come in
 def checkedOutTable():
     entries = []
     for body in this.userBodies:
         departments = ", ".join(elem.dept for elem in body.getDepartments())
-        entry = (body.path, body.type[1], departments, body.getDirectorySize())
-        print(entry)
+        entry = (body.path, body.type[1], departments, directorySizeLabel(body.path))
         entries.append(entry)
+        this.diskUsage.request(body.path, directorySizeComputed)
     headers = []
     headers.append(TableData.labelHeader(Strings.path, resizeMode=QtWidgets.QHeaderView.Interactive))
     headers.append(TableData.labelHeader(Strings.type, resizeMode=QtWidgets.QHeaderView.ResizeToContents))
@@ -105,6 +175,16 @@ def checkedOutTable():
     headers.append(TableData.labelHeader(Strings.size, resizeMode=QtWidgets.QHeaderView.ResizeToContents))
     return entries, headers
 
+def directorySizeLabel(path):
+    size = this.diskUsage.cached_size(path)
+    if size is None:
+        return Strings.calculating
+    return format_size(size)
+
+# Called on a disk usage worker thread, the signal is queued to the GUI thread
+def directorySizeComputed(path, size):
+    this.signals.updateDirectorySize.emit(path, format_size(size) if size is not None else Strings.unknown)
+
 def bodyOverviewTable(bodyType):
     bodies = [body for body in this.allBodies if body.type[0] == bodyType[0]]
     entries = []
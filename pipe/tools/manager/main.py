@@ -6,87 +6,19 @@ except ImportError:
 	from PySide import QtCore
 
 import datetime
-import operator
-import os
+import itertools
+import threading
+from multiprocessing.pool import ThreadPool
 
-from pipe.am.body import AssetType, Asset, Shot
+from pipe.am.body import AssetType
+from pipe.am.catalog import get_catalog
 from pipe.am.environment import Department, Status
-from pipe.am.project import Project
 
 from byugui import request_email
 
 REF_WINDOW_WIDTH = 1080
 REF_WINDOW_HEIGHT = 650
 
-class TreeComboBoxItem(QtWidgets.QComboBox):
-
-	def __init__(self, tree_item, column):
-		QtWidgets.QComboBox.__init__(self)
-		self.setFocusPolicy(QtCore.Qt.StrongFocus)
-		self.tree_item = tree_item
-		self.column = column
-		self.currentIndexChanged.connect(self._change_item)
-
-	def _change_item(self, index):
-		self.tree_item.setText(self.column, self.itemText(index))
-
-	def wheelEvent(self, e):
-		e.ignore() # do nothing
-
-	def paintEvent(self, pe):
-		painter = QtGui.QPainter()
-		painter.begin(self)
-		pen = QtGui.QPen(QtCore.Qt.black)
-		pen.setWidth(1)
-		pen.setColor
-		painter.setPen(pen)
-		painter.drawRect(pe.rect())
-		painter.end()
-
-		QtWidgets.QComboBox.paintEvent(self, pe)
-
-class TreeLineEdit(QtWidgets.QLineEdit):
-
-	def __init__(self, contents, tree_item, column):
-		QtWidgets.QLineEdit.__init__(self, contents)
-		self.tree_item = tree_item
-		self.column = column
-		self.editingFinished.connect(self._change_item)
-
-	def _change_item(self):
-		self.tree_item.setText(self.column, self.text())
-
-	def paintEvent(self, pe):
-		painter = QtGui.QPainter()
-		painter.begin(self)
-		pen = QtGui.QPen(QtCore.Qt.black)
-		pen.setWidth(1)
-		pen.setColor
-		painter.setPen(pen)
-		painter.drawRect(pe.rect())
-		painter.end()
-
-		QtWidgets.QLineEdit.paintEvent(self, pe)
-
-class TreeLabel(QtWidgets.QLabel):
-
-	def __init__(self, text=""):
-		QtWidgets.QLabel.__init__(self, text)
-		self.setAutoFillBackground(True)
-
-	def paintEvent(self, pe):
-		painter = QtGui.QPainter()
-		painter.begin(self)
-		painter.setBrush(self.palette().color(QtGui.QPalette.AlternateBase))
-		pen = QtGui.QPen(QtCore.Qt.black)
-		pen.setWidth(1)
-		pen.setColor
-		painter.setPen(pen)
-		painter.drawRect(pe.rect())
-		painter.end()
-
-		QtWidgets.QLabel.paintEvent(self, pe)
-
 class TreeGridDelegate(QtWidgets.QStyledItemDelegate):
 
 	def paint(self, painter, option, index):
@@ -99,80 +31,467 @@ class TreeGridDelegate(QtWidgets.QStyledItemDelegate):
 		QtWidgets.QStyledItemDelegate.paint(self, painter, option, index)
 
 
-class TreeDateEdit(QtWidgets.QWidget):
+class BodyItemDelegate(TreeGridDelegate):
+	'''
+	Creates an editor for a cell only while it is being edited, instead of keeping
+	a widget alive in every cell of the tree
+	'''
+
+	DATE_FORMAT = 'yyyy-MM-dd'
+
+	def __init__(self, user_completer, parent=None):
+		TreeGridDelegate.__init__(self, parent)
+		self.user_completer = user_completer
+
+	def createEditor(self, parent, option, index):
+		model = index.model()
+		column = index.column()
+		if model.is_body(index):
+			if column == BodyTreeModel.TYPE_COLUMN:
+				return self._combobox(parent, AssetType.ALL)
+		elif column == BodyTreeModel.USER_COLUMN:
+			editor = QtWidgets.QLineEdit(parent)
+			editor.setCompleter(self.user_completer)
+			return editor
+		elif column == BodyTreeModel.STATUS_COLUMN:
+			return self._combobox(parent, Status.ALL)
+		elif column in (BodyTreeModel.START_COLUMN, BodyTreeModel.END_COLUMN):
+			editor = QtWidgets.QDateEdit(parent)
+			editor.setCalendarPopup(True)
+			editor.setDisplayFormat(self.DATE_FORMAT)
+			return editor
+		return TreeGridDelegate.createEditor(self, parent, option, index)
+
+	def setEditorData(self, editor, index):
+		value = index.data(QtCore.Qt.EditRole) or ''
+		if isinstance(editor, QtWidgets.QComboBox):
+			editor.setCurrentIndex(max(0, editor.findText(value)))
+		elif isinstance(editor, QtWidgets.QDateEdit):
+			date = QtCore.QDate.fromString(value, self.DATE_FORMAT)
+			editor.setDate(date if date.isValid() else QtCore.QDate.currentDate())
+		else:
+			TreeGridDelegate.setEditorData(self, editor, index)
 
-	def __init__(self, date, tree_item, column, parent=None, type='end'):
-		QtWidgets.QDateEdit.__init__(self, parent)
+	def setModelData(self, editor, model, index):
+		if isinstance(editor, QtWidgets.QComboBox):
+			model.setData(index, editor.currentText())
+		elif isinstance(editor, QtWidgets.QDateEdit):
+			model.setData(index, editor.date().toString(self.DATE_FORMAT))
+		else:
+			TreeGridDelegate.setModelData(self, editor, model, index)
 
-		self.tree_item = tree_item
-		self.column = column
+	def _combobox(self, parent, items):
+		combobox = QtWidgets.QComboBox(parent)
+		combobox.addItems(items)
+		return combobox
 
-		self.min_date = QtCore.QDate(2016,1,1)
-		self.max_date = QtCore.QDate(2016,12,31)
-		self.today = QtCore.QDate.currentDate()
-		self.date_format = 'yyyy-MM-dd'
-		self.date = date
 
-		self.dateedit = TreeDateLineEdit(self)
-		self.dateedit.setCalendarPopup(True)
-		self.dateedit.setDisplayFormat(self.date_format)
-		self.dateedit.setMinimumDate(self.min_date)
-		self.dateedit.setMaximumDate(self.max_date)
+class _LoadRequest:
 
-		self.empty = DateLineEdit(date, self)
+	def __init__(self, number, body_name, departments):
+		self.number = number
+		self.body_name = body_name
+		self.departments = departments
+		self._cancelled = threading.Event()
 
-		self.layout = QtWidgets.QVBoxLayout(parent)
-		self.layout.addWidget(self.empty)
-		self.layout.addWidget(self.dateedit)
+	def cancel(self):
+		self._cancelled.set()
 
-		if date!="":
-			self.dateedit.setDate(QtCore.QDate.fromString(date, self.date_format))
-			self.empty.setVisible(False)
-			self.dateedit.setVisible(True)
-		else:
-			self.dateedit.setDate(self.today)
-			self.empty.setVisible(True)
-			self.dateedit.setVisible(False)
+	def cancelled(self):
+		return self._cancelled.is_set()
 
-		self.setLayout(self.layout)
-		self.empty.clicked.connect(self._show_date)
-		self.dateedit.dateChanged.connect(self._change_date)
-
-	def _show_date(self):
-		self.dateedit.setVisible(True)
-		# self.dateedit.setFocus(QtCore.Qt.OtherFocusReason)
-		if self.date=="":
-			self._change_date(self.today)
 
-	def _change_date(self, date):
-		self.date = date.toString(self.date_format)
-		self.tree_item.setText(self.column, self.date)
+class ElementLoader(QtCore.QObject):
+	'''
+	Reads the elements of bodies from the catalog on a pool of worker threads and
+	hands them back to the GUI thread in batches, through queued signals. A request
+	can be cancelled at any time, it stops at the next element it would read.
 
-	# def eventFilter(self, source, event):
-	#	 if event.type() == QtCore.QEvent.FocusIn: #and source is self.empty
-	#		 self._show_date()
-	#	 return False
+	loader.batch_loaded.connect(...)	# (request, [ElementSummary, ...])
+	loader.finished.connect(...)		# (request)
+	request = loader.load("tree", Department.ALL)
+	'''
 
+	BATCH_SIZE = 20
 
-class TreeDateLineEdit(QtWidgets.QDateEdit):
+	batch_loaded = QtCore.Signal(object, object)
+	finished = QtCore.Signal(object)
 
-	def __init__(self, parent=None):
-		QtWidgets.QCalendarWidget.__init__(self, parent)
+	def __init__(self, catalog, workers=4, parent=None):
+		QtCore.QObject.__init__(self, parent)
+		self.catalog = catalog
+		self._pool = ThreadPool(workers)
+		self._numbers = itertools.count()
+		self._lock = threading.Lock()
+		self._pending = set()
 
-	def wheelEvent(self, e):
-		e.ignore() # do nothing
+	def load(self, body_name, departments):
+		request = _LoadRequest(next(self._numbers), body_name, departments)
+		with self._lock:
+			self._pending.add(request)
+		self._pool.apply_async(self._run, (request,))
+		return request
 
+	def cancel_all(self):
+		with self._lock:
+			pending = list(self._pending)
+			self._pending.clear()
+		for request in pending:
+			request.cancel()
 
-class DateLineEdit(QtWidgets.QLineEdit):
+	def shutdown(self):
+		self.cancel_all()
+		self._pool.close()
 
-	clicked = QtCore.Signal()
+	def _run(self, request):
+		try:
+			batch = []
+			for department in request.departments:
+				if request.cancelled():
+					return
+				for name in self.catalog.list_elements(request.body_name, department):
+					if request.cancelled():
+						return
+					summary = self.catalog.element(request.body_name, department, name)
+					if summary is None:
+						continue
+					batch.append(summary)
+					if len(batch) >= self.BATCH_SIZE:
+						self.batch_loaded.emit(request, batch)
+						batch = []
+			if batch and not request.cancelled():
+				self.batch_loaded.emit(request, batch)
+		except Exception as e:
+			print "Could not load the elements of " + request.body_name + ": " + str(e)
+		finally:
+			with self._lock:
+				self._pending.discard(request)
+			if not request.cancelled():
+				self.finished.emit(request)
+
+
+class _BodyNode:
+
+	def __init__(self, row, summary):
+		self.row = row
+		self.summary = summary
+		self.elements = None # not requested yet
+		self.request = None # the load in flight
+
+	def loading(self):
+		return self.request is not None
+
+
+class _ElementNode:
+
+	def __init__(self, body, row, summary):
+		self.body = body
+		self.row = row
+		self.summary = summary
+
+
+class BodyTreeModel(QtCore.QAbstractItemModel):
+	'''
+	Tree of bodies and their elements, read from the catalog. Bodies are added a
+	page at a time as the view scrolls to them (canFetchMore/fetchMore), and the
+	elements of a body are only read when it is expanded, by an ElementLoader in
+	the background. Edits are written through to the body or element.
+	'''
+
+	PAGE_SIZE = 100
+
+	NAME_COLUMN = 0
+	TYPE_COLUMN = 1 # bodies
+	DEPT_COLUMN = 1 # elements
+	USER_COLUMN = 2
+	STATUS_COLUMN = 3
+	START_COLUMN = 4
+	END_COLUMN = 5
+	PUBLISH_COLUMN = 6
+	NOTE_COLUMN = 7
+	HEADERS = ["name", "", "assigned", "status", "start", "end", "publish", "note"]
+
+	BODY_EDITABLE = [TYPE_COLUMN, NOTE_COLUMN]
+	ELEMENT_EDITABLE = [USER_COLUMN, STATUS_COLUMN, START_COLUMN, END_COLUMN, NOTE_COLUMN]
+
+	status_message = QtCore.Signal(str)
+
+	def __init__(self, catalog, user_list, parent=None):
+		QtCore.QAbstractItemModel.__init__(self, parent)
+		self.catalog = catalog
+		self.user_list = user_list
+		self.departments = Department.ALL
+		self._names = []
+		self._bodies = []
+		self._loading = {} # request -> body node
+		self.loader = ElementLoader(catalog, parent=self)
+		self.loader.batch_loaded.connect(self._add_elements)
+		self.loader.finished.connect(self._finish_elements)
+
+	def set_bodies(self, names, departments=None):
+		'''
+		show the given body names, cancelling the element loads in flight. Only the
+		first page is read until the view asks for more.
+		'''
+		self.cancel_loading()
+		self.beginResetModel()
+		self._names = list(names)
+		self._bodies = []
+		if departments is not None:
+			self.departments = departments
+		self.endResetModel()
+
+	def cancel_loading(self, index=None):
+		'''
+		cancel the element load of the body at index, or every load if no index is
+		given. A body whose elements were only partly loaded is loaded again the next
+		time it is expanded.
+		'''
+		if index is None:
+			self.loader.cancel_all()
+			nodes = self._loading.values()
+		elif index.isValid() and self.is_body(index):
+			nodes = [index.internalPointer()]
+		else:
+			return
+		for node in nodes:
+			if not node.loading():
+				continue
+			node.request.cancel()
+			self._loading.pop(node.request, None)
+			node.request = None
+			parent = self.createIndex(node.row, 0, node)
+			if node.elements:
+				self.beginRemoveRows(parent, 0, len(node.elements) - 1)
+				node.elements = None
+				self.endRemoveRows()
+			else:
+				node.elements = None
+
+	def loading_count(self):
+		return len(self._loading)
+
+	def is_body(self, index):
+		return isinstance(index.internalPointer(), _BodyNode)
+
+	def body_name(self, index):
+		node = index.internalPointer()
+		if isinstance(node, _ElementNode):
+			node = node.body
+		return node.summary.name
+
+	# structure
+
+	def index(self, row, column, parent=QtCore.QModelIndex()):
+		if not self.hasIndex(row, column, parent):
+			return QtCore.QModelIndex()
+		if not parent.isValid():
+			return self.createIndex(row, column, self._bodies[row])
+		body = parent.internalPointer()
+		return self.createIndex(row, column, body.elements[row])
+
+	def parent(self, index):
+		if not index.isValid():
+			return QtCore.QModelIndex()
+		node = index.internalPointer()
+		if isinstance(node, _ElementNode):
+			return self.createIndex(node.body.row, 0, node.body)
+		return QtCore.QModelIndex()
+
+	def rowCount(self, parent=QtCore.QModelIndex()):
+		if not parent.isValid():
+			return len(self._bodies)
+		if parent.column() > 0:
+			return 0
+		node = parent.internalPointer()
+		if isinstance(node, _BodyNode) and node.elements is not None:
+			return len(node.elements)
+		return 0
+
+	def columnCount(self, parent=QtCore.QModelIndex()):
+		return len(self.HEADERS)
+
+	def hasChildren(self, parent=QtCore.QModelIndex()):
+		if not parent.isValid():
+			return len(self._names) > 0
+		node = parent.internalPointer()
+		if isinstance(node, _BodyNode):
+			return node.elements is None or node.loading() or len(node.elements) > 0
+		return False
+
+	def canFetchMore(self, parent):
+		if not parent.isValid():
+			return len(self._bodies) < len(self._names)
+		node = parent.internalPointer()
+		return isinstance(node, _BodyNode) and node.elements is None
+
+	def fetchMore(self, parent):
+		if not parent.isValid():
+			self._fetch_bodies()
+		else:
+			node = parent.internalPointer()
+			if isinstance(node, _BodyNode) and node.elements is None:
+				self._fetch_elements(parent, node)
+
+	def _fetch_bodies(self):
+		start = len(self._bodies)
+		names = self._names[start:start + self.PAGE_SIZE]
+		nodes = []
+		for name in names:
+			summary = self.catalog.body(name)
+			if summary is not None:
+				nodes.append(_BodyNode(start + len(nodes), summary))
+		# Bodies deleted since they were listed are dropped from the names too
+		self._names[start:start + self.PAGE_SIZE] = [node.summary.name for node in nodes]
+		if not nodes:
+			return
+		self.beginInsertRows(QtCore.QModelIndex(), start, start + len(nodes) - 1)
+		self._bodies.extend(nodes)
+		self.endInsertRows()
+
+	def _fetch_elements(self, parent, node):
+		node.elements = []
+		node.request = self.loader.load(node.summary.name, self.departments)
+		self._loading[node.request] = node
+
+	def _add_elements(self, request, summaries):
+		node = self._loading.get(request)
+		if node is None or request.cancelled():
+			return
+		start = len(node.elements)
+		self.beginInsertRows(self.createIndex(node.row, 0, node), start, start + len(summaries) - 1)
+		node.elements.extend(_ElementNode(node, start + i, summary) for i, summary in enumerate(summaries))
+		self.endInsertRows()
+
+	def _finish_elements(self, request):
+		node = self._loading.pop(request, None)
+		if node is None:
+			return
+		node.request = None
+		if not node.elements:
+			# The body has no children after all, let the view drop its expand arrow
+			self.layoutAboutToBeChanged.emit()
+			self.layoutChanged.emit()
+
+	# data
+
+	def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+		if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+			return self.HEADERS[section]
+		return None
+
+	def flags(self, index):
+		if not index.isValid():
+			return QtCore.Qt.NoItemFlags
+		flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+		editable = self.BODY_EDITABLE if self.is_body(index) else self.ELEMENT_EDITABLE
+		if index.column() in editable:
+			flags |= QtCore.Qt.ItemIsEditable
+		return flags
+
+	def data(self, index, role=QtCore.Qt.DisplayRole):
+		if not index.isValid() or role not in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+			return None
+		node = index.internalPointer()
+		summary = node.summary
+		column = index.column()
+		if isinstance(node, _BodyNode):
+			if column == self.NAME_COLUMN:
+				return summary.name
+			if column == self.TYPE_COLUMN:
+				return summary.type
+			if column == self.NOTE_COLUMN:
+				return summary.description
+			return None
 
-	def __init__(self, date="", parent=None):
-		QtWidgets.QLineEdit.__init__(self, date, parent)
+		if column == self.NAME_COLUMN:
+			return summary.name
+		if column == self.DEPT_COLUMN:
+			return summary.department
+		if column == self.USER_COLUMN:
+			return summary.assigned_user
+		if column == self.STATUS_COLUMN:
+			return summary.status
+		if column == self.START_COLUMN:
+			return summary.start_date
+		if column == self.END_COLUMN:
+			return summary.end_date
+		if column == self.PUBLISH_COLUMN:
+			publish = summary.last_publish
+			return publish[0]+", "+publish[1]+", "+publish[2] if publish is not None else ""
+		if column == self.NOTE_COLUMN:
+			return summary.last_note
+		return None
+
+	def setData(self, index, value, role=QtCore.Qt.EditRole):
+		if not index.isValid() or role != QtCore.Qt.EditRole:
+			return False
+		value = str(value)
+		if value == (self.data(index, role) or ""):
+			return False
+
+		node = index.internalPointer()
+		try:
+			if isinstance(node, _BodyNode):
+				written = self._set_body_data(node, index.column(), value)
+			else:
+				written = self._set_element_data(node, index.column(), value)
+		except EnvironmentError as e:
+			self.status_message.emit(str(e))
+			return False
+		if not written:
+			return False
+
+		self.catalog.invalidate(node.summary.filepath)
+		if isinstance(node, _BodyNode):
+			node.summary = self.catalog.body(node.summary.name) or node.summary
+		else:
+			summary = node.summary
+			node.summary = self.catalog.element(summary.body_name, summary.department, summary.name) or summary
+		self.dataChanged.emit(index.sibling(index.row(), 0), index.sibling(index.row(), self.columnCount() - 1))
+		self.status_message.emit("")
+		return True
+
+	def _set_body_data(self, node, column, value):
+		body = self.catalog.get_project().get_body(node.summary.name)
+		if column == self.TYPE_COLUMN:
+			body.update_type(value)
+		elif column == self.NOTE_COLUMN:
+			body.update_description(value)
+		else:
+			return False
+		return True
+
+	def _set_element_data(self, node, column, value):
+		if column == self.USER_COLUMN and value not in self.user_list:
+			self.status_message.emit('"' + value + '" is not a valid username')
+			return False
+		if column in (self.START_COLUMN, self.END_COLUMN) and not self._valid_date(value):
+			self.status_message.emit(value + " not a valid date, please use format: YYYY-MM-DD")
+			return False
+
+		summary = node.summary
+		element = self.catalog.get_project().get_body(summary.body_name).get_element(summary.department, summary.name)
+		if column == self.USER_COLUMN:
+			element.update_assigned_user(value)
+		elif column == self.STATUS_COLUMN:
+			element.update_status(value)
+		elif column == self.START_COLUMN:
+			element.update_start_date(value)
+		elif column == self.END_COLUMN:
+			element.update_end_date(value)
+		elif column == self.NOTE_COLUMN:
+			element.update_notes(value)
+		else:
+			return False
+		return True
 
-	def focusInEvent(self, event):
-		QtWidgets.QLineEdit.focusInEvent(self, event)
-		self.clicked.emit()
+	def _valid_date(self, date):
+		try:
+			datetime.datetime.strptime(date, "%Y-%m-%d")
+			return True
+		except ValueError:
+			return False
 
 
 class ElementBrowser(QtWidgets.QWidget):
@@ -180,9 +499,6 @@ class ElementBrowser(QtWidgets.QWidget):
 	ASSETS = "Assets"
 	#SHOTS = "Shots"
 
-	BODY_DATA_COLUMN = 1
-	BODY_DESCRIPTION_COLUMN = 7
-
 	@staticmethod
 	def dark_palette():
 		palette = QtGui.QPalette()
@@ -222,7 +538,8 @@ class ElementBrowser(QtWidgets.QWidget):
 		self.setPalette(self.palette)
 
 		# initialize project
-		self.project = Project()
+		self.catalog = get_catalog()
+		self.project = self.catalog.get_project()
 		self.user_list = self.project.list_users()
 		self.user_completer = QtWidgets.QCompleter(self.user_list)
 
@@ -271,38 +588,19 @@ class ElementBrowser(QtWidgets.QWidget):
 		self.refresh_button = QtWidgets.QPushButton("Refresh")
 
 		# tree
-		self.tree = QtWidgets.QTreeWidget()
-		self.tree.setItemDelegate(TreeGridDelegate(self.tree))
-		self.columnCount = 8
-		self.tree.setColumnCount(self.columnCount)
-		tree_header = QtWidgets.QTreeWidgetItem(["name", "", "assigned", "status", "start", "end", "publish", "note"])
-		self.tree.setHeaderItem(tree_header)
+		self.tree_model = BodyTreeModel(self.catalog, self.user_list, self)
+		self.tree = QtWidgets.QTreeView()
+		self.tree.setModel(self.tree_model)
+		self.tree.setItemDelegate(BodyItemDelegate(self.user_completer, self.tree))
+		self.tree.setUniformRowHeights(True)
+		self.tree.setEditTriggers(QtWidgets.QAbstractItemView.DoubleClicked | QtWidgets.QAbstractItemView.SelectedClicked | QtWidgets.QAbstractItemView.EditKeyPressed)
 		tree_header_view = self.tree.header()
 		tree_header_view.resizeSection(4, 120)
 		tree_header_view.resizeSection(5, 120)
 
-		self.init_tree = [None]*self.columnCount
-		self.init_tree[0] = self.init_name
-		self.init_tree[1] = self.init_dept
-		self.init_tree[2] = self.init_assigned_user
-		self.init_tree[3] = self.init_status
-		self.init_tree[4] = self.init_start_date
-		self.init_tree[5] = self.init_end_date
-		self.init_tree[6] = self.init_last_publish
-		self.init_tree[7] = self.init_note
-
+		self.expanding_all = False
 		self._build_tree()
 
-		self.update_tree = [None]*self.columnCount
-		self.update_tree[0] = self.update_name
-		self.update_tree[1] = self.update_dept
-		self.update_tree[2] = self.update_assigned_user
-		self.update_tree[3] = self.update_status
-		self.update_tree[4] = self.update_start_date
-		self.update_tree[5] = self.update_end_date
-		self.update_tree[6] = self.update_last_publish
-		self.update_tree[7] = self.update_note
-
 		# status bar
 		self.status_bar = QtWidgets.QStatusBar()
 
@@ -313,8 +611,9 @@ class ElementBrowser(QtWidgets.QWidget):
 		self.body_menu.currentIndexChanged.connect(self._body_changed)
 		self.new_button.clicked.connect(self._new_body)
 		self.refresh_button.clicked.connect(self._refresh)
-		self.tree.itemExpanded.connect(self._load_elements)
-		self.tree.itemChanged.connect(self._item_edited)
+		self.tree_model.status_message.connect(self._show_status)
+		self.tree_model.rowsInserted.connect(self._bodies_fetched)
+		self.tree.collapsed.connect(self.tree_model.cancel_loading)
 		self.dept_filter.currentIndexChanged.connect(self._dept_filter_changed)
 		self.name_filter.editingFinished.connect(self._filter_by_name)
 		self.type_filter.currentIndexChanged.connect(self._refresh)
@@ -359,75 +658,30 @@ class ElementBrowser(QtWidgets.QWidget):
 		request_email.check_user_email(self)
 
 	def _build_tree(self):
-		self.tree.clear()
-		tree_state = self.tree.blockSignals(True)
-		for body in self.bodies:
-			if(str(self.name_filter.text()) in body):
-				tree_item = QtWidgets.QTreeWidgetItem([body])
-				self.tree.addTopLevelItem(tree_item)
-				tree_flags = tree_item.flags()
-				tree_item.setFlags(tree_flags | QtCore.Qt.ItemIsEditable)
-				# for col in xrange(self.columnCount):
-				#	 tree_item.setBackground(col, QtWidgets.QColor(30,30,30))
-				body_obj = self.project.get_body(body)
-				self._load_body(body_obj, tree_item)
-				tree_item.addChild(QtWidgets.QTreeWidgetItem()) # empty item
-		self.tree.blockSignals(tree_state)
-
-	def _load_body(self, body, item):
-		tree_state = self.tree.blockSignals(True)
-		item.setText(0, body.get_name())
-		namelabel = TreeLabel(body.get_name())
-		self.tree.setItemWidget(item, 0, namelabel)
-		if self.current_body==self.ASSETS:
-			body_type = body.get_type()
-			item.setText(self.BODY_DATA_COLUMN, body_type)
-			combobox = TreeComboBoxItem(item, self.BODY_DATA_COLUMN)
-			type_idx = 0
-			for idx, type in enumerate(AssetType.ALL):
-				combobox.addItem(type)
-				if type == body_type:
-					type_idx = idx
-			combobox.setCurrentIndex(type_idx)
-			self.tree.setItemWidget(item, self.BODY_DATA_COLUMN, combobox)
-		#elif self.current_body==self.SHOTS:
-		#	item.setText(self.BODY_DATA_COLUMN, str(body.get_frame_range()))
-		else:
-			self.status_bar.showMessage("Error: unknown body type")
-
-		description_edit = TreeLineEdit(body.get_description(), item, self.BODY_DESCRIPTION_COLUMN)
-		self.tree.setItemWidget(item, self.BODY_DESCRIPTION_COLUMN, description_edit)
-
-		for col in range(self.BODY_DATA_COLUMN+1, self.columnCount-1): # disable remaining columns
-			emptylabel = TreeLabel()
-			self.tree.setItemWidget(item, col, emptylabel)
-		self.tree.blockSignals(tree_state)
-
-	def _load_elements(self, item):
-		tree_state = self.tree.blockSignals(True)
-		body = str(item.text(0))
-		body_obj = self.project.get_body(body)
-		elements = []
-		for dept in self.dept_list:
-			dept_elements = body_obj.list_elements(dept)
-			for dept_element in dept_elements:
-				elements.append((dept, dept_element))
-		item.takeChildren() # clear children
-		for dept, element in elements:
-			element_obj = body_obj.get_element(dept, element)
-			child_item = QtWidgets.QTreeWidgetItem()
-			item.addChild(child_item)
-			child_item.setFlags(child_item.flags() | QtCore.Qt.ItemIsEditable)
-			for col, init in enumerate(self.init_tree):
-				init(element_obj, child_item, col)
-		self.tree.blockSignals(tree_state)
+		self.tree_model.set_bodies(self.bodies, self.dept_list)
 
 	def _expand_all(self):
-		# self.tree.expandAll()
-		count = self.tree.topLevelItemCount()
-		for i in xrange(count):
-			item = self.tree.topLevelItem(i)
-			self.tree.expandItem(item)
+		# Bodies paged in later are expanded as they arrive (see _bodies_fetched), and
+		# their elements load in the background, so this doesn't block on the disk
+		self.expanding_all = True
+		for row in xrange(self.tree_model.rowCount()):
+			self.tree.expand(self.tree_model.index(row, 0))
+
+	def _bodies_fetched(self, parent, first, last):
+		if parent.isValid() or not self.expanding_all:
+			return
+		for row in xrange(first, last + 1):
+			self.tree.expand(self.tree_model.index(row, 0))
+
+	def _show_status(self, message):
+		if message:
+			self.status_bar.showMessage(message)
+		else:
+			self.status_bar.clearMessage()
+
+	def closeEvent(self, event):
+		self.tree_model.loader.shutdown()
+		QtWidgets.QWidget.closeEvent(self, event)
 
 	def _show_user_directory(self):
 		user_directory = UserListDialog(self)
@@ -443,36 +697,17 @@ class ElementBrowser(QtWidgets.QWidget):
 
 	def _set_bodies(self):
 		if self.current_body == self.ASSETS:
-			asset_filter = None
+			asset_type = None
 			if(self.type_filter.currentIndex()):
-				asset_filter_str = str(self.type_filter.currentText())
-				asset_filter = (Asset.TYPE, operator.eq, asset_filter_str)
-			self.bodies = self.project.list_assets(asset_filter)
+				asset_type = str(self.type_filter.currentText())
+			self.bodies = self.catalog.list_assets(asset_type, str(self.name_filter.text()))
 		#elif self.current_body == self.SHOTS:
 		#	self.bodies = self.project.list_shots()
 		else:
 			self.bodies = []
 
-	def _item_edited(self, item, column):
-		parent = item.parent()
-		if parent is not None:
-			body = str(parent.text(0))
-			body_obj = self.project.get_body(body)
-			element = str(item.text(0))
-			dept = str(item.text(1))
-			element_obj = body_obj.get_element(dept, element)
-			self.update_tree[column](element_obj, item, column)
-			# self.tree.resizeColumnToContents(column)
-		else:
-			body = str(item.text(0))
-			body_obj = self.project.get_body(body)
-			if column==self.BODY_DATA_COLUMN:
-				self._update_body_data(body_obj, item)
-			elif column==self.BODY_DESCRIPTION_COLUMN:
-				self._update_body_description(body_obj, item)
-
-
 	def _refresh(self): # TODO: maintain expanded rows on refresh
+		self.expanding_all = False
 		self._set_bodies()
 		self._build_tree()
 		self.status_bar.clearMessage()
@@ -510,123 +745,6 @@ class ElementBrowser(QtWidgets.QWidget):
 		#	self.new_body_dialog.setCurrentIndex(self.new_body_dialog.SHOT_INDEX)
 		self.new_body_dialog.finished.connect(self._refresh)
 
-	def _update_body_data(self, body, item):
-		if self.current_body==self.ASSETS:
-			body.update_type(str(item.text(self.BODY_DATA_COLUMN)))
-		#elif self.current_body==self.SHOTS:
-		#	body.update_frame_range(int(item.text(self.BODY_DATA_COLUMN)))
-		else:
-			self.status_bar.showMessage("Error: unknown body type")
-
-	def _update_body_description(self, body, item):
-		body.update_description(str(item.text(self.BODY_DESCRIPTION_COLUMN)))
-
-	def _valid_date(self, date):
-		try:
-			date_obj = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-			return str(date_obj)
-		except ValueError:
-			self.status_bar.showMessage(date+" not a valid date, please use format: YYYY-MM-DD")
-			return None
-
-	def init_name(self, element, item, column):
-		item.setText(column, element.get_name())
-		namelabel = TreeLabel(element.get_name())
-		self.tree.setItemWidget(item, column, namelabel)
-
-	def init_dept(self, element, item, column):
-		item.setText(column, element.get_department())
-		deptlabel = TreeLabel(element.get_department())
-		self.tree.setItemWidget(item, column, deptlabel)
-
-	def init_assigned_user(self, element, item, column):
-		user = element.get_assigned_user()
-		item.setText(column, user)
-		lineedit = TreeLineEdit(user, item, column)
-		lineedit.setCompleter(self.user_completer)
-		self.tree.setItemWidget(item, column, lineedit)
-
-	def init_status(self, element, item, column):
-		item.setText(column, element.get_status())
-		combobox = TreeComboBoxItem(item, column)
-		element_type = element.get_status()
-		type_idx = 0
-		for idx, type in enumerate(Status.ALL):
-			combobox.addItem(type)
-			if type == element_type:
-				type_idx = idx
-		combobox.setCurrentIndex(type_idx)
-		self.tree.setItemWidget(item, column, combobox)
-
-	def init_start_date(self, element, item, column):
-		start_date = element.get_start_date()
-		item.setText(column, " "+start_date)
-		start_dateedit = TreeDateEdit(start_date, item, column, self.tree)
-		self.tree.setItemWidget(item, column, start_dateedit)
-
-	def init_end_date(self, element, item, column):
-		end_date = element.get_end_date()
-		item.setText(column, " "+end_date)
-		end_dateedit = TreeDateEdit(end_date, item, column, self.tree)
-		self.tree.setItemWidget(item, column, end_dateedit)
-
-	def init_last_publish(self, element, item, column):
-		publish = element.get_last_publish()
-		if publish is not None:
-			item.setText(column, publish[0]+", "+publish[1]+", "+publish[2])
-		else:
-			item.setText(column, "")
-
-	def init_note(self, element, item, column):
-		item.setText(column, element.get_last_note())
-
-	def update_name(self, element, item, column):
-		self.status_bar.showMessage("can't change name")
-
-	def update_dept(self, element, item, column):
-		self.status_bar.showMessage("can't change department")
-
-	def update_assigned_user(self, element, item, column):
-		user = str(item.text(column))
-		if user in self.user_list:
-			element.update_assigned_user(user)
-			self.status_bar.clearMessage()
-		else:
-			self.tree.itemWidget(item, column).setText(element.get_assigned_user())
-			self.status_bar.showMessage('"' + user + '" is not a valid username')
-
-	def update_status(self, element, item, column):
-		element.update_status(str(item.text(column)))
-		self.status_bar.clearMessage()
-
-	def update_start_date(self, element, item, column):
-		date_str = str(item.text(column))
-		valid_date_str = self._valid_date(date_str)
-		if valid_date_str:
-			element.update_start_date(valid_date_str)
-			item.setText(column, " "+date_str)
-			self.status_bar.clearMessage()
-		else:
-			self.init_start_date(element, item, column)
-
-	def update_end_date(self, element, item, column):
-		date_str = str(item.text(column))
-		valid_date_str = self._valid_date(date_str)
-		if valid_date_str:
-			element.update_end_date(valid_date_str)
-			item.setText(column, " "+date_str)
-			self.status_bar.clearMessage()
-		else:
-			self.init_end_date(element, item, column)
-
-	def update_last_publish(self, element, item, column):
-		self.status_bar.showMessage("can't modify publish data")
-		self.init_last_publish(element, item, column)
-
-	def update_note(self, element, item, column):
-		element.update_notes(str(item.text(column)))
-		self.status_bar.clearMessage()
-
 class UserListDialog(QtWidgets.QDialog):
 	def __init__(self, parent):
 		QtWidgets.QDialog.__init__(self, parent)
@@ -11,13 +11,49 @@ import maya.cmds as mc
 import maya.OpenMayaUI as omu
 import os
 
+# How many of the latest publishes are offered to roll back to
+ROLLBACK_HISTORY_LENGTH = 100
+
 
 class MayaCloner:
 	def __init__(self):
 		self.maya_checkout_dialog = None
 
 	def rollback(self):
-		print("Rollin' Rollin' Rollin' (Back)")
+		project = Project()
+		asset_list = project.list_assets()
+		self.item_gui = sfl.SelectFromList(l=asset_list, parent=maya_utils.maya_main_window(), title="Select an asset to roll back")
+		self.item_gui.submitted.connect(self.rollback_asset_results)
+
+	def rollback_asset_results(self, value):
+		body = Project().get_body(value[0])
+		try:
+			self.rollback_element = body.get_element("model")
+		except EnvironmentError as e:
+			print(str(e))
+			return
+
+		element = self.rollback_element
+		targets = element.list_rollback_targets(ROLLBACK_HISTORY_LENGTH)
+		self.rollback_versions = dict((label, version) for version, label in targets)
+		labels = [label for version, label in targets]
+
+		if not labels:
+			print("No older versions of " + element.get_long_name() + " to roll back to")
+			return
+
+		self.item_gui = sfl.SelectFromList(l=labels, parent=maya_utils.maya_main_window(), title="Select a version to roll back to")
+		self.item_gui.submitted.connect(self.rollback_version_results)
+
+	def rollback_version_results(self, value):
+		version = self.rollback_versions.get(value[0])
+		if version is None:
+			return
+
+		# No files are copied, the element's file is pointed at the version's
+		element = self.rollback_element
+		dst = element.rollback(version, Project().get_current_username())
+		print("Rolled back " + element.get_long_name() + " to version " + str(version) + ": " + dst)
 
 	def clone(self, gui=True, file_path=None, asset_name='Temp'):
 		if gui:
@@ -4,4 +4,4 @@ Houdini tools
 @author Brigham Young University
 """
 
-__all__ = ['tagger', 'alembic_exporter', 'exporter', 'json_exporter']
+__all__ = ['tagger', 'alembic_exporter', 'exporter', 'json_exporter', 'export_jobs']
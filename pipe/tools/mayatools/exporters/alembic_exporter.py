@@ -2,22 +2,31 @@ from am import *
 from gui import quick_dialogs
 import os
 import shutil
+import tempfile
 
 import maya.cmds as mc
+import maya.utils
 from pymel.core import *
 
 import pipe.am.pipeline_io as pio
+from pipe.am.cache_install import CacheInstaller
+from pipe.tools.mayatools.utils.reference_snapshot import ReferenceSnapshot
 from pipe.tools.mayatools.utils.utils import *
 from pipe.am.environment import Environment
 from pipe.am.body import AssetType
 from pipe.am.project import Project
 from pipe.gui import quick_dialogs as qd
 import pipe.gui.select_from_list as sfl
+from pipe.tools.mayatools.exporters import export_jobs
 
 
 class AlembicExporter:
-    def __init__(self, frame_range=1, gui=True, element=None, show_tagger=False):
+    # The flags abcExportLoadedReferences has always exported with
+    LOADED_REFERENCE_FLAGS = ['-stripNamespaces', '-writeVisibility', '-noNormals', '-uvWrite', '-worldSpace', '-autoSubd']
+
+    def __init__(self, frame_range=1, gui=True, element=None, show_tagger=False, workers=4):
         self.frame_range = frame_range
+        self.workers = workers
         pm.loadPlugin('AbcExport')
 
     def abcExport(self, selected, path):
@@ -40,37 +49,100 @@ class AlembicExporter:
 
     	return abcfiles
 
-    def abcExportLoadedReferences(self, path):
+    def abcExportLoadedReferences(self, path, background=False):
         if not os.path.exists(path):
             os.makedirs(path)
 
-        abcfiles = []
-
-        loadedRefs = get_loaded_references()
-        for i, ref in enumerate(loadedRefs):
-            print ref
-            refNodes = mc.referenceQuery(unicode(ref), nodes=True)
-            rootNode = ls(refNodes[0])
-            roots_string = ''
+        references = []
+        for info in ReferenceSnapshot.take():
+            print info.ref
+            if info.root_node is None:
+                continue
             #TODO check if the root has been tagged
             # if not check to see if its children have been tagged
             # At this point we have a node that is ready for export
-            for alem_obj in rootNode:
-            	roots_string += (' -root %s'%(alem_obj))
+            references.append((self.formatFilename(info.ref), [str(info.root_node)]))
+
+        jobs = export_jobs.plan_jobs(references, 1, self.frame_range, path, flags=self.LOADED_REFERENCE_FLAGS)
+        return self.runJobs(jobs, background=background)
+
+    def runJobs(self, jobs, background=False):
+        '''
+            Run planned export_jobs. In the foreground each job is run in this
+            session. In the background the scene is saved and copied, and the jobs
+            run in headless workers that write to a staging dir. The files are
+            checked and swapped into the cache dirs the jobs said when the workers
+            are done.
+            @return: the files the jobs wrote, or None in the background (the files
+            are installed by finishBackgroundExport) or if it was canceled
+        '''
+        files = [job.outfile for job in jobs]
+
+        if not background:
+            for i, job in enumerate(jobs):
+                print 'Export Alembic command: ', job.mel()
+                pm.Mel.eval(job.mel())
+                print 'Export successful! ' + str(i + 1) + ' of ' + str(len(jobs))
+            return files
+
+        scene = pm.sceneName()
+        if not scene:
+            qd.error('Save the scene before exporting alembics in the background.')
+            return None
+        if mc.file(q=True, modified=True):
+            if not qd.yes_or_no('The background export works from the saved scene. Save ' + str(scene) + ' now?'):
+                return None
+            pm.saveFile()
+
+        if not jobs:
+            return files
+
+        # Stage beside the destination's cache dir, so installing is a rename
+        job_dir = tempfile.mkdtemp(prefix='.abc_export_', dir=os.path.dirname(os.path.dirname(files[0])))
+        staged = {}
+        for job in jobs:
+            staged_file = os.path.join(job_dir, 'abc', os.path.basename(job.outfile))
+            staged[staged_file] = job.outfile
+            job.outfile = staged_file
+
+        snapshot = export_jobs.snapshot_scene(str(scene), job_dir)
+        dispatcher = export_jobs.ExportDispatcher(snapshot, workers=self.workers, job_dir=job_dir)
+        dispatcher.start(jobs, callback=lambda results: self.finishBackgroundExport(results, staged, job_dir))
+
+        print 'Exporting ' + str(len(jobs)) + ' alembics in the background'
+        return None
+
+    def finishBackgroundExport(self, results, staged, job_dir):
+        '''
+            Called on the dispatcher's thread when the workers are done. Installs
+            the staged files only if every one of them was written.
+        '''
+        for i, result in enumerate(results):
+            print 'Export worker ' + str(i) + ' finished in %.1fs with code %s' % (result.elapsed, result.returncode)
+            if not result.succeeded():
+                with open(os.path.join(job_dir, 'worker_' + str(i) + '.log'), 'w') as log:
+                    log.write(result.output or '')
+
+        missing = self.checkFiles(staged.keys())
+        if missing:
+            self.notify(qd.error, str(len(missing)) + ' of ' + str(len(staged)) + ' alembics failed to export, so none were installed. The worker logs are in ' + job_dir)
+            return
 
-            print 'roots_string: ' + roots_string
+        # Swap each cache dir once, keeping the files that weren't exported.
+        # The installer sets the new files' permissions.
+        by_cache_dir = {}
+        for src, dst in staged.items():
+            by_cache_dir.setdefault(os.path.dirname(dst), []).append(src)
+        for cache_dir, files in by_cache_dir.items():
+            CacheInstaller(cache_dir).install(files, clone=True, move=True)
+        shutil.rmtree(job_dir, ignore_errors=True)
 
-            abcFile = formatFilename(ref) + '.abc'
-            abcFilePath = os.path.join(path, abcFile)
-            print 'The file path: ' + str(abcFilePath)
-            command = 'AbcExport -j "-frameRange 1 ' + self.frame_range + ' -stripNamespaces -writeVisibility -noNormals -uvWrite -worldSpace -autoSubd -file ' + abcFilePath + '";'
-            print 'The command: ' + command
-            Mel.eval(command)
-            print 'Export successful! ' + str(i) + ' of ' + str(len(loadedRefs))
-            abcfiles.append(abcFilePath)
+        self.notify(qd.info, 'Exported ' + str(len(staged)) + ' alembics.')
 
-        print 'all exports complete'
-        return abcfiles
+    def notify(self, dialog, message):
+        # Dialogs have to be shown from Maya's main thread
+        print message
+        maya.utils.executeDeferred(dialog, message)
 
     def abcExportAll(self, name, path):
     	if not os.path.exists(path):
@@ -122,6 +194,14 @@ class AlembicExporter:
 
     def getElementCacheDirectory(self, path, element=None):
 
+    	element = self.getCheckoutElement(path, element)
+    	if element is None:
+    		return None
+
+    	return element.get_cache_dir()
+
+    def getCheckoutElement(self, path, element=None):
+
     	if element is None:
     		project = Project()
     		checkout = project.get_checkout(path)
@@ -131,45 +211,33 @@ class AlembicExporter:
     		body = project.get_body(checkout.get_body_name())
     		element = body.get_element(checkout.get_department_name(), checkout.get_element_name())
 
-    	return element.get_cache_dir()
+    	return element
 
     def installGeometry(self, path='',element=None):
 
     	'''
-    		Function to install the geometry into the PRODUCTION asset directory
-    		@return: True if the files were moved successfully
-    		@throws: a shutil exception if the move failed
+    		Function to install the geometry into the PRODUCTION asset directory.
+    		Each file goes into the element's cache with an incremental cache update,
+    		so a file that didn't change since the last export isn't copied again.
+    		The cache is swapped in at once (see CacheInstaller), and the old cache is
+    		kept so it can be rolled back.
+    		@return: True if the files were installed successfully
+    		@throws: an EnvironmentError if the files couldn't be installed. The live cache is left as it was.
     	'''
 
     	path=os.path.dirname(mc.file(q=True, sceneName=True))
 
     	srcABC = os.path.join(path, 'cache', 'abcFiles')
-    	destABC = self.getElementCacheDirectory(path, element)
-    	if destABC is None:
+    	element = self.getCheckoutElement(path, element)
+    	if element is None:
     		return False
 
-    	if os.path.exists(destABC):
-    		try:
-    			shutil.rmtree(destABC)
-    		except Exception as e:
-    			print 'Couldn\'t delete old abc files:'
-    			print e
-
-    	srcABC = os.path.join(srcABC, '*');
-    	if not os.path.exists(destABC):
-    		os.mkdir(destABC);
-    		os.system('chmod 774 -R ' + destABC)
-
-    	print 'Copying '+srcABC+' to '+destABC
-    	try:
-    		os.system('chmod 774 -R '+srcABC)
-    		result = os.system('mv -f '+srcABC+' '+destABC)
-    		print result
-    		# shutil.copytree(src=srcABC, dst=destABC)
-
-    	except Exception as e:
-    		print 'Couldn\'t copy newly generated abc files:'
-    		print e
+    	files = [os.path.join(srcABC, name) for name in os.listdir(srcABC)]
+    	print 'Installing ' + str(len(files)) + ' files from ' + srcABC + ' to ' + element.get_cache_dir()
+    	for abcFile in files:
+    		# A new export always has a new mtime, so compare by content
+    		report = element.update_cache(abcFile, incremental=True, use_checksum=True)
+    		print element.get_long_name() + ' cache update: ' + str(report)
 
     	print 'Removing '+os.path.join(path, 'cache')
     	shutil.rmtree(os.path.join(path, 'cache'))
@@ -312,7 +380,12 @@ class AlembicExporter:
 
             self.export(element, selection=selection, startFrame=startFrame, endFrame=endFrame)
 
-    def export(self, element, selection=None, startFrame=None, endFrame=None):
+    '''
+        @background: for shots, export in headless workers and install the files
+        when they're done (see runJobs). None asks the user. Returns None then,
+        since the files aren't there yet.
+    '''
+    def export(self, element, selection=None, startFrame=None, endFrame=None, background=None):
         project = Project()
         bodyName = element.get_parent()
         body = project.get_body(bodyName)
@@ -332,7 +405,9 @@ class AlembicExporter:
             endFrame = int(endFrame)
             endFrame += 5
             endFrame = str(endFrame)
-            files = self.exportReferences(abcFilePath, tag='DCC_Alembic_Export_Flag', startFrame=startFrame, endFrame=endFrame)
+            if background is None:
+                background = qd.yes_or_no('Export the alembics in the background? You can keep working, and they are installed when they are all done.')
+            files = self.exportReferences(abcFilePath, tag='DCC_Alembic_Export_Flag', startFrame=startFrame, endFrame=endFrame, background=background)
             # result = qd.yes_or_no('Are there any crowds that need to be exported?')
             # if result:
             #     self.exportCrowd(abcFilePath, 'DCC_Crowd_Agent_Flag', tag='DCC_Alembic_Export_Flag', startFrame=startFrame, endFrame=endFrame)
@@ -352,7 +427,10 @@ class AlembicExporter:
             return
 
         for abcFile in files:
-            os.system('chmod 774 ' + abcFile)
+            try:
+                os.chmod(abcFile, CacheInstaller.FILE_MODE)
+            except OSError as e:
+                print 'Could not set the permissions of ' + abcFile + ': ' + str(e)
 
         #TODO install the geometry
         print 'These are the files that we are returning', files
@@ -421,39 +499,35 @@ class AlembicExporter:
         @tag: unused
         @startFrame: beginning frame to export
         @endFrame: ending frame to export \
+        @background: export in headless workers and install the files when they're done
 
-        @return: a list of exported alembic files
+        @return: a list of exported alembic files (None in the background, they're installed when the workers finish)
 
         Gets all loaded references, then loops through them and if it's a top level reference
         i.e. a character, set, or animated prop, exports an alembic file to the destination specified
     '''
-    def exportReferences(self, destination, tag="DCC_Alembic_Export_Flag", startFrame=1, endFrame=1):
-        selection = get_loaded_references()
-
-        if selection is None:
-            return
+    def exportReferences(self, destination, tag="DCC_Alembic_Export_Flag", startFrame=1, endFrame=1, background=False):
+        jobs = self.referenceJobs(destination, startFrame, endFrame)
+        return self.runJobs(jobs, background=background)
 
-        abcFiles = []
+    '''
+        Plan one export job per top level reference, i.e. a character, set, or
+        animated prop, named after its namespace
+    '''
+    def referenceJobs(self, destination, startFrame=1, endFrame=1, snapshot=None):
+        if snapshot is None:
+            snapshot = ReferenceSnapshot.take()
 
-        for ref in selection:
-            rootNode = get_root_node_from_reference(ref)
-            name = str(ref.associatedNamespace(baseName=True))
-            parent = ref.parentReference()
-
-            if not parent:
-                # then this is either an animated prop, a char, or a set. Export an alembic for each accordingly, with the correct file name
-                refAbcFilePath = os.path.join(destination, name + ".abc")
-                p = rootNode.listRelatives(p=True)[0]
-                root = str(p) + "|" + str(rootNode)
-                command = self.buildAlembicCommand(refAbcFilePath, startFrame, endFrame, geoList=[root])
-            else:
+        references = []
+        for info in snapshot:
+            if info.ref.parentReference() or info.root_node is None:
                 continue
 
-            print 'Export Alembic command: ', command
-            pm.Mel.eval(command)
-            abcFiles.append(refAbcFilePath)
+            rootNode = info.root_node
+            p = rootNode.listRelatives(p=True)[0]
+            references.append((info.namespace(), [str(p) + '|' + str(rootNode)]))
 
-        return abcFiles
+        return export_jobs.plan_jobs(references, startFrame, endFrame, destination)
 
     def getFilenameForReference(self, ref):
         #TODO Make sure that we test for multiple files
@@ -0,0 +1,233 @@
+'''
+    Plans Alembic exports as independent jobs and runs them in headless Maya
+    worker processes, so the artist's session doesn't wait on AbcExport.
+
+    jobs = plan_jobs([('tree', ['|set|tree'])], 1, 120, staging_dir)
+    dispatcher = ExportDispatcher(scene_copy, workers=4)
+    dispatcher.start(jobs, callback=done)
+
+    Workers are started as <worker command> export_worker.py <shard file>. The
+    worker command is mayapy unless DCCPIPE_MAYAPY says otherwise, e.g. a stub
+    script when testing.
+'''
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import pipe.am.pipeline_io as pio
+
+WORKER_ENV = 'DCCPIPE_MAYAPY'
+DEFAULT_WORKER = '/usr/autodesk/maya2018/bin/mayapy'
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'export_worker.py')
+
+# The flags buildAlembicCommand has always used
+DEFAULT_FLAGS = ['-dataFormat', 'ogawa']
+
+
+def frame_value(frame):
+    # Frame ranges come in as strings, ints and floats. Keep whole frames whole.
+    frame = float(frame)
+    if frame == int(frame):
+        return int(frame)
+    return frame
+
+
+class ExportJob:
+    '''
+        One AbcExport call: the given roots over the given frames, written to outfile
+    '''
+
+    def __init__(self, name, roots, start, end, outfile, step=None, flags=None):
+        self.name = name
+        self.roots = list(roots)
+        self.start = frame_value(start)
+        self.end = frame_value(end)
+        self.outfile = outfile
+        self.step = step
+        self.flags = list(flags) if flags is not None else list(DEFAULT_FLAGS)
+
+    def __repr__(self):
+        return 'ExportJob({0}, {1}-{2}, {3} roots)'.format(self.name, self.start, self.end, len(self.roots))
+
+    def frame_count(self):
+        return max(1, int(self.end - self.start) + 1)
+
+    def cost(self):
+        return self.frame_count() * max(1, len(self.roots))
+
+    def arguments(self):
+        arguments = ['-frameRange', str(self.start), str(self.end)]
+        if self.step is not None:
+            arguments += ['-step', str(self.step)]
+        arguments += self.flags
+        for root in self.roots:
+            arguments += ['-root', str(root)]
+        arguments += ['-file', self.outfile]
+        return arguments
+
+    def job_string(self):
+        return ' '.join(self.arguments())
+
+    def mel(self):
+        return 'AbcExport -j "{0}";'.format(self.job_string())
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'roots': self.roots,
+            'start': self.start,
+            'end': self.end,
+            'outfile': self.outfile,
+            'step': self.step,
+            'flags': self.flags
+        }
+
+    @classmethod
+    def from_dict(cls, datadict):
+        return cls(datadict['name'], datadict['roots'], datadict['start'], datadict['end'],
+                   datadict['outfile'], datadict.get('step'), datadict.get('flags'))
+
+
+'''
+    Turn (name, roots) pairs into export jobs writing <name>.abc to destination.
+    Each reference is one job over the whole frame range, since nothing
+    downstream can merge alembics written in frame chunks.
+'''
+def plan_jobs(references, start, end, destination, step=None, flags=None):
+    start = frame_value(start)
+    end = frame_value(end)
+    jobs = []
+
+    for name, roots in references:
+        if not roots:
+            print 'Nothing to export for ' + str(name)
+            continue
+
+        jobs.append(ExportJob(name, roots, start, end, os.path.join(destination, name + '.abc'), step, flags))
+
+    return jobs
+
+'''
+    Split the jobs into at most count shards of about the same cost. Each shard
+    is run by one worker, which only has to open the scene once.
+'''
+def shard_jobs(jobs, count):
+    shards = [[] for i in range(max(1, count))]
+    loads = [0] * len(shards)
+
+    for job in sorted(jobs, key=lambda job: job.cost(), reverse=True):
+        lightest = loads.index(min(loads))
+        shards[lightest].append(job)
+        loads[lightest] += job.cost()
+
+    return [shard for shard in shards if shard]
+
+def write_shard(filepath, scene, jobs):
+    pio.writefile(filepath, {'scene': scene, 'jobs': [job.to_dict() for job in jobs]})
+
+def read_shard(filepath):
+    datadict = pio.readfile(filepath)
+    return datadict['scene'], [ExportJob.from_dict(job) for job in datadict['jobs']]
+
+'''
+    Copy the saved scene into job_dir, so the artist can keep working on (and
+    saving over) their file while the workers read the copy.
+'''
+def snapshot_scene(scene, job_dir):
+    if not os.path.exists(job_dir):
+        os.makedirs(job_dir)
+    snapshot = os.path.join(job_dir, os.path.basename(scene))
+    shutil.copy2(scene, snapshot)
+    return snapshot
+
+
+class ExportResult:
+
+    def __init__(self, jobs, returncode, output, elapsed):
+        self.jobs = jobs
+        self.returncode = returncode
+        self.output = output
+        self.elapsed = elapsed
+
+    def succeeded(self):
+        return self.returncode == 0
+
+    def outfiles(self):
+        return [job.outfile for job in self.jobs]
+
+
+class ExportDispatcher:
+    '''
+        Runs export jobs in a pool of headless worker processes
+    '''
+
+    def __init__(self, scene, workers=4, worker_command=None, job_dir=None):
+        self.scene = scene
+        self.workers = max(1, workers)
+        self.worker_command = worker_command
+        self.job_dir = job_dir
+
+    def command(self, shard_file):
+        worker = self.worker_command or os.environ.get(WORKER_ENV) or DEFAULT_WORKER
+        if not isinstance(worker, list):
+            worker = shlex.split(worker)
+        return worker + [WORKER_SCRIPT, shard_file]
+
+    '''
+        Run the jobs and wait for them. Returns one ExportResult per worker.
+    '''
+    def run(self, jobs):
+        if not jobs:
+            return []
+
+        job_dir = self.job_dir or tempfile.mkdtemp(prefix='abc_export_')
+        if not os.path.exists(job_dir):
+            os.makedirs(job_dir)
+        shards = shard_jobs(jobs, self.workers)
+        for shard in shards:
+            for job in shard:
+                outdir = os.path.dirname(job.outfile)
+                if outdir and not os.path.exists(outdir):
+                    os.makedirs(outdir)
+
+        def run_shard(args):
+            index, shard = args
+            shard_file = os.path.join(job_dir, 'shard_{0}.json'.format(index))
+            write_shard(shard_file, self.scene, shard)
+            start = time.time()
+            try:
+                process = subprocess.Popen(self.command(shard_file), stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                output = process.communicate()[0]
+                returncode = process.returncode
+            except OSError as e:
+                output = 'Could not start export worker: ' + str(e)
+                returncode = -1
+            return ExportResult(shard, returncode, output, time.time() - start)
+
+        pool = ThreadPool(len(shards))
+        try:
+            return pool.map(run_shard, list(enumerate(shards)))
+        finally:
+            pool.close()
+            pool.join()
+
+    '''
+        Run the jobs on a background thread and return the thread right away.
+        callback(results) is called on that thread when every worker is done,
+        so it must not touch the Maya scene.
+    '''
+    def start(self, jobs, callback=None):
+        def work():
+            results = self.run(jobs)
+            if callback is not None:
+                callback(results)
+
+        thread = threading.Thread(target=work, name='abc_export')
+        thread.daemon = True
+        thread.start()
+        return thread
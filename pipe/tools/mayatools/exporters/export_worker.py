@@ -0,0 +1,41 @@
+'''
+    Headless Alembic export worker, started by export_jobs.ExportDispatcher:
+
+        mayapy export_worker.py <shard file>
+
+    Opens the scene once and runs every job in the shard. Exits with the
+    number of jobs that failed.
+'''
+import os
+import sys
+
+
+def main(shard_file):
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    import maya.cmds as mc
+
+    from pipe.tools.mayatools.exporters.export_jobs import read_shard
+
+    scene, jobs = read_shard(shard_file)
+    mc.loadPlugin('AbcExport', quiet=True)
+    mc.file(scene, open=True, force=True)
+
+    failed = 0
+    for job in jobs:
+        print 'Exporting ' + job.outfile
+        try:
+            mc.AbcExport(j=job.job_string())
+        except Exception as e:
+            print 'Export failed for ' + str(job.name) + ': ' + str(e)
+            failed += 1
+            continue
+        if not os.path.exists(job.outfile):
+            print 'AbcExport did not write ' + job.outfile
+            failed += 1
+
+    maya.standalone.uninitialize()
+    return failed
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1]))
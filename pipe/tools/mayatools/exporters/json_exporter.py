@@ -8,9 +8,13 @@ import maya.mel as mel
 
 from pipe.gui import quick_dialogs
 from pipe.gui.select_from_list import SelectFromList
+from pipe.tools.mayatools.utils.reference_snapshot import ReferenceSnapshot
 from pipe.tools.mayatools.utils.utils import *
+from pipe.am import pipeline_io
+from pipe.am import resolution
 from pipe.am.project import Project
 from pipe.am.body import AssetType
+from pipe.am.set_layout import SetLayout
 from pipe.am.environment import Environment, Department  # , Status
 
 from PySide2 import QtCore
@@ -46,7 +50,7 @@ class JSONExporter:
                 print("SET OK")
                 element = body.get_element(Department.MODEL)
                 refsFilePath = os.path.join(Project().get_assets_dir(), element.get_cache_dir())
-                self.exportReferences(refsFilePath)
+                self.exportReferences(refsFilePath, set_name=body.get_name())
                 qd.info("JSON references written successfully.")
             else:
                 print("NOT A SET")
@@ -109,35 +113,27 @@ class JSONExporter:
         qd.info("JSON references written successfully.")
 
     def export_shot(self, filePath):
-        refsSelection = get_loaded_references()
+        snapshot = ReferenceSnapshot.take()
         props = []
         characters = []
         sets = []
 
-        for ref in refsSelection:
-            print("ref: ", ref)
-            rootNode = get_root_node_from_reference(ref)
-            body = get_body_from_reference(rootNode)
-            currRefName, currRefVerNum = extract_reference_data(ref)
+        for info in snapshot:
+            print("ref: ", info.ref)
 
-            if not body or not body.is_asset():
-                print "Asset \"{0}\" does not exist.".format(currRefName)
+            if not info.is_asset():
+                print "Asset \"{0}\" does not exist.".format(info.name)
                 continue
 
-            if body.get_type() == AssetType.PROP:
-                parent_is_set = has_parent_set(rootNode)
-                if parent_is_set:
-                    continue
-                props.append({"asset_name" : currRefName, "version_number" : int(currRefVerNum if len(currRefVerNum) > 0 else 0)})
-
-            elif body.get_type() == AssetType.CHARACTER:
-                characters.append({"asset_name" : currRefName, "version_number" : int(currRefVerNum if len(currRefVerNum) > 0 else 0)})
-
+            reference = {"asset_name" : info.name, "version_number" : info.version_number()}
+            if info.type == AssetType.CHARACTER:
+                characters.append(reference)
+            elif info.in_set:
+                continue
+            elif info.type == AssetType.PROP:
+                props.append(reference)
             else:
-                parent_is_set = has_parent_set(rootNode)
-                if parent_is_set:
-                    continue
-                sets.append({"asset_name" : currRefName, "version_number" : int(currRefVerNum if len(currRefVerNum) > 0 else 0)})
+                sets.append(reference)
 
         print "props: {0}\ncharacters: {1}\nsets: {2}".format(props, characters, sets)
 
@@ -165,32 +161,37 @@ class JSONExporter:
         self.select_from_list_dialog.submitted.connect(self.write_animated_props)
 
     # Creates a list of all reference files in the current set
-    def exportReferences(self, filePath):
-        refsSelection = get_loaded_references()
-        print("refsSelection = ", refsSelection)
+    def exportReferences(self, filePath, set_name=None, snapshot=None):
+        if snapshot is None:
+            snapshot = ReferenceSnapshot.take()
+        print("refsSelection = ", [info.ref for info in snapshot])
 
+        layout = SetLayout(set_name)
         allReferences = []
-        for ref in refsSelection:
-            rootNode = get_root_node_from_reference(ref)
-            print("\t Curr rootNode: ", rootNode)
-            propJSON = self.exportPropJSON(filePath, rootNode)
+        for info in snapshot:
+            print("\t Curr rootNode: ", info.root_node)
+            propJSON = self.exportPropJSON(filePath, info.root_node, layout=layout, body=info.body)
 
             if propJSON:
                 allReferences.append(propJSON)
 
+        # whole_set.json and the per-prop files are still read by the HDAs
         print "all References: {0}".format(allReferences)
-        jsonRefs = json.dumps(allReferences)
-        path = os.path.join(filePath, "whole_set.json")
+        pipeline_io.writefile(os.path.join(filePath, SetLayout.LEGACY_FILENAME), allReferences, indent=None)
 
-        with open(path, "w") as f:
-            f.write(jsonRefs)
-            f.close()
+        # The whole layout in one file. The assembler and publisher read this one.
+        # Written last, so it's never older than whole_set.json (see set_layout.load)
+        layout.write(filePath)
 
-    def exportPropJSON(self, filePath, rootNode, isReference=True, name="", version_number=None):  # TODO: look here for why the set json isn't created properly
-        if isReference:
+    def exportPropJSON(self, filePath, rootNode, isReference=True, name="", version_number=None, layout=None, body=None):  # TODO: look here for why the set json isn't created properly
+        if body is None and isReference:
             body = get_body_from_reference(rootNode)
-        else:
-            body = Project().get_body(name)
+        elif body is None:
+            body = resolution.get_body(name)
+
+        if not body:
+            print "{0} is not a body, skipping.".format(rootNode)
+            return None
 
         name = body.get_name()
 
@@ -219,6 +220,9 @@ class JSONExporter:
 
         print("json data: ", json_data)
 
+        if layout is not None:
+            layout.add(**json_data)
+
         # Write JSON to fill
         jsonRef = json.dumps(json_data)
         wholePath = os.path.join(filePath, os.path.join(filePath, name + "_" + str(version_number) + ".json"))
@@ -231,6 +235,7 @@ class JSONExporter:
 
         return {"asset_name" : json_data["asset_name"], "version_number" :  json_data["version_number"]}
 
+    @resolution.scoped
     def go(self, body, type):
         if type == AssetType.SHOT:
             self.confirmWriteShotReferences(body)
@@ -4,4 +4,4 @@ Houdini tools
 @author Brigham Young University
 """
 
-__all__ = ['cluster_interpolate', 'education', 'utils', 'reload_scripts']
+__all__ = ['cluster_interpolate', 'cluster_interpolate_core', 'education', 'reference_snapshot', 'utils', 'reload_scripts']
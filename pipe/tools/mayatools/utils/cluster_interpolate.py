@@ -1,15 +1,17 @@
 from PySide2 import QtWidgets
 from PySide2.QtWidgets import *
 import pymel.core as pm
+import maya.cmds as mc
 
-from array import array
 from pipe.gui.quick_dialogs import message as message_gui
 from pipe.gui.quick_dialogs import warning as warning_gui
 from pipe.gui.quick_dialogs import error as error_gui
 from pipe.tools.mayatools.utils.utils import *
+from pipe.tools.mayatools.utils import cluster_interpolate_core as core
 
 WINDOW_WIDTH = 250
 WINDOW_HEIGHT = 100
+RAMP_SAMPLES = 65
 
 class cluster_interpolate():
 
@@ -30,168 +32,168 @@ class cluster_interpolate():
 		dialog = ClusterInterpolationWindow(vert1, vert2)
 		dialog.show()
 
-	def sortVertList(self, vert1, vert2, vertList):
-		currentVert = vert1
-		result = list()
-		while currentVert != vert2:
-			# print "This is the currentVert: ", currentVert
-			connectedVerts = currentVert.connectedVertices()
-			for vert in connectedVerts:
-				if vert in vertList and vert not in result:
-					result.append(vert)
-					currentVert = vert
-		return result
+	def sortVertList(self, vert1, vert2, vertList, adjacency):
+		'''
+		Order the loop's vertex indices from vert1 to vert2 by walking the mesh's edges once.
+		'''
+		return core.order_loop(vert1, vert2, adjacency, members=vertList)
 
 	def getVertList(self, vert1, vert2):
-		currentSelection = pm.ls(selection=True)
-		loop = pm.polySelectSp(vert1, vert2, q=True, loop=True)
-		pm.select(loop)
-		# We want to do the select and ls steps because they give us a list of Mesh Vertieces in stead of list of strings
-		edge = pm.ls(selection=True)
-		edgeVerts = list()
-		for vertMesh in edge:
-			for vert in vertMesh:
-				edgeVerts.append(vert)
-		pm.select(currentSelection)
-		return sortVertList(vert1, vert2, edgeVerts)
-
-	def getClusterListForVert(self, vert, clusters=None):
-		result = []
+		'''
+		Return the indices of the vertices on the edge loop between the two vertices, in order.
+		'''
+		loop = mc.polySelectSp(str(vert1), str(vert2), q=True, loop=True)
+		edgeVerts = set()
+		for indices in core.parse_vertex_components(loop).values():
+			edgeVerts.update(indices)
+		adjacency = self.fetchTopology(vert1.node())
+		return self.sortVertList(vert1.currentItemIndex(), vert2.currentItemIndex(), edgeVerts, adjacency)
+
+	def fetchTopology(self, mesh):
+		'''
+		Get the whole mesh's vertex adjacency with one polyInfo call.
+		'''
+		return core.build_adjacency(core.parse_edges(mc.polyInfo(str(mesh), edgeToVertex=True)))
 
-		if clusters is None:
-			clusters = pm.ls(type="cluster")
+	def getClusterSet(self, cluster):
+		objectSets = cluster.listConnections(type="objectSet")
 
-		clusterCnt = len(clusters)
-
-		for index, c in enumerate(clusters):
-			objectSets = c.listConnections(type="objectSet")
-
-			if not len(objectSets) == 1:
-				results = list()
-				for objSet in objectSets:
-					if "cluster" in objSet.name():
-						results.append(objSet)
-				if not len(results) == 1:
-					error_gui("There is more than one object set tied to this cluster. That is something I didn't expect. Please let me know about it. Let's keep going though and see what happens. The list of object sets looks like this: " + str(results))
-					continue
-				else:
-					objectSet = results[0]
-			else:
-				objectSet = objectSets[0]
-
-			if vert in objectSet[0]:
-				result.append(c)
-
-			print str(index + 1) + " of " + str(clusterCnt) + " clusters processed."
-		print "Len of result: ", len(result)
-		print "Type of clusters: ", type(clusters[0])
-		print "Type of result items: ", type(result[0])
-		return result
-
-	def getClusterList(self, vertList, clusters=None, quick=False):
-		if quick:
-			quickVertList = list()
-			quickVertList.append(vertList[0])
-			endIndex = len(vertList) - 1
-			quickVertList.append(vertList[endIndex])
-			return getClusterList(quickVertList, clusters=clusters)
-		for vert in vertList:
-			clusters = getClusterListForVert(vert, clusters=clusters)
-		return clusters
-
-	def allClustersOnVert(self, vert, clusters=None):
+		if len(objectSets) == 1:
+			return objectSets[0]
+
+		results = list()
+		for objSet in objectSets:
+			if "cluster" in objSet.name():
+				results.append(objSet)
+		if not len(results) == 1:
+			error_gui("There is more than one object set tied to this cluster. That is something I didn't expect. Please let me know about it. Let's keep going though and see what happens. The list of object sets looks like this: " + str(results))
+			return None
+		return results[0]
+
+	def fetchClusterIndex(self, mesh, clusters=None):
 		'''
-		Using the percent query we really quickly get all of the clusters that affect the geo for the given vert. This greatly reduces the number of clusters we have to process for scenes that have multriple pieces of geometry.
+		Build a vertex -> clusters index for the mesh, with one set query per cluster
+		instead of one per cluster per vertex.
 		'''
 		if clusters is None:
 			clusters = pm.ls(type="cluster")
-			print len(clusters), " is the length of all the clusters. Should be about 300"
-		result = list()
-		for i, cluster in enumerate(clusters):
-			vals = pm.percent(cluster, vert, v=True, q=True)
-			if vals is not None:
-				result.append(cluster)
-				# print i, ": ", vals
-		return result
-
-	def hybridClusterList(self, vertList):
-		clusters = allClustersOnVert(vertList[0])
-		clusters = getClusterList(vertList, clusters=clusters, quick=True)
-		return clusters
+
+		meshNames = set([core.short_name(str(mesh)), core.short_name(str(mesh.getParent()))])
+		index = core.ClusterIndex([])
+		for c in clusters:
+			objectSet = self.getClusterSet(c)
+			if objectSet is None:
+				continue
+			members = core.parse_vertex_components(mc.sets(str(objectSet), q=True))
+			verts = set()
+			for node, indices in members.items():
+				if core.short_name(node) in meshNames:
+					verts.update(indices)
+			if verts:
+				index.add(str(c), verts)
+		print str(len(index.clusters)) + " of " + str(len(clusters)) + " clusters affect " + str(mesh)
+		return index
+
+	def getClusterList(self, vertList, clusterIndex, quick=False):
+		'''
+		Return the clusters on every vertex in the list. Quick only checks the two ends.
+		'''
+		if quick:
+			vertList = [vertList[0], vertList[-1]]
+		return clusterIndex.clusters_on_all(vertList)
 
 	def function(self, function, inputVal):
-		if function == "Linear":
-			return inputVal
-		if function == "Quadratic":
-			return inputVal * inputVal
 		if function == "Ramp":
 			return pm.gradientControlNoAttr( 'falloffCurve', q=True, vap=inputVal)
-			raise Exception('Not implemented')
-		else:
-			raise Exception('Not a valid function')
+		return core.falloff(function, [inputVal])[0]
 
 	def compliment(self, val):
 		return abs(val - 1)
 
-	def computeEdgeLengths(self, vertList, axis):
-		edgeLen = array('f', [0 for vert in vertList])
+	def sampleRamp(self, samples=RAMP_SAMPLES):
+		'''
+		Sample the falloff ramp once, so the ramp can be evaluated for every vertex
+		without a gradientControlNoAttr query each.
+		'''
+		positions = [i / float(samples - 1) for i in range(samples)]
+		values = [pm.gradientControlNoAttr( 'falloffCurve', q=True, vap=position) for position in positions]
+		return positions, values
 
-		vertNums = list()
+	def fetchPositions(self, mesh, loop):
+		'''
+		Get the world positions of the loop's vertices with one xform call.
+		'''
+		components = [str(mesh) + ".vtx[" + str(i) + "]" for i in loop]
+		flat = mc.xform(components, q=True, worldSpace=True, translation=True)
+		return [flat[i:i + 3] for i in range(0, len(flat), 3)]
 
-		for vert in vertList:
-			vertNums.append(vert.currentItemIndex())
+	def computeEdgeLengths(self, mesh, loop, axis):
+		'''
+		Return each vertex's distance along the loop from the first vertex, as a percent
+		of the loop's length, measured on the given axes.
+		'''
+		return core.edge_parameters(self.fetchPositions(mesh, loop), axis)
 
-		# We are going to go over each vertex and add the line length to a total to get the total length from that point to the first point in the array.
-		# We can't do just the direct distance from point 0 to point i because if the geo loops around then there might be a shorter path to point 0 that doesn't go though all of the other points in the geo. So we need to step through and makes sure we measure all of the edges.
-		# Once we have how far away point i is from point 0 we convert it to a percent of the total length from point 0 to point n and we return that list of percents
-		for i, vertNumA in enumerate(vertNums):
-			if i == 0:
-				# First point is 0 away from the first point.
-				edgeLen[0] = 0
-				continue
+	def getGeometryIndex(self, cluster, mesh):
+		'''
+		Return which weightList entry of the cluster belongs to the mesh.
+		'''
+		meshNames = set([core.short_name(str(mesh)), core.short_name(str(mesh.getParent()))])
+		geometry = mc.cluster(str(cluster), q=True, geometry=True) or []
+		indices = mc.deformer(str(cluster), q=True, geometryIndices=True) or range(len(geometry))
+		for name, index in zip(geometry, indices):
+			if core.short_name(name) in meshNames:
+				return index
+		return 0
+
+	def weightsAttr(self, cluster, geometryIndex, first, last):
+		return str(cluster) + ".weightList[" + str(geometryIndex) + "].weights[" + str(first) + ":" + str(last) + "]"
+
+	def writeWeights(self, cluster, mesh, loop, weights):
+		'''
+		Set the cluster weights of the loop's vertices, a range of consecutive vertices
+		per setAttr instead of a percent call per vertex.
+		'''
+		geometryIndex = self.getGeometryIndex(cluster, mesh)
+		runs = core.contiguous_runs(loop, [float(weight) for weight in weights])
+		for first, last, values in runs:
+			mc.setAttr(self.weightsAttr(cluster, geometryIndex, first, last), *values, size=len(values))
+		return len(runs)
 
-			preVertNum = i - 1
-			vertNumB = vertNums[preVertNum]
-			vertAName = str(vertList[0].node()) + ".vtx[" + str(vertNumA) + "]"
-			vertBName = str(vertList[0].node()) + ".vtx[" + str(vertNumB) + "]"
-			vertA = pm.ls(vertAName)[0]
-			vertB = pm.ls(vertBName)[0]
-			posA = vertA.getPosition(space="world")
-			posB = vertB.getPosition(space="world")
-			vect = posA - posB
-
-			if not "x" in axis:
-				vect[0] = 0
-			if not "y" in axis:
-				vect[1] = 0
-			if not "z" in axis:
-				vect[2] = 0
-
-			edgeLen[i] = edgeLen[i-1] + vect.length()
-
-		totalLen = edgeLen[len(edgeLen)-1]
-		for i, l in enumerate(edgeLen):
-			if totalLen == 0:
-				edgeLen[i] = 0
-			else:
-				edgeLen[i] /= totalLen
-		return edgeLen
+	def readWeights(self, cluster, mesh, loop):
+		'''
+		Get the cluster weights of the loop's vertices, in loop order.
+		'''
+		geometryIndex = self.getGeometryIndex(cluster, mesh)
+		weights = {}
+		for first, last, values in core.contiguous_runs(loop):
+			read = mc.getAttr(self.weightsAttr(cluster, geometryIndex, first, last))
+			if not isinstance(read, (list, tuple)):
+				read = [read]
+			for offset, weight in enumerate(read):
+				weights[first + offset] = weight
+		return [weights.get(i) for i in loop]
 
 
 class ClusterInterpolationWindow():
 
 	def __init__(self, vert1, vert2, parent=maya_main_window()):
+		self.tool = cluster_interpolate()
 		self.vert1 = vert1
 		self.vert2 = vert2
-		self.vertList = getVertList(vert1, vert2)
+		self.mesh = vert1.node()
+		self.loop = self.tool.getVertList(vert1, vert2)
+		self.clusterIndex = self.tool.fetchClusterIndex(self.mesh)
 		self.create_layout()
 		self.rampName = ""
 
 	def interpolate(self):
-		clust = pm.ls(self.clusterMenu.getValue())[0]
-		vertList = self.vertList
-		if not "Point Number" == self.interpolationAxis.getValue():
-			edgeLengths = computeEdgeLengths(vertList, self.interpolationAxis.getValue())
+		clust = self.clusterMenu.getValue()
+		axis = self.interpolationAxis.getValue()
+		if "Point Number" == axis:
+			parameters = core.point_parameters(len(self.loop))
+		else:
+			parameters = self.tool.computeEdgeLengths(self.mesh, self.loop, axis)
 
 		minWeight = self.minWeight.getText()
 		maxWeight = self.maxWeight.getText()
@@ -200,32 +202,24 @@ class ClusterInterpolationWindow():
 			val1 = float(minWeight)
 			val2 = float(maxWeight)
 		else:
-			val1 = pm.percent(clust, self.vert1, v=True, q=True)[0]
+			val1 = pm.percent(str(clust), str(self.vert1), v=True, q=True)[0]
 			val2 = pm.percent(str(clust), str(self.vert2), v=True, q=True)[0]
 
-		print "START INTERPOLATING THIS VERT LIST: " + str(vertList)
-		isReversed = self.invert.getValue() == 'invert'
-		if isReversed:
-			temp = val1
-			val1 = val2
-			val2 = temp
-			print"Here is the updated one"
-		for i, vert in enumerate(vertList):
-			print "We are working on the " + str(i) + "th vert in the list."
-			if "Point Number" == self.interpolationAxis.getValue():
-				percent = i / float((len(vertList) - 1))
-			else:
-				percent = edgeLengths[i]
-			ratio = function(self.functionMenu.getValue(), percent)
-			value = val1 * compliment(ratio) + val2 * ratio
-			oldValue = pm.percent(str(clust), str(vert), v=True, q=True)
-			print "vert " + str(vert) + " is getting the value " + str(value) + ". Old value was: " + str(oldValue)
-			print "we are assigning it to this cluster: " + str(clust)
-			pm.percent(clust, vert, v=value)
-			actualValue = pm.percent(str(clust), str(vert), v=True, q=True)[0]
-			print "actual value recieved: " + str(actualValue)
-		print "FINSIH"
-		print ""
+		if self.invert.getValue() == 'Yes':
+			val1, val2 = val2, val1
+
+		function = self.functionMenu.getValue()
+		ramp = self.tool.sampleRamp() if function == "Ramp" else None
+		weights = core.interpolate_weights(parameters, val1, val2, function, ramp)
+
+		writes = self.tool.writeWeights(clust, self.mesh, self.loop, weights)
+		print "Interpolated " + str(len(self.loop)) + " vertices on " + str(clust) + " with " + str(writes) + " weight writes."
+
+		if self.verify.getValue() == 'Yes':
+			actual = self.tool.readWeights(clust, self.mesh, self.loop)
+			off = [i for i, (expected, got) in zip(self.loop, zip(weights, actual)) if got is None or abs(expected - got) > 1e-4]
+			if off:
+				warning_gui(str(len(off)) + " vertices didn't get the weight they were given, e.g. vtx[" + str(off[0]) + "]. Are they members of " + str(clust) + "?")
 
 	def create_layout(self):
 		self.win = pm.window(title="Cluster Weight Interpolation")
@@ -241,7 +235,7 @@ class ClusterInterpolationWindow():
 		#Set up cluster Menu
 		pm.text(label='Cluster')
 		self.clusterMenu = pm.optionMenu()
-		clusterList = hybridClusterList(self.vertList)
+		clusterList = self.tool.getClusterList(self.loop, self.clusterIndex, quick=True)
 		for c in clusterList:
 			pm.menuItem(label=str(c))
 
@@ -262,8 +256,13 @@ class ClusterInterpolationWindow():
 
 		pm.text(label='Invert')
 		self.invert = pm.optionMenu()
+		pm.menuItem(label='No')
 		pm.menuItem(label='Yes')
+
+		pm.text(label='Verify Weights')
+		self.verify = pm.optionMenu()
 		pm.menuItem(label='No')
+		pm.menuItem(label='Yes')
 
 		#Set up Axis Menu
 		pm.text(label='Axies for Dist Measurement')
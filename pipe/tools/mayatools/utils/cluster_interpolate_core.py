@@ -0,0 +1,250 @@
+'''
+	Topology, cluster lookups and weight math for cluster_interpolate. Works on
+	plain vertex indices, adjacency lists, membership sets and positions that
+	cluster_interpolate fetches from Maya in bulk. This module must not import
+	Maya so it can be tested and timed outside of it.
+
+	The weight math uses NumPy when it's there and plain lists when it isn't
+	(older mayapy builds don't ship it).
+'''
+import math
+import re
+from collections import deque
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+FUNCTIONS = ("Ramp", "Linear", "Quadratic")
+
+# "EDGE      12:     4     5  Hard" from polyInfo -edgeToVertex
+EDGE_PATTERN = re.compile(r"EDGE\s+(\d+):\s+(\d+)\s+(\d+)")
+# "|grp|pCubeShape1.vtx[3:7]" or "pCube1.vtx[3]"
+VERTEX_COMPONENT_PATTERN = re.compile(r"^(?P<node>[^.]+)\.vtx\[(?P<start>\d+)(?::(?P<end>\d+))?\]$")
+
+def parse_edges(poly_info):
+	'''
+		return the (vertex, vertex) pairs of the edges in polyInfo -edgeToVertex output
+	'''
+	edges = []
+	for line in poly_info:
+		match = EDGE_PATTERN.search(line)
+		if match is not None:
+			edges.append((int(match.group(2)), int(match.group(3))))
+	return edges
+
+def build_adjacency(edges):
+	'''
+		return a dict of vertex -> list of connected vertices
+	'''
+	adjacency = {}
+	for a, b in edges:
+		adjacency.setdefault(a, []).append(b)
+		adjacency.setdefault(b, []).append(a)
+	return adjacency
+
+def parse_vertex_components(components):
+	'''
+		return {node: set of vertex indices} for compact component strings like
+		the ones sets -q and polySelectSp -q return. Other components are skipped.
+	'''
+	result = {}
+	for component in components or []:
+		match = VERTEX_COMPONENT_PATTERN.match(str(component))
+		if match is None:
+			continue
+		start = int(match.group('start'))
+		end = int(match.group('end')) if match.group('end') is not None else start
+		result.setdefault(match.group('node'), set()).update(range(start, end + 1))
+	return result
+
+def short_name(node):
+	return node.split('|')[-1].split(':')[-1]
+
+def order_loop(start, end, adjacency, members=None):
+	'''
+		return the vertices from start to end (both included) in the order they
+		are walked along the edges, staying on members if given. This is a
+		breadth first search, so it takes one step per edge and finds the
+		shortest way around a closed loop. Raises ValueError if end can't be
+		reached from start.
+	'''
+	if members is not None:
+		members = set(members)
+		members.update((start, end))
+
+	previous = {start: None}
+	queue = deque([start])
+	while queue:
+		vertex = queue.popleft()
+		if vertex == end:
+			break
+		for neighbor in adjacency.get(vertex, ()):
+			if neighbor in previous or (members is not None and neighbor not in members):
+				continue
+			previous[neighbor] = vertex
+			queue.append(neighbor)
+
+	if end not in previous:
+		raise ValueError("vertex {0} can't be reached from vertex {1} along the loop".format(end, start))
+
+	result = []
+	vertex = end
+	while vertex is not None:
+		result.append(vertex)
+		vertex = previous[vertex]
+	result.reverse()
+	return result
+
+
+class ClusterIndex:
+	'''
+		Vertex -> clusters index, built once from each cluster's member vertices
+
+		index = ClusterIndex([('cluster1', [0, 1, 2]), ('cluster2', [2, 3])])
+		index.clusters_on(2) -> ['cluster1', 'cluster2']
+	'''
+
+	def __init__(self, memberships):
+		self.clusters = []
+		self.members = {}
+		self._by_vertex = {}
+		for cluster, vertices in memberships:
+			self.add(cluster, vertices)
+
+	def add(self, cluster, vertices):
+		if cluster in self.members:
+			raise ValueError("cluster {0} was added twice".format(cluster))
+		self.clusters.append(cluster)
+		self.members[cluster] = set(vertices)
+		for vertex in self.members[cluster]:
+			self._by_vertex.setdefault(vertex, []).append(cluster)
+
+	def clusters_on(self, vertex):
+		'''
+			return the clusters the vertex is a member of, in the order they were added
+		'''
+		return list(self._by_vertex.get(vertex, ()))
+
+	def clusters_on_all(self, vertices):
+		'''
+			return the clusters every one of the vertices is a member of
+		'''
+		vertices = list(vertices)
+		if not vertices:
+			return []
+		result = self.clusters_on(vertices[0])
+		for vertex in vertices[1:]:
+			on_vertex = set(self._by_vertex.get(vertex, ()))
+			result = [cluster for cluster in result if cluster in on_vertex]
+			if not result:
+				break
+		return result
+
+	def clusters_on_any(self, vertices):
+		found = set()
+		for vertex in vertices:
+			found.update(self._by_vertex.get(vertex, ()))
+		return [cluster for cluster in self.clusters if cluster in found]
+
+
+def point_parameters(count):
+	'''
+		return count parameters evenly spaced from 0 to 1, one per point
+	'''
+	if count < 2:
+		return [0.0] * count
+	if np is not None:
+		return np.linspace(0.0, 1.0, count)
+	return [i / float(count - 1) for i in range(count)]
+
+def edge_parameters(positions, axis="xyz"):
+	'''
+		return each point's distance from the first point along the loop, divided
+		by the loop's length. Only the given axes are measured. Distances are summed
+		edge by edge, since a loop can curve back closer to where it started.
+		positions -- (N,3) world positions in loop order
+	'''
+	mask = [1.0 if name in axis else 0.0 for name in "xyz"]
+	if np is not None:
+		positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3) * mask
+		if len(positions) == 0:
+			return np.zeros(0)
+		lengths = np.concatenate(([0.0], np.cumsum(np.sqrt((np.diff(positions, axis=0) ** 2).sum(axis=1)))))
+		if lengths[-1] == 0:
+			return np.zeros(len(lengths))
+		return lengths / lengths[-1]
+
+	lengths = [0.0] * len(positions)
+	for i in range(1, len(positions)):
+		step = sum(((positions[i][k] - positions[i - 1][k]) * mask[k]) ** 2 for k in range(3))
+		lengths[i] = lengths[i - 1] + math.sqrt(step)
+	if not lengths or lengths[-1] == 0:
+		return [0.0] * len(lengths)
+	return [length / lengths[-1] for length in lengths]
+
+def falloff(function, parameters, ramp=None):
+	'''
+		return the falloff function evaluated at every parameter
+		ramp -- (positions, values) samples of the ramp, needed for "Ramp"
+	'''
+	if function not in FUNCTIONS:
+		raise ValueError('Not a valid function: ' + str(function))
+	if function == "Ramp" and ramp is None:
+		raise ValueError('The Ramp function needs ramp samples')
+
+	if np is not None:
+		parameters = np.asarray(parameters, dtype=np.float64)
+		if function == "Linear":
+			return parameters
+		if function == "Quadratic":
+			return parameters * parameters
+		return np.interp(parameters, ramp[0], ramp[1])
+
+	if function == "Linear":
+		return list(parameters)
+	if function == "Quadratic":
+		return [parameter * parameter for parameter in parameters]
+	return [_interp(parameter, ramp[0], ramp[1]) for parameter in parameters]
+
+def _interp(x, xs, ys):
+	if x <= xs[0]:
+		return ys[0]
+	for i in range(1, len(xs)):
+		if x <= xs[i]:
+			span = xs[i] - xs[i - 1]
+			t = (x - xs[i - 1]) / span if span else 0.0
+			return ys[i - 1] + (ys[i] - ys[i - 1]) * t
+	return ys[-1]
+
+def interpolate_weights(parameters, start_weight, end_weight, function, ramp=None):
+	'''
+		return the weight for every parameter, blending from start_weight at 0 to
+		end_weight at 1 through the falloff function
+	'''
+	ratios = falloff(function, parameters, ramp)
+	if np is not None:
+		return start_weight * np.abs(ratios - 1) + end_weight * ratios
+	return [start_weight * abs(ratio - 1) + end_weight * ratio for ratio in ratios]
+
+def contiguous_runs(indices, values=None):
+	'''
+		group vertex indices into runs of consecutive indices, so a multi attribute
+		can be read or written a range at a time. Returns (first, last, values)
+		triples, sorted by index, with the values of the indices in each run.
+	'''
+	if values is None:
+		values = [None] * len(indices)
+	pairs = sorted(zip(indices, values))
+	runs = []
+	for index, value in pairs:
+		if runs and index == runs[-1][1] + 1:
+			runs[-1][1] = index
+			runs[-1][2].append(value)
+		elif runs and index == runs[-1][1]:
+			# The same vertex twice: keep one value
+			runs[-1][2][-1] = value
+		else:
+			runs.append([index, index, [value]])
+	return [tuple(run) for run in runs]
@@ -0,0 +1,150 @@
+'''
+    A snapshot of the loaded references in the scene, taken once per export.
+    Each reference is queried once for its file and root node, and bodies are
+    looked up through one resolution context (so one Project), instead of
+    every exporter helper asking Maya and building a Project per reference.
+
+    snapshot = ReferenceSnapshot.take()
+    for info in snapshot.props():
+        print info.name, info.version, info.root_node, info.in_set
+'''
+import pymel.core as pm
+
+from pipe.am import resolution
+from pipe.am.body import AssetType
+
+'''
+    Return the (asset name, copy number) of a reference file path. The asset
+    name is the directory after "assets", and the copy number is the {n} Maya
+    adds to the path of a file that is referenced more than once ('' if it
+    isn't there).
+'''
+def parse_reference_path(path):
+    path = str(path)
+    name = None
+    pathItems = path.split("/")
+    for i in range(len(pathItems)):
+        if pathItems[i - 1] == "assets":
+            name = pathItems[i]
+            break
+
+    start = path.find('{')
+    end = path.find('}')
+    if start == -1 or end == -1:
+        version = ''
+    else:
+        version = path[start+1:end]
+
+    return name, version
+
+
+class ReferenceInfo:
+
+    def __init__(self, ref, file_path, root_node):
+        self.ref = ref
+        self.file_path = file_path
+        self.root_node = root_node
+        self.name, self.version = parse_reference_path(file_path)
+        self.body = None
+        self.type = None
+        self.in_set = False
+
+    def __repr__(self):
+        return 'ReferenceInfo({0}, {1}, {2})'.format(self.name, self.version or '0', self.type)
+
+    def version_number(self):
+        return int(self.version) if len(self.version) > 0 else 0
+
+    def is_asset(self):
+        return self.body is not None and self.body.is_asset()
+
+    def namespace(self):
+        return str(self.ref.associatedNamespace(baseName=True))
+
+
+class ReferenceSnapshot:
+
+    def __init__(self, infos):
+        self.infos = infos
+        self._by_ref = dict((str(info.ref), info) for info in infos)
+        self._by_root = dict((str(info.root_node), info) for info in infos if info.root_node is not None)
+
+    def __iter__(self):
+        return iter(self.infos)
+
+    def __len__(self):
+        return len(self.infos)
+
+    '''
+        Query every reference once. references defaults to the loaded references.
+    '''
+    @classmethod
+    def take(cls, references=None):
+        if references is None:
+            # Imported here, utils imports the exporters that use this module
+            from pipe.tools.mayatools.utils.utils import get_loaded_references
+            references = get_loaded_references()
+
+        with resolution.ensure('reference snapshot', verbose=False):
+            infos = []
+            for ref in references:
+                file_path = pm.referenceQuery(unicode(ref), filename=True)
+                nodes = pm.referenceQuery(unicode(file_path), nodes=True)
+                root_node = pm.ls(nodes[0])[0] if nodes else None
+                info = ReferenceInfo(ref, file_path, root_node)
+                if info.name is not None:
+                    info.body = resolution.get_body(info.name)
+                if info.body is not None:
+                    info.type = info.body.get_type()
+                infos.append(info)
+
+            snapshot = cls(infos)
+            for info in infos:
+                info.in_set = snapshot._parent_is_set(info)
+        return snapshot
+
+    def get(self, ref):
+        return self._by_ref.get(str(ref))
+
+    def by_root_node(self, root_node):
+        return self._by_root.get(str(root_node))
+
+    def of_type(self, asset_type):
+        return [info for info in self.infos if info.is_asset() and info.type == asset_type]
+
+    def props(self):
+        return self.of_type(AssetType.PROP)
+
+    def characters(self):
+        return self.of_type(AssetType.CHARACTER)
+
+    def sets(self):
+        return self.of_type(AssetType.SET)
+
+    '''
+        Whether any node above the reference's root belongs to a set. Bodies of
+        the ancestors are cached in the resolution context, so references that
+        share parents only look them up once.
+    '''
+    def _parent_is_set(self, info):
+        if info.root_node is None:
+            return False
+
+        parent_node = info.root_node.getParent()
+        while parent_node is not None:
+            parent_body = resolution.memo('reference_node_body', str(parent_node), lambda: self._body_of_node(parent_node))
+            if parent_body is not None and parent_body.is_asset() and parent_body.get_type() == AssetType.SET:
+                return True
+            parent_node = parent_node.getParent()
+        return False
+
+    def _body_of_node(self, node):
+        parent_info = self.by_root_node(node)
+        if parent_info is not None:
+            return parent_info.body
+        try:
+            file_path = pm.referenceQuery(unicode(node), filename=True)
+        except RuntimeError:
+            return None
+        name = parse_reference_path(file_path)[0]
+        return resolution.get_body(name) if name is not None else None
@@ -2,6 +2,7 @@ from pipe.tools.mayatools import *
 from pipe.tools.mayatools.cloners import cloner as maya_cloner
 from pipe.tools.mayatools.creators import creator as maya_creator
 from pipe.tools.mayatools.publishers import publisher as maya_publisher
+from pipe.tools.mayatools.utils import reference_snapshot as reference_snapshot
 from pipe.tools.mayatools.utils import utils as maya_utils
 from pipe.tools.mayatools.exporters import alembic_exporter as alembic_exporter
 from pipe.tools.mayatools.exporters import json_exporter as json_exporter
@@ -9,6 +10,7 @@ from pipe.tools.mayatools.importers import referencer as maya_referencer
 from pipe.tools.mayatools.importers import reference_importer as reference_importer
 from pipe.tools.mayatools.exporters import tagger as maya_tagger
 from pipe.tools.mayatools.submitters import playblaster as maya_playblaster
+from pipe.tools.tool import get_registry
 
 
 class ReloadScripts:
@@ -18,6 +20,7 @@ class ReloadScripts:
         reload(maya_creator)
         reload(maya_cloner)
         reload(maya_publisher)
+        reload(reference_snapshot)
         reload(maya_utils)
         reload(alembic_exporter)
         reload(json_exporter)
@@ -25,3 +28,6 @@ class ReloadScripts:
         reload(reference_importer)
         reload(maya_tagger)
         reload(maya_playblaster)
+
+        # Cached tool callables point at the old modules
+        get_registry().clear()
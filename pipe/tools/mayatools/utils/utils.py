@@ -10,7 +10,9 @@ from pipe.am.environment import Environment
 from pipe.am.project import Project
 from pipe.am.element import Element
 from pipe.am.body import Body, AssetType
+from pipe.am import resolution
 import pipe.gui.quick_dialogs as qd
+from pipe.tools.mayatools.utils.reference_snapshot import ReferenceSnapshot, parse_reference_path
 from pipe.tools.mayatools.exporters.alembic_exporter import AlembicExporter
 from pipe.tools.mayatools.exporters.json_exporter import JSONExporter
 
@@ -189,27 +191,15 @@ def get_loaded_references():
     Helper for JSONExporter
 '''
 def ref_path_to_ref_name(path):
-    pathItems = str(path).split("/")
-
-    for i in range(len(pathItems)):
-        if pathItems[i - 1] == "assets":
-            return pathItems[i]
+    return parse_reference_path(path)[0]
 
 '''
-    Helper for get_body_from_reference()
+    Helper for get_body_from_reference(). Exporters that look at every
+    reference should take a ReferenceSnapshot instead.
 '''
 def extract_reference_data(ref):
     refPath = pm.referenceQuery(unicode(ref), filename=True)
-    refName = ref_path_to_ref_name(refPath)
-    start = refPath.find('{')
-    end = refPath.find('}')
-
-    if start == -1 or end == -1:
-        vernum = ''
-    else:
-        vernum = refPath[start+1:end]
-
-    return refName, vernum
+    return parse_reference_path(refPath)
 
 '''
     Helper for JSONExporter
@@ -265,7 +255,7 @@ def get_anchor_points(mesh):
 '''
 def get_body_from_reference(ref):
     try:
-        body = Project().get_body(extract_reference_data(ref)[0])
+        body = resolution.get_body(extract_reference_data(ref)[0])
         return body
     except:
         print(str(ref) + " is not a body")
@@ -285,7 +275,6 @@ def get_root_node_from_reference(ref):
     Helper for JSONExporter
 '''
 def has_parent_set(rootNode):
-    project = Project()
     parent_is_set = False
     parent_node = rootNode.getParent()
 
@@ -4,10 +4,18 @@
 '''
 import os
 import sys
+import copy
 import json
+import time
+import Queue
+import getpass
+import tempfile
 import importlib
+import threading
 import tools
 import traceback
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 class ToolError(Exception):
     def __init__(self, *args):
@@ -28,19 +36,287 @@ class NotSufficientFieldsError(ToolError):
     def __init__(self, *args):
         super(NotSufficientFieldsError, self).__init__(*args)
 
+class ToolRegistry:
+    '''
+        Every tool JSON file under pipe/tools compiled into one manifest. The
+        manifest is kept in memory for the session and mirrored to disk, so a
+        new session only re-parses files whose mtime changed. Method callables
+        are imported the first time they are needed and cached after that.
+    '''
+
+    pre = "pipe.tools."
+    MANIFEST_ENV = "DCCPIPE_TOOL_MANIFEST"
+    MANIFEST_VERSION = 1
+    PROGRAM_FILENAME = "_program.json"
+
+    def __init__(self, tools_dir=None, manifest_path=None):
+        if tools_dir is None:
+            tools_dir = os.path.dirname(os.path.realpath(__file__))
+        if manifest_path is None:
+            manifest_path = os.getenv(self.MANIFEST_ENV)
+        if manifest_path is None:
+            manifest_path = os.path.join(tempfile.gettempdir(), "dccpipe_tools_{0}.json".format(getpass.getuser()))
+
+        self.tools_dir = tools_dir
+        self.manifest_path = manifest_path
+
+        # tool path -> {"file", "mtime", "data"} or {"file", "mtime", "error"}
+        self._entries = {}
+        # program name -> {"file", "mtime", "tools"}
+        self._programs = {}
+        self._callables = {}
+        self._modules = {}
+        self._tools = {}
+        self._lock = threading.RLock()
+
+        self._load_manifest()
+
+    # The file a dotted tool path like "houtools.assembler.assembler" points to
+    def tool_file(self, tool_path):
+        return os.path.join(self.tools_dir, *tool_path.split(".")) + ".json"
+
+    def tool_path(self, filepath):
+        relpath = os.path.relpath(os.path.splitext(filepath)[0], self.tools_dir)
+        return ".".join(relpath.split(os.sep))
+
+    # Parse every tool file that is missing from the manifest or out of date
+    def compile(self):
+        with self._lock:
+            changed = False
+            for dirpath, dirnames, filenames in os.walk(self.tools_dir):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                for filename in filenames:
+                    if not filename.endswith(".json"):
+                        continue
+                    filepath = os.path.join(dirpath, filename)
+                    if filename == self.PROGRAM_FILENAME:
+                        program = self.tool_path(dirpath + ".json")
+                        changed = self._refresh_program(program, filepath) or changed
+                    else:
+                        changed = self._refresh_entry(self.tool_path(filepath), filepath, required=False) or changed
+            if changed:
+                self._save_manifest()
+
+    # Return a private copy of the parsed JSON for the given tool
+    def definition(self, tool_path):
+        with self._lock:
+            filepath = self.tool_file(tool_path)
+            if self._refresh_entry(tool_path, filepath, required=True):
+                self._save_manifest()
+            entry = self._entries[tool_path]
+
+        if "error" in entry:
+            raise MalformedToolFileError(filepath, ": ", entry["error"])
+        return copy.deepcopy(entry["data"])
+
+    def list_tools(self):
+        with self._lock:
+            self.compile()
+            return sorted(path for path, entry in self._entries.items() if "data" in entry)
+
+    # The tool list from <program>/_program.json, e.g. list_program_tools("houtools")
+    def list_program_tools(self, program):
+        with self._lock:
+            filepath = os.path.join(self.tools_dir, program, self.PROGRAM_FILENAME)
+            if self._refresh_program(program, filepath):
+                self._save_manifest()
+            entry = self._programs.get(program)
+            return list(entry["tools"]) if entry is not None else []
+
+    # Load the tools a program lists so its menu and shelf tools start warm.
+    # Listed names without a valid tool file are skipped.
+    def warm_program(self, program, gui=False):
+        tools = []
+        for name in self.list_program_tools(program):
+            tool_path = self.find(name)
+            if tool_path is None:
+                continue
+            try:
+                tools.append(self.get_tool(tool_path, gui=gui))
+            except (ToolError, IOError) as e:
+                print "Could not load tool {0}: {1}".format(tool_path, e)
+        return tools
+
+    # Map the short names used in _program.json ("houtools.cloner") onto tool files
+    def find(self, name):
+        if os.path.exists(self.tool_file(name)):
+            return name
+
+        self.compile()
+        last = name.split(".")[-1]
+        if name + "." + last in self._entries:
+            return name + "." + last
+
+        first = name.split(".")[0]
+        matches = [path for path in self._entries if path.startswith(first + ".") and path.endswith("." + last)]
+        if len(matches) == 1:
+            return matches[0]
+        return None
+
+    # Import a module once for the session
+    def load_module(self, module_name):
+        module = self._modules.get(module_name)
+        if module is None:
+            module = sys.modules.get(module_name)
+            if module is None:
+                module = importlib.import_module(module_name)
+            self._modules[module_name] = module
+        return module
+
+    # Resolve a method callable once for the session
+    def resolve(self, module_name, method_name):
+        key = (module_name, method_name)
+        method_call = self._callables.get(key)
+        if method_call is None:
+            method_call = getattr(self.load_module(module_name), method_name)
+            self._callables[key] = method_call
+        return method_call
+
+    # A warm Tool instance, reset to its freshly loaded state
+    def get_tool(self, tool_path, gui=False):
+        with self._lock:
+            if self._refresh_entry(tool_path, self.tool_file(tool_path), required=True):
+                self._save_manifest()
+
+            key = (tool_path, gui)
+            tool = self._tools.get(key)
+            if tool is None:
+                tool = Tool(tool_path, gui=gui, registry=self)
+                self._tools[key] = tool
+            else:
+                tool.reset()
+            return tool
+
+    def clear(self):
+        with self._lock:
+            self._callables.clear()
+            self._modules.clear()
+            self._tools.clear()
+
+    def _refresh_entry(self, tool_path, filepath, required):
+        # Stat is all a warm lookup costs. Only re-parse when the file changed.
+        try:
+            mtime = os.stat(filepath).st_mtime
+        except OSError:
+            if required:
+                raise IOError("No such tool file: " + filepath)
+            return False
+
+        entry = self._entries.get(tool_path)
+        if entry is not None and entry["mtime"] == mtime:
+            return False
+
+        entry = {"file": filepath, "mtime": mtime}
+        try:
+            with open(filepath) as f:
+                data = json.load(f, strict=False)
+            if not isinstance(data, dict) or not isinstance(data.get("methods"), list):
+                raise ValueError("no \"methods\" list")
+            entry["data"] = data
+        except ValueError as e:
+            # Not every json under pipe/tools is a tool (shelf.json, etc.)
+            entry["error"] = str(e)
+
+        self._entries[tool_path] = entry
+        # Warm instances of a tool that changed on disk are stale
+        for key in [key for key in self._tools if key[0] == tool_path]:
+            del self._tools[key]
+        return True
+
+    def _refresh_program(self, program, filepath):
+        try:
+            mtime = os.stat(filepath).st_mtime
+        except OSError:
+            # The program has no tool list (any more)
+            return self._programs.pop(program, None) is not None
+
+        entry = self._programs.get(program)
+        if entry is not None and entry["mtime"] == mtime:
+            return False
+
+        # _program.json files carry multi-line comments, so parse leniently
+        entry = {"file": filepath, "mtime": mtime, "tools": []}
+        try:
+            with open(filepath) as f:
+                data = json.load(f, strict=False)
+            entry["tools"] = data.get("tools", [])
+        except ValueError as e:
+            entry["error"] = str(e)
+        self._programs[program] = entry
+        return True
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+
+        if manifest.get("version") != self.MANIFEST_VERSION or manifest.get("tools_dir") != self.tools_dir:
+            return
+        self._entries = manifest.get("tools", {})
+        self._programs = manifest.get("programs", {})
+
+    def _save_manifest(self):
+        manifest = {
+            "version": self.MANIFEST_VERSION,
+            "tools_dir": self.tools_dir,
+            "tools": self._entries,
+            "programs": self._programs
+        }
+        tmp_path = self.manifest_path + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f)
+            os.rename(tmp_path, self.manifest_path)
+        except (IOError, OSError) as e:
+            print "Could not write tool manifest {0}: {1}".format(self.manifest_path, e)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ToolRegistry()
+        return _registry
+
+# Shelf buttons should use this so the tool stays warm for the whole DCC session
+def get_tool(tool_path, gui=False):
+    return get_registry().get_tool(tool_path, gui=gui)
+
+
+# Runs a method off the main thread and hands the outcome back to the scheduler
+def _call_in_background(index, method_call, args, kwargs, finished):
+    start = time.time()
+    try:
+        results = method_call(*args, **kwargs)
+        finished.put((index, results, None, time.time() - start))
+    except Exception:
+        finished.put((index, None, sys.exc_info(), time.time() - start))
+
+
 class Tool:
 
     pre = "pipe.tools."
-    def __init__(self, tool_path, gui=False):
-        # Load the tool as an object
-        pwd = os.path.dirname(os.path.realpath(__file__))
-        tool_path = os.path.join(pwd, *tool_path.split(".")) + ".json"
-        with open(tool_path) as f:
-            tool_json = json.load(f)
-
-        # Update this object's fields with the loaded json dict
+    # How many thread safe methods may run at once. Tool files can override this.
+    max_workers = 4
+
+    def __init__(self, tool_path, gui=False, registry=None, max_workers=None):
+        # Load the tool as an object. The registry only re-parses the json if it changed.
+        self.registry = registry if registry is not None else get_registry()
+        tool_json = self.registry.definition(tool_path)
+        self.tool_path = tool_path
+
+        # Update this object's fields with the loaded json dict. A run may change
+        # the lists and dicts in place, so keep a pristine copy for reset().
+        self._tool_json = copy.deepcopy(tool_json)
         self.__dict__.update(tool_json)
         self.gui = gui
+        if max_workers is not None:
+            self.max_workers = max_workers
 
         # Create a QApplication
         if self.gui:
@@ -53,25 +329,22 @@ class Tool:
             except:
                 print "QApplication already loaded, using pre-existing"
 
-        # Keep track of all modules that are loaded so we can check them fast
-        self.loaded_modules = {}
-        for method in self.methods:
-            module_name = self.pre + method["module"]
-            self.loaded_modules[module_name] = module_name in sys.modules
+        # Remember the freshly loaded state so warm instances can be reused
+        self._defaults = dict(self.__dict__)
 
         print "Loaded {0}".format(self.name)
 
+    # Drop everything a previous run() added so the instance can be run again
+    def reset(self):
+        defaults = self._defaults
+        self.__dict__.clear()
+        self.__dict__.update(defaults)
+        self.__dict__.update(copy.deepcopy(self._tool_json))
+        self._defaults = defaults
+
     def run(self, **kwargs):
         try:
-            # Update this object with the new arguments
-            self.__dict__.update(kwargs)
-
-            # Run all methods. If one fails, it will throw an exception
-            for method in self.methods:
-                if self.must_run(method) and self.can_run(method):
-                    self.call(method)
-                    if self.cancelled:
-                        break
+            self.execute(**kwargs)
 
         except Exception as e:
             # Display error and details
@@ -81,11 +354,117 @@ class Tool:
             details += str(traceback.format_exc())
             self.display_error(message, details)
 
-    # Load the module, call the method
-    def call(self, method):
-        print "calling {0}\n".format(method["name"])
-        method_call = getattr(sys.modules[self.pre + method["module"]], method["name"])
+    # Like run(), but lets exceptions through to the caller
+    def execute(self, **kwargs):
+        # Update this object with the new arguments
+        self.__dict__.update(kwargs)
+        self.cancelled = False
+        self.timings = OrderedDict()
+
+        methods = self.methods
+        depends_on = self.dependency_graph()
+        pending = range(len(methods))
+        done = set()
+        running = set()
+        finished = Queue.Queue()
+        failure = None
+        pool = None
 
+        try:
+            while pending or running:
+                # Stop starting methods once one failed or the user cancelled,
+                # but let the ones already running finish
+                if failure is not None or self.cancelled:
+                    pending = []
+
+                ready = [i for i in pending if depends_on[i] <= done]
+                if ready:
+                    index = ready[0]
+                    pending.remove(index)
+                    method = methods[index]
+                    try:
+                        if not self.must_run(method) or not self.can_run(method):
+                            done.add(index)
+                            continue
+
+                        # Nothing to overlap with, so don't bother with a thread
+                        alone = len(ready) == 1 and not running
+                        if alone or self.max_workers <= 1 or self.on_main_thread(method):
+                            start = time.time()
+                            self.call(method)
+                            self.timings[method["name"]] = time.time() - start
+                            done.add(index)
+                            continue
+
+                        if pool is None:
+                            pool = ThreadPool(self.max_workers)
+                        print "calling {0} in the background\n".format(method["name"])
+                        method_call = self.registry.resolve(self.pre + method["module"], method["name"])
+                        args, kwargs = self.arguments(method)
+                        pool.apply_async(_call_in_background, (index, method_call, args, kwargs, finished))
+                        running.add(index)
+                    except Exception:
+                        if failure is None:
+                            failure = sys.exc_info()
+                    continue
+
+                if not running:
+                    break
+
+                # Wait for a background method, then hand its results to the tool
+                index, results, exc_info, elapsed = finished.get()
+                running.remove(index)
+                self.timings[methods[index]["name"]] = elapsed
+                if exc_info is not None:
+                    if failure is None:
+                        failure = exc_info
+                    continue
+                try:
+                    self.store_results(methods[index], results)
+                    done.add(index)
+                except Exception:
+                    if failure is None:
+                        failure = sys.exc_info()
+        finally:
+            if pool is not None:
+                pool.close()
+
+        self.report_timings()
+        if failure is not None:
+            raise failure[0], failure[1], failure[2]
+
+    # Method indices each method has to wait for. A method waits for earlier
+    # methods that provide what it reads, read what it provides, or provide the
+    # same fields. Prompts keep their order, and everything declared after a
+    # prompt waits for it since the user may cancel there.
+    def dependency_graph(self):
+        methods = self.methods
+        reads = []
+        writes = []
+        depends_on = []
+        last_prompt = None
+        for i, method in enumerate(methods):
+            reads.append(set(method.get("needs", [])) | set(o for o in method.get("optional", []) if o is not None))
+            writes.append(set(method.get("provides", [])) | set(method.get("conditional", [])))
+
+            waits = set()
+            for j in range(i):
+                if reads[i] & writes[j] or writes[i] & reads[j] or writes[i] & writes[j]:
+                    waits.add(j)
+            if last_prompt is not None:
+                waits.add(last_prompt)
+            if method.get("prompt"):
+                last_prompt = i
+            depends_on.append(waits)
+        return depends_on
+
+    # Methods run on the main thread unless the tool file marks them
+    # "thread_safe": true, since most call hou, maya.cmds or pymel, which must
+    # not be called from other threads. Prompts need the gui thread regardless.
+    def on_main_thread(self, method):
+        return bool(method.get("prompt") or not method.get("thread_safe"))
+
+    def arguments(self, method):
         args = ()
         if "needs" in method:
             for needed in method["needs"]:
@@ -94,24 +473,45 @@ class Tool:
         kwargs = {}
         if "optional" in method:
             for option in method["optional"]:
-                if option is not None:
+                # Optional fields may never have been provided (a "conditional" output)
+                if option is not None and option in self.__dict__:
                     kwargs[option] = self.__dict__[option]
 
+        return args, kwargs
+
+    # Load the module, call the method
+    def call(self, method):
+        print "calling {0}\n".format(method["name"])
+        method_call = self.registry.resolve(self.pre + method["module"], method["name"])
+        args, kwargs = self.arguments(method)
+
         # A variable that indicates the user wishes to cancel
         self.cancelled = False
 
         if "prompt" in method and method["prompt"]:
             method_call(self, *args, **kwargs)
         else:
-            results = method_call(*args, **kwargs)
-
-            if "provides" in method:
-                for i, provided in enumerate(method["provides"]):
-                    self.__dict__.update({provided, results[i]})
-
-            if "conditional" in method:
-                for i, condition in enumerate(method["conditional"]):
-                    self.__dict__.update({provided, results[i]})
+            self.store_results(method, method_call(*args, **kwargs))
+
+    # Results come back as the "provides" values followed by any "conditional" ones
+    def store_results(self, method, results):
+        provides = method.get("provides", [])
+        for i, provided in enumerate(provides):
+            self.__dict__[provided] = results[i]
+
+        if "conditional" in method:
+            if not isinstance(results, (list, tuple)):
+                results = (results,)
+            for i, condition in enumerate(method["conditional"], len(provides)):
+                if i < len(results) and results[i] is not None:
+                    self.__dict__[condition] = results[i]
+
+    def report_timings(self):
+        if not self.timings:
+            return
+        print "{0} method timings:".format(self.name)
+        for name, elapsed in self.timings.items():
+            print "    {0:<32} {1:8.3f}s".format(name, elapsed)
 
     def finished(self, **kwargs):
         self.__dict__.update(kwargs)
@@ -163,10 +563,9 @@ class Tool:
                 if not needed in self.__dict__ or self.__dict__[needed] is None:
                     raise NotSufficientFieldsError(method["name"], ": needs ", needed)
 
-        # If the module is not loaded, try loading it
+        # If the module is not loaded, try loading it (the registry only imports it once)
         # This is likely to throw an exception, which will be caught in the for loop of self.run()
-        if not self.loaded_modules[self.pre + method["module"]]:
-            importlib.import_module(self.pre + method["module"])
+        self.registry.load_module(self.pre + method["module"])
 
         return True
 
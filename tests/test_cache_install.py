@@ -0,0 +1,103 @@
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import unittest
+
+from pipe.am.cache_install import CacheInstaller
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+class CacheInstallerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.dir, "cache")
+        self.src = os.path.join(self.dir, "src")
+        os.mkdir(self.src)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write(self, name, text):
+        path = os.path.join(self.src, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def read(self, name):
+        with open(os.path.join(self.cache_dir, name)) as f:
+            return f.read()
+
+    def test_install_and_rollback(self):
+        installer = CacheInstaller(self.cache_dir)
+        installer.install([self.write("a.abc", "1")])
+        installer.install([self.write("a.abc", "2")])
+        self.assertEqual(self.read("a.abc"), "2")
+
+        installer.rollback()
+        self.assertEqual(self.read("a.abc"), "1")
+        self.assertRaises(EnvironmentError, installer.rollback)
+
+    def test_installers_share_a_lock(self):
+        self.assertIs(CacheInstaller(self.cache_dir)._lock, CacheInstaller(self.cache_dir + os.sep)._lock)
+        self.assertIsNot(CacheInstaller(self.cache_dir)._lock, CacheInstaller(self.src)._lock)
+
+    def test_lock_file_is_not_a_generation(self):
+        installer = CacheInstaller(self.cache_dir)
+        installer.install([self.write("a.abc", "1")], move=True)
+        self.assertTrue(os.path.exists(os.path.join(installer.generations_dir, CacheInstaller.LOCK_FILENAME)))
+        self.assertEqual(installer.generations(), [installer.live_generation()])
+
+    def test_cloned_files_keep_their_mode(self):
+        installer = CacheInstaller(self.cache_dir)
+        installer.install([self.write("a.abc", "1")])
+        previous = os.path.join(installer.get_generation_dir(installer.live_generation()), "a.abc")
+        os.chmod(previous, 0o640)
+
+        installer.install([self.write("b.abc", "2")], clone=True)
+        self.assertEqual(mode(previous), 0o640)
+        self.assertEqual(mode(os.path.join(self.cache_dir, "a.abc")), 0o640)
+        self.assertEqual(mode(os.path.join(self.cache_dir, "b.abc")), CacheInstaller.FILE_MODE)
+
+    def test_reclaim_keeps_live_and_previous(self):
+        installer = CacheInstaller(self.cache_dir, keep=2)
+        for i in range(4):
+            installer.commit(installer.stage(), reclaim=False)
+        installer.rollback()
+
+        stale = installer.reclaim()
+        self.assertEqual(len(stale), 1)
+        self.assertEqual(len(installer.generations()), 3)
+        self.assertIn(installer.live_generation(), installer.generations())
+
+    def test_concurrent_installers(self):
+        # Every thread uses its own installer, like Element.get_cache_installer() does
+        errors = []
+
+        def install(i):
+            try:
+                CacheInstaller(self.cache_dir).install([self.write("a_{0}.abc".format(i), str(i))])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=install, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        CacheInstaller(self.cache_dir).reclaim()
+
+        self.assertEqual(errors, [])
+        installer = CacheInstaller(self.cache_dir)
+        self.assertEqual(len(installer.generations()), installer.keep)
+        self.assertIn(installer.live_generation(), installer.generations())
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+from pipe.tools.mayatools.exporters import export_jobs
+
+# Stands in for mayapy: gets export_worker.py and the shard file, and "exports"
+# every job by writing its roots and frames to the outfile. Jobs named fail_*
+# are left unwritten, and the exit code counts them, like export_worker does.
+STUB_WORKER = '''
+import json
+import sys
+
+with open(sys.argv[2]) as f:
+    shard = json.load(f)
+
+failed = 0
+for job in shard["jobs"]:
+    if job["name"].startswith("fail"):
+        failed += 1
+        continue
+    with open(job["outfile"], "w") as f:
+        f.write("%s %s %s-%s" % (shard["scene"], " ".join(job["roots"]), job["start"], job["end"]))
+print("exported %d jobs" % (len(shard["jobs"]) - failed))
+sys.exit(failed)
+'''
+
+
+class ExportJobsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.stub = os.path.join(self.dir, 'stub_worker.py')
+        with open(self.stub, 'w') as f:
+            f.write(STUB_WORKER)
+        self.scene = os.path.join(self.dir, 'shot.mb')
+        with open(self.scene, 'w') as f:
+            f.write('scene')
+        self.out = os.path.join(self.dir, 'abc')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def dispatcher(self, workers=2):
+        return export_jobs.ExportDispatcher(self.scene, workers=workers, worker_command=[sys.executable, self.stub],
+                                            job_dir=os.path.join(self.dir, 'jobs'))
+
+    def test_plan_jobs(self):
+        jobs = export_jobs.plan_jobs([('tree', ['|set|tree']), ('empty', []), ('rock', ['|rock'])], '1', 120.0, self.out)
+        self.assertEqual([job.name for job in jobs], ['tree', 'rock'])
+        self.assertEqual(jobs[0].outfile, os.path.join(self.out, 'tree.abc'))
+        self.assertEqual((jobs[0].start, jobs[0].end), (1, 120))
+        self.assertEqual(jobs[0].mel(), 'AbcExport -j "-frameRange 1 120 -dataFormat ogawa -root |set|tree -file ' +
+                         jobs[0].outfile + '";')
+
+    def test_job_round_trip(self):
+        job = export_jobs.ExportJob('tree', ['|a', '|b'], 1, 10.5, '/tmp/tree.abc', step=0.25, flags=['-uvWrite'])
+        copy = export_jobs.ExportJob.from_dict(job.to_dict())
+        self.assertEqual(copy.arguments(), job.arguments())
+
+    def test_shard_jobs(self):
+        jobs = [export_jobs.ExportJob(str(i), ['|root'], 1, frames, 'out.abc') for i, frames in enumerate([100, 60, 50, 10])]
+        shards = export_jobs.shard_jobs(jobs, 2)
+        self.assertEqual(sorted(sum(job.cost() for job in shard) for shard in shards), [110, 110])
+        self.assertEqual(len(export_jobs.shard_jobs(jobs[:1], 4)), 1)
+
+    def test_run_with_stub_worker(self):
+        references = [(name, ['|' + name]) for name in ('tree', 'rock', 'bush')]
+        jobs = export_jobs.plan_jobs(references, 1, 24, self.out)
+        results = self.dispatcher(workers=2).run(jobs)
+
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(result.succeeded() for result in results))
+        outfiles = sorted(outfile for result in results for outfile in result.outfiles())
+        self.assertEqual(outfiles, sorted(job.outfile for job in jobs))
+        with open(os.path.join(self.out, 'rock.abc')) as f:
+            self.assertEqual(f.read(), self.scene + ' |rock 1-24')
+
+    def test_failed_jobs(self):
+        jobs = export_jobs.plan_jobs([('tree', ['|tree']), ('fail_rock', ['|rock'])], 1, 24, self.out)
+        results = self.dispatcher(workers=1).run(jobs)
+
+        self.assertEqual(len(results), 1)
+        self.assertFalse(results[0].succeeded())
+        self.assertEqual(results[0].returncode, 1)
+        self.assertTrue(os.path.exists(os.path.join(self.out, 'tree.abc')))
+        self.assertFalse(os.path.exists(os.path.join(self.out, 'fail_rock.abc')))
+
+    def test_missing_worker(self):
+        dispatcher = export_jobs.ExportDispatcher(self.scene, worker_command=[os.path.join(self.dir, 'no_mayapy')],
+                                                  job_dir=os.path.join(self.dir, 'jobs'))
+        results = dispatcher.run(export_jobs.plan_jobs([('tree', ['|tree'])], 1, 1, self.out))
+        self.assertEqual(results[0].returncode, -1)
+        self.assertFalse(results[0].succeeded())
+
+    def test_worker_from_environment(self):
+        os.environ[export_jobs.WORKER_ENV] = sys.executable + ' ' + self.stub
+        try:
+            dispatcher = export_jobs.ExportDispatcher(self.scene)
+            self.assertEqual(dispatcher.command('shard.json'),
+                             [sys.executable, self.stub, export_jobs.WORKER_SCRIPT, 'shard.json'])
+        finally:
+            del os.environ[export_jobs.WORKER_ENV]
+
+    def test_start_calls_back(self):
+        done = threading.Event()
+        collected = []
+
+        def callback(results):
+            collected.extend(results)
+            done.set()
+
+        jobs = export_jobs.plan_jobs([('tree', ['|tree'])], 1, 1, self.out)
+        thread = self.dispatcher().start(jobs, callback=callback)
+        thread.join(30)
+        self.assertTrue(done.is_set())
+        self.assertTrue(collected[0].succeeded())
+
+    def test_snapshot_scene(self):
+        snapshot = export_jobs.snapshot_scene(self.scene, os.path.join(self.dir, 'job'))
+        self.assertEqual(snapshot, os.path.join(self.dir, 'job', 'shot.mb'))
+        with open(snapshot) as f:
+            self.assertEqual(f.read(), 'scene')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pipe.am import sequence_cache
+from pipe.am.cache_install import CacheInstaller
+from pipe.am.sequence_cache import SequenceManifest
+
+
+class SequenceCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, "src")
+        self.cache_dir = os.path.join(self.dir, "cache")
+        os.mkdir(self.src)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write_frames(self, frames, text="sim", pattern="water.{0:04d}.bgeo.sc"):
+        for frame in frames:
+            with open(os.path.join(self.src, pattern.format(frame)), "w") as f:
+                f.write(text + str(frame))
+
+    def remove_frame(self, frame, pattern="water.{0:04d}.bgeo.sc"):
+        os.remove(os.path.join(self.src, pattern.format(frame)))
+
+    def published(self):
+        sequence_dir = os.path.join(self.cache_dir, "water")
+        manifest = SequenceManifest.read(sequence_dir)
+        files = sorted(name for name in os.listdir(sequence_dir) if name != SequenceManifest.FILENAME)
+        return manifest.frames(), files
+
+    def read(self, frame):
+        with open(os.path.join(self.cache_dir, "water", "water.{0:04d}.bgeo.sc".format(frame))) as f:
+            return f.read()
+
+    def test_full_publish(self):
+        self.write_frames(range(1, 6))
+        manifest = sequence_cache.publish(self.cache_dir, self.src)
+        self.assertEqual(manifest.frames(), [1, 2, 3, 4, 5])
+        self.assertEqual(manifest.missing_frames(1, 6), [6])
+        self.assertEqual(manifest.filename(3), "water.0003.bgeo.sc")
+
+        # A full publish drops the frames src no longer has
+        self.remove_frame(5)
+        sequence_cache.publish(self.cache_dir, self.src)
+        self.assertEqual(self.published()[0], [1, 2, 3, 4])
+        self.assertEqual(len(self.published()[1]), 4)
+
+    def test_ranged_publish_keeps_other_frames(self):
+        self.write_frames(range(1, 6))
+        sequence_cache.publish(self.cache_dir, self.src)
+        self.write_frames(range(1, 6), text="resim")
+
+        sequence_cache.publish(self.cache_dir, self.src, start=2, end=3)
+        self.assertEqual(self.published()[0], [1, 2, 3, 4, 5])
+        self.assertEqual([self.read(frame) for frame in range(1, 6)],
+                         ["sim1", "resim2", "resim3", "sim4", "sim5"])
+
+    def test_ranged_publish_drops_deleted_frames(self):
+        self.write_frames(range(1, 6))
+        sequence_cache.publish(self.cache_dir, self.src)
+
+        self.remove_frame(3)
+        manifest = sequence_cache.publish(self.cache_dir, self.src, start=2, end=3)
+        self.assertEqual(manifest.frames(), [1, 2, 4, 5])
+        self.assertEqual(self.published(), ([1, 2, 4, 5], ["water.0001.bgeo.sc", "water.0002.bgeo.sc",
+                                                           "water.0004.bgeo.sc", "water.0005.bgeo.sc"]))
+
+    def test_open_ended_range(self):
+        self.write_frames(range(1, 6))
+        sequence_cache.publish(self.cache_dir, self.src)
+
+        self.remove_frame(5)
+        sequence_cache.publish(self.cache_dir, self.src, start=4)
+        self.assertEqual(self.published()[0], [1, 2, 3, 4])
+
+    def test_naming_change_replaces_the_sequence(self):
+        self.write_frames(range(1, 4))
+        sequence_cache.publish(self.cache_dir, self.src)
+
+        shutil.rmtree(self.src)
+        os.mkdir(self.src)
+        self.write_frames(range(2, 3), pattern="water.{0:02d}.bgeo.sc")
+        manifest = sequence_cache.publish(self.cache_dir, self.src, start=2, end=2)
+        self.assertEqual(manifest.padding, 2)
+        self.assertEqual(self.published(), ([2], ["water.02.bgeo.sc"]))
+
+    def test_previous_generation_is_untouched(self):
+        self.write_frames(range(1, 4))
+        sequence_cache.publish(self.cache_dir, self.src)
+        self.write_frames([2], text="resim")
+        sequence_cache.publish(self.cache_dir, self.src, start=2, end=2)
+
+        CacheInstaller(self.cache_dir).rollback()
+        self.assertEqual(self.read(2), "sim2")
+
+
+if __name__ == "__main__":
+    unittest.main()
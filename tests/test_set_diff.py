@@ -0,0 +1,72 @@
+import unittest
+
+from pipe.am import set_diff
+
+
+def ref(name, version):
+    return {"asset_name": name, "version_number": version}
+
+def keys(references):
+    return sorted(set_diff.reference_key(reference) for reference in references)
+
+
+class SetDiffTest(unittest.TestCase):
+
+    def test_same_contents(self):
+        current = [ref("chair", 1), ref("table", "2")]
+        delta = set_diff.diff(current, [ref("table", 2), ref("chair", "1")])
+        self.assertTrue(delta.is_empty())
+        self.assertEqual(len(delta.keep), 2)
+
+    def test_duplicates(self):
+        # Three chairs in the set, two in the target: keep two, remove one
+        current = [ref("chair", 1), ref("chair", 1), ref("chair", 1)]
+        delta = set_diff.diff(current, [ref("chair", 1), ref("chair", 1)])
+        self.assertEqual(len(delta.keep), 2)
+        self.assertEqual(keys(delta.remove), [("chair", "1")])
+        self.assertEqual(delta.add, [])
+
+        # And the other way around
+        delta = set_diff.diff(current[:1], [ref("chair", 1), ref("chair", 1), ref("chair", 1)])
+        self.assertEqual(len(delta.keep), 1)
+        self.assertEqual(keys(delta.add), [("chair", "1"), ("chair", "1")])
+        self.assertEqual(delta.remove, [])
+
+    def test_version_changed(self):
+        current = [ref("chair", 1), ref("lamp", 0)]
+        target = [ref("chair", 2), ref("lamp", 0)]
+        delta = set_diff.diff(current, target)
+        self.assertEqual(len(delta.keep), 1)
+        self.assertEqual(delta.update, [(current[0], target[0])])
+        self.assertEqual(delta.add, [])
+        self.assertEqual(delta.remove, [])
+
+    def test_version_changed_without_groups(self):
+        # The assembler replaces changed children, so it turns updates off
+        current = [ref("chair", 1), ref("lamp", 0)]
+        delta = set_diff.diff(current, [ref("chair", 2), ref("lamp", 0)], group=None)
+        self.assertEqual(delta.update, [])
+        self.assertEqual(keys(delta.add), [("chair", "2")])
+        self.assertEqual(keys(delta.remove), [("chair", "1")])
+
+    def test_duplicates_with_one_version_changed(self):
+        current = [ref("chair", 1), ref("chair", 1)]
+        target = [ref("chair", 1), ref("chair", 2), ref("table", 0)]
+        delta = set_diff.diff(current, target)
+        self.assertEqual(len(delta.keep), 1)
+        self.assertEqual([(set_diff.reference_key(c), set_diff.reference_key(t)) for c, t in delta.update],
+                         [(("chair", "1"), ("chair", "2"))])
+        self.assertEqual(keys(delta.add), [("table", "0")])
+        self.assertEqual(delta.remove, [])
+
+    def test_custom_keys(self):
+        # Like the assembler: the current side is read through a key function
+        children = ["node1", "node2"]
+        data = {"node1": ("chair", "1"), "node2": ("table", "3")}
+        delta = set_diff.diff(children, [ref("chair", 1)], current_key=data.get)
+        self.assertEqual([child for child, reference in delta.keep], ["node1"])
+        self.assertEqual(delta.remove, ["node2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
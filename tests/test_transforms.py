@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+from pipe.tools.houtools.utils import transforms
+
+
+class TransformsTest(unittest.TestCase):
+
+    def assertPointsEqual(self, actual, expected):
+        np.testing.assert_allclose(np.asarray(actual), np.asarray(expected, dtype=np.float64), atol=1e-9)
+
+    def test_identity_by_default(self):
+        m = transforms.compose_transforms(count=2)
+        self.assertEqual(m.shape, (2, 4, 4))
+        self.assertPointsEqual(m, [np.eye(4), np.eye(4)])
+
+    def test_translate(self):
+        points = transforms.transform_points([[1, 2, 3]], translate=[10, 20, 30])
+        self.assertPointsEqual(points, [[[11, 22, 33]]])
+
+    def test_rotate_each_axis(self):
+        point = [[1, 1, 1]]
+        self.assertPointsEqual(transforms.transform_points(point, rotate=[90, 0, 0]), [[[1, -1, 1]]])
+        self.assertPointsEqual(transforms.transform_points(point, rotate=[0, 90, 0]), [[[1, 1, -1]]])
+        self.assertPointsEqual(transforms.transform_points(point, rotate=[0, 0, 90]), [[[-1, 1, 1]]])
+
+    def test_rotate_order(self):
+        # x first, then z: (0,1,0) -> (0,0,1) -> (0,0,1)
+        self.assertPointsEqual(transforms.transform_points([[0, 1, 0]], rotate=[90, 0, 90], rotate_order="xyz"),
+                               [[[0, 0, 1]]])
+        # z first, then x: (0,1,0) -> (-1,0,0) -> (-1,0,0)
+        self.assertPointsEqual(transforms.transform_points([[0, 1, 0]], rotate=[90, 0, 90], rotate_order="zyx"),
+                               [[[-1, 0, 0]]])
+
+    def test_transform_order(self):
+        kwargs = {"translate": [1, 0, 0], "scale": [2, 2, 2]}
+        self.assertPointsEqual(transforms.transform_points([[1, 0, 0]], transform_order="srt", **kwargs), [[[3, 0, 0]]])
+        self.assertPointsEqual(transforms.transform_points([[1, 0, 0]], transform_order="tsr", **kwargs), [[[4, 0, 0]]])
+
+    def test_pivot(self):
+        # Scaling about (1,0,0) leaves the pivot where it is
+        points = transforms.transform_points([[1, 0, 0], [2, 0, 0]], scale=[3, 3, 3], pivot=[1, 0, 0])
+        self.assertPointsEqual(points, [[[1, 0, 0], [4, 0, 0]]])
+
+    def test_per_prop_values_and_orders(self):
+        m = transforms.compose_transforms(
+            translate=[[1, 0, 0], [0, 0, 0]],
+            scale=[[2, 2, 2], [1, 1, 1]],
+            rotate=[[0, 0, 0], [0, 0, 90]],
+            transform_order=["tsr", "srt"],
+            rotate_order="xyz")
+        points = transforms.apply_transforms(m, [[1, 0, 0]])
+        self.assertPointsEqual(points, [[[4, 0, 0]], [[0, 1, 0]]])
+
+    def test_apply_per_prop_points(self):
+        m = transforms.compose_transforms(translate=[[1, 0, 0], [0, 1, 0]])
+        anchors = [[[0, 0, 0], [1, 1, 1], [2, 2, 2]],
+                   [[0, 0, 0], [1, 1, 1], [2, 2, 2]]]
+        self.assertPointsEqual(transforms.apply_transforms(m, anchors),
+                               [[[1, 0, 0], [2, 1, 1], [3, 2, 2]],
+                                [[0, 1, 0], [1, 2, 1], [2, 3, 2]]])
+
+    def test_bad_input(self):
+        self.assertRaises(ValueError, transforms.compose_transforms, translate=[1, 2])
+        self.assertRaises(ValueError, transforms.compose_transforms, rotate_order="abc")
+        self.assertRaises(ValueError, transforms.compose_transforms, transform_order="xyz")
+        self.assertRaises(ValueError, transforms.compose_transforms,
+                          translate=[[0, 0, 0], [0, 0, 0]], transform_order=["srt"])
+
+
+if __name__ == "__main__":
+    unittest.main()